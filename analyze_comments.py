@@ -14,6 +14,8 @@ from collections import defaultdict, Counter
 from datetime import datetime
 import sys
 
+from comment_export_reader import CommentExportReader, ExportFormatError
+
 def analyze_json_file(filepath):
     """Analyze a single JSON file and return statistics"""
     print(f"\nAnalyzing {os.path.basename(filepath)}...")
@@ -24,44 +26,18 @@ def analyze_json_file(filepath):
     error_entries = 0
     
     try:
+        # Stream the file; exports can be larger than memory
         with open(filepath, 'r') as f:
-            data = json.load(f)
-        
-        # Handle both dict and list structures
-        if isinstance(data, dict):
-            items = data.items()
-        elif isinstance(data, list):
-            # Convert list to dict-like items
-            items = [(str(i), item) for i, item in enumerate(data)]
-        else:
-            print(f"Unexpected data type: {type(data)}")
-            return None, None, 0
-            
-        for key, entry in items:
-            try:
-                total_entries += 1
-                
-                # Skip if entry is not a dict
-                if not isinstance(entry, dict):
-                    error_entries += 1
-                    continue
-                    
-                shortcode = entry.get('target', '')
-                
-                if shortcode:
-                    # Collect all comment IDs from all log entries
-                    logs = entry.get('logs', [])
-                    if isinstance(logs, list):
-                        for log in logs:
-                            if isinstance(log, dict):
-                                comment_ids = log.get('storedIds', [])
-                                if isinstance(comment_ids, list):
-                                    shortcode_to_comments[shortcode].update(comment_ids)
-                                    all_comment_ids.extend(comment_ids)
-            except Exception as e:
-                error_entries += 1
-                continue
-    
+            reader = CommentExportReader(f, allow_array=True)
+            for shortcode, comment_id in reader:
+                shortcode_to_comments[shortcode].add(comment_id)
+                all_comment_ids.append(comment_id)
+        total_entries = reader.entries
+        error_entries = reader.invalid_entries
+    
+    except ExportFormatError as e:
+        print(f"Unexpected data type: {e}")
+        return None, None, 0
     except json.JSONDecodeError as e:
         print(f"Error decoding JSON from {filepath}: {e}")
         return None, None, 0
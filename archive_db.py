@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+"""
+Build and query a single-file SQLite archive of videos, comments and posts.
+
+The build step writes data/archive.sqlite with comments indexed for paged
+listing in each sort order the app offers, plus FTS5 full-text indexes
+over comment text/author and Instagram post captions. CommentArchive
+answers paged and full-text queries in milliseconds without a database
+server.
+
+Usage:
+    python3 archive_db.py                                  # from data/*.json
+    python3 archive_db.py --source-db ../data/youtube_comments.db
+    python3 archive_db.py --search "celery juice"
+"""
+
+import argparse
+import json
+import os
+import re
+import sqlite3
+import time
+from contextlib import closing
+from datetime import datetime
+
+from json_stream import iter_json_array
+
+ARCHIVE_PATH = 'data/archive.sqlite'
+VIDEOS_PATH = 'data/videos.json'
+COMMENTS_PATH = 'data/comments.json'
+POSTS_PATH = 'data/instagram-posts-full.json'
+
+SCHEMA_VERSION = 2
+INSERT_BATCH = 10000
+
+# Sort orders match the app's comment sort menu. Each ends in an id
+# tie-break running the same way as its index scan (index entries end in
+# the rowid, which is comments.id), so SQLite pages straight off the index
+# without sorting
+SORT_ORDERS = {
+    'likes': 'like_count DESC, published_at_timestamp DESC, id ASC',
+    'newest': 'published_at_timestamp DESC, id DESC',
+    'oldest': 'published_at_timestamp ASC, id ASC',
+    'longest': 'text_length DESC, id ASC',
+}
+
+SCHEMA = """
+CREATE TABLE videos (
+    video_id TEXT PRIMARY KEY,
+    published_at TEXT,
+    data TEXT NOT NULL
+);
+
+CREATE TABLE comments (
+    id INTEGER PRIMARY KEY,
+    comment_id TEXT UNIQUE,
+    video_id TEXT,
+    like_count INTEGER NOT NULL DEFAULT 0,
+    published_at_timestamp REAL NOT NULL DEFAULT 0,
+    text_length INTEGER NOT NULL DEFAULT 0,
+    data TEXT NOT NULL
+);
+
+CREATE TABLE posts (
+    id INTEGER PRIMARY KEY,
+    post_id TEXT UNIQUE,
+    likes INTEGER NOT NULL DEFAULT 0,
+    data TEXT NOT NULL
+);
+
+-- Contentless: the text lives in comments.data / posts.data, and rowids
+-- point back at comments.id / posts.id
+CREATE VIRTUAL TABLE comments_fts USING fts5(
+    text, author, content='', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE VIRTUAL TABLE posts_fts USING fts5(
+    caption, content='', tokenize='unicode61 remove_diacritics 2'
+);
+"""
+
+# Built after the bulk insert; each serves one paged sort order per video
+# ('newest' scans idx_comments_video_published backwards). They are not
+# covering: each row on the page is still looked up in comments for `data`
+INDEXES = """
+CREATE INDEX idx_comments_video_likes ON comments(video_id, like_count DESC, published_at_timestamp DESC);
+CREATE INDEX idx_comments_video_published ON comments(video_id, published_at_timestamp);
+CREATE INDEX idx_comments_video_length ON comments(video_id, text_length DESC);
+CREATE INDEX idx_videos_published ON videos(published_at);
+"""
+
+
+def comment_timestamp(comment):
+    """published_at_timestamp, or published_at parsed as ISO 8601, or 0"""
+    timestamp = comment.get('published_at_timestamp')
+    if isinstance(timestamp, (int, float)) and not isinstance(timestamp, bool):
+        return timestamp
+    published_at = comment.get('published_at')
+    if isinstance(published_at, str) and published_at:
+        try:
+            return datetime.fromisoformat(published_at.replace('Z', '+00:00')).timestamp()
+        except ValueError:
+            pass
+    return 0
+
+
+def utf16_length(text):
+    """String length as JavaScript measures it (UTF-16 code units)"""
+    return len(text.encode('utf-16-le')) // 2
+
+
+def _json(row):
+    return json.dumps(row, ensure_ascii=False, separators=(',', ':'), default=str)
+
+
+def _batched(rows, size=INSERT_BATCH):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def fts_query(text):
+    """Turn free text into an FTS5 query: every word must match as a prefix"""
+    words = re.findall(r'\w+', text)
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def iter_source_db(db_path):
+    """(videos, comments) from a youtube_comments.db SQLite file; comments are streamed"""
+    with closing(sqlite3.connect(db_path)) as conn:
+        conn.row_factory = sqlite3.Row
+        videos = [dict(row) for row in conn.execute('SELECT * FROM videos ORDER BY published_at DESC')]
+    return videos, iter_source_comments(db_path)
+
+
+def iter_source_comments(db_path):
+    """Comment rows from a youtube_comments.db; the connection closes when the generator finishes or is closed"""
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.row_factory = sqlite3.Row
+        for row in conn.execute('SELECT * FROM comments ORDER BY video_id, published_at'):
+            yield dict(row)
+    finally:
+        conn.close()
+
+
+def iter_json_file(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        yield from iter_json_array(f)
+
+
+def build_archive(output_path, videos, comments, posts=()):
+    """Write a fresh archive to `output_path` and return row counts.
+
+    `videos`, `comments` and `posts` are iterables of dicts; comments are
+    streamed, so they can be a generator over a file larger than memory.
+    The archive is built in a temporary file with journaling off, then
+    switched to WAL mode and moved into place, so readers never see a
+    partial build.
+    """
+    temp_path = output_path + '.building'
+    for path in (temp_path, temp_path + '-wal', temp_path + '-shm'):
+        if os.path.exists(path):
+            os.remove(path)
+
+    conn = sqlite3.connect(temp_path, isolation_level=None)
+    # Bulk-load settings: this file is thrown away if the build fails
+    conn.execute('PRAGMA journal_mode = OFF')
+    conn.execute('PRAGMA synchronous = OFF')
+    conn.execute('PRAGMA locking_mode = EXCLUSIVE')
+    conn.execute('PRAGMA temp_store = MEMORY')
+    conn.execute('PRAGMA cache_size = -262144')  # 256MB
+    conn.executescript(SCHEMA)
+    conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+    counts = {'videos': 0, 'comments': 0, 'posts': 0}
+    conn.execute('BEGIN')
+
+    for batch in _batched(videos):
+        conn.executemany('INSERT OR REPLACE INTO videos (video_id, published_at, data) VALUES (?, ?, ?)',
+                         [(video.get('video_id'), str(video.get('published_at') or ''), _json(video))
+                          for video in batch])
+        counts['videos'] += len(batch)
+
+    for batch in _batched(comments):
+        search_rows = []
+        for comment in batch:
+            text = comment.get('text') or ''
+            cursor = conn.execute(
+                'INSERT OR IGNORE INTO comments '
+                '(comment_id, video_id, like_count, published_at_timestamp, text_length, data) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (comment.get('comment_id'), comment.get('video_id'), comment.get('like_count') or 0,
+                 comment_timestamp(comment), utf16_length(text), _json(comment)))
+            if cursor.rowcount:
+                author = f"{comment.get('author_display_name') or ''} {comment.get('author') or ''}".strip()
+                search_rows.append((cursor.lastrowid, text, author))
+        conn.executemany('INSERT INTO comments_fts (rowid, text, author) VALUES (?, ?, ?)', search_rows)
+        counts['comments'] += len(search_rows)
+        if counts['comments'] % 100000 < len(search_rows):
+            print(f"  Loaded {counts['comments']:,} comments...")
+
+    for batch in _batched(posts):
+        for post in batch:
+            cursor = conn.execute('INSERT OR IGNORE INTO posts (post_id, likes, data) VALUES (?, ?, ?)',
+                                  (post.get('id'), post.get('likes') or 0, _json(post)))
+            if cursor.rowcount:
+                conn.execute('INSERT INTO posts_fts (rowid, caption) VALUES (?, ?)',
+                             (cursor.lastrowid, post.get('caption') or ''))
+                counts['posts'] += 1
+
+    conn.execute('COMMIT')
+
+    print("🔄 Building indexes...")
+    conn.executescript(INDEXES)
+    conn.execute("INSERT INTO comments_fts (comments_fts) VALUES ('optimize')")
+    conn.execute("INSERT INTO posts_fts (posts_fts) VALUES ('optimize')")
+    conn.execute('ANALYZE')
+
+    # Readers get WAL so queries never block behind a writer
+    conn.execute('PRAGMA locking_mode = NORMAL')
+    conn.execute('SELECT COUNT(*) FROM videos').fetchone()  # releases the exclusive lock
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.close()
+
+    os.replace(temp_path, output_path)
+    for suffix in ('-wal', '-shm'):
+        if os.path.exists(temp_path + suffix):
+            os.remove(temp_path + suffix)
+    return counts
+
+
+class CommentArchive:
+    """Read-only queries against an archive written by build_archive()"""
+
+    def __init__(self, path=ARCHIVE_PATH):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"{path} not found; run archive_db.py to build it")
+        self.conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True, check_same_thread=False)
+        self.conn.execute('PRAGMA query_only = ON')
+        self.conn.execute('PRAGMA mmap_size = 268435456')
+
+        version = self.conn.execute('PRAGMA user_version').fetchone()[0]
+        if version != SCHEMA_VERSION:
+            self.conn.close()
+            raise ValueError(f"Unsupported archive version {version}; rebuild it with archive_db.py")
+
+    def videos(self):
+        """All videos, newest first"""
+        return [json.loads(data) for data, in
+                self.conn.execute('SELECT data FROM videos ORDER BY published_at DESC')]
+
+    def get_video(self, video_id):
+        row = self.conn.execute('SELECT data FROM videos WHERE video_id = ?', (video_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def count_comments(self, video_id=None):
+        if video_id is None:
+            return self.conn.execute('SELECT COUNT(*) FROM comments').fetchone()[0]
+        return self.conn.execute('SELECT COUNT(*) FROM comments WHERE video_id = ?', (video_id,)).fetchone()[0]
+
+    def get_comments(self, video_id, sort='likes', limit=50, offset=0):
+        """One page of a video's comments in 'likes', 'newest', 'oldest' or 'longest' order"""
+        if sort not in SORT_ORDERS:
+            raise ValueError(f"Unknown sort order {sort!r}; expected one of {', '.join(SORT_ORDERS)}")
+        rows = self.conn.execute(
+            f'SELECT data FROM comments WHERE video_id = ? ORDER BY {SORT_ORDERS[sort]} LIMIT ? OFFSET ?',
+            (video_id, limit, offset))
+        return [json.loads(data) for data, in rows]
+
+    def search_comments(self, query, video_id=None, limit=50, offset=0):
+        """Comments whose text or author match every word of `query` (as prefixes), best matches first"""
+        match = fts_query(query)
+        if not match:
+            return []
+        sql = ('SELECT c.data FROM comments_fts f JOIN comments c ON c.id = f.rowid '
+               'WHERE comments_fts MATCH ?')
+        params = [match]
+        if video_id is not None:
+            sql += ' AND c.video_id = ?'
+            params.append(video_id)
+        sql += ' ORDER BY f.rank LIMIT ? OFFSET ?'
+        params.extend([limit, offset])
+        return [json.loads(data) for data, in self.conn.execute(sql, params)]
+
+    def count_search(self, query, video_id=None):
+        match = fts_query(query)
+        if not match:
+            return 0
+        if video_id is None:
+            return self.conn.execute('SELECT COUNT(*) FROM comments_fts WHERE comments_fts MATCH ?',
+                                     (match,)).fetchone()[0]
+        return self.conn.execute(
+            'SELECT COUNT(*) FROM comments_fts f JOIN comments c ON c.id = f.rowid '
+            'WHERE comments_fts MATCH ? AND c.video_id = ?', (match, video_id)).fetchone()[0]
+
+    def search_posts(self, query, limit=20, offset=0):
+        """Instagram posts whose caption matches every word of `query`, best matches first"""
+        match = fts_query(query)
+        if not match:
+            return []
+        rows = self.conn.execute(
+            'SELECT p.data FROM posts_fts f JOIN posts p ON p.id = f.rowid '
+            'WHERE posts_fts MATCH ? ORDER BY f.rank LIMIT ? OFFSET ?', (match, limit, offset))
+        return [json.loads(data) for data, in rows]
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Build or query the SQLite comment archive')
+    arg_parser.add_argument('--output', default=ARCHIVE_PATH, help='Archive file to write or query')
+    arg_parser.add_argument('--source-db', help='Read videos/comments from a youtube_comments.db instead of data/*.json')
+    arg_parser.add_argument('--posts', default=POSTS_PATH, help='Instagram posts JSON to index captions from')
+    arg_parser.add_argument('--search', help='Query an existing archive instead of building one')
+    arg_parser.add_argument('--video', help='Limit --search to one video')
+    args = arg_parser.parse_args()
+
+    if args.search:
+        with CommentArchive(args.output) as archive:
+            start = time.perf_counter()
+            total = archive.count_search(args.search, args.video)
+            comments = archive.search_comments(args.search, args.video, limit=10)
+            posts = archive.search_posts(args.search, limit=5)
+            elapsed = (time.perf_counter() - start) * 1000
+        print(f"🔍 {total:,} comments match {args.search!r} ({elapsed:.1f} ms)")
+        for comment in comments:
+            print(f"  [{comment.get('video_id')}] {comment.get('author')}: {(comment.get('text') or '')[:100]}")
+        for post in posts:
+            print(f"  📷 {post.get('id')}: {(post.get('caption') or '')[:100]}")
+        return
+
+    print("🔄 Loading data...")
+    if args.source_db:
+        videos, comments = iter_source_db(args.source_db)
+    else:
+        with open(VIDEOS_PATH, 'r', encoding='utf-8') as f:
+            videos = json.load(f)
+        comments = iter_json_file(COMMENTS_PATH)
+
+    posts = []
+    if args.posts and os.path.exists(args.posts):
+        with open(args.posts, 'r', encoding='utf-8') as f:
+            posts = json.load(f)
+
+    start = time.time()
+    counts = build_archive(args.output, videos, comments, posts)
+    size_mb = os.path.getsize(args.output) / 1024 / 1024
+
+    print(f"\n✅ Archive written to {args.output} ({size_mb:.1f} MB) in {time.time() - start:.1f}s")
+    print(f"📊 {counts['videos']:,} videos, {counts['comments']:,} comments, {counts['posts']:,} posts")
+
+
+if __name__ == "__main__":
+    main()
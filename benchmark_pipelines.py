@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+"""
+Benchmark the Python data pipelines on synthetic corpora.
+
+Generates corpora shaped like the real data (videos.json / comments.json
+for preindexing, mm_ig_comments-style {uuid: {target, logs: [{storedIds}]}}
+exports, and parsed posts/comments CSVs), then times each stage in a fresh
+process and records its peak RSS. Results are written as JSON so reports
+from two commits can be compared with --compare.
+
+Examples:
+    python3 benchmark_pipelines.py --sizes 100k
+    python3 benchmark_pipelines.py --sizes 100k,1M --output before.json
+    python3 benchmark_pipelines.py --sizes 100k,1M --compare before.json
+"""
+
+import argparse
+import csv
+import io
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from contextlib import redirect_stdout
+from datetime import datetime, timezone
+
+try:
+    import resource
+    HAS_RESOURCE = True
+except ImportError:  # Windows
+    HAS_RESOURCE = False
+
+REPORT_VERSION = 1
+
+WORDS = (
+    "celery juice liver healing heavy metals detox zinc vitamin brain fog thyroid "
+    "thank you so much love this amazing anthony medical medium body symptoms "
+    "virus epstein barr adrenal fatigue lemon water wild blueberries spirulina "
+    "barley grass cilantro morning routine feel better years pain gone"
+).split()
+
+AUTHORS = [f"user_{i:05d}" for i in range(5000)]
+
+# Comments per video / post roughly follow the real archives
+COMMENTS_PER_VIDEO = 400
+COMMENTS_PER_EXPORT_FILE = 250000
+DUPLICATE_RATE = 0.1
+
+
+def parse_size(text):
+    """'100k' -> 100000, '1M' -> 1000000"""
+    text = text.strip().lower()
+    multiplier = 1
+    if text.endswith('k'):
+        multiplier, text = 1000, text[:-1]
+    elif text.endswith('m'):
+        multiplier, text = 1000000, text[:-1]
+    return int(float(text) * multiplier)
+
+
+def format_size(count):
+    if count >= 1000000 and count % 1000000 == 0:
+        return f"{count // 1000000}M"
+    if count >= 1000 and count % 1000 == 0:
+        return f"{count // 1000}k"
+    return str(count)
+
+
+# ---------------------------------------------------------------------------
+# Synthetic corpus generation
+# ---------------------------------------------------------------------------
+
+def _random_text(rng):
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 40)))
+
+
+def generate_youtube_corpus(data_dir, comment_count, seed=1):
+    """Write data/videos.json and data/comments.json like convert_data.py produces"""
+    rng = random.Random(seed)
+    os.makedirs(data_dir, exist_ok=True)
+
+    video_count = max(1, comment_count // COMMENTS_PER_VIDEO)
+    video_ids = [f"v{i:010d}" for i in range(video_count)]
+    with open(os.path.join(data_dir, 'videos.json'), 'w', encoding='utf-8') as f:
+        json.dump([{'video_id': video_id, 'title': f"Video {i}", 'view_count': rng.randint(0, 10 ** 6),
+                    'comment_count': 0, 'published_at': '2024-01-01T00:00:00'}
+                   for i, video_id in enumerate(video_ids)], f)
+
+    base_timestamp = 1500000000
+    with open(os.path.join(data_dir, 'comments.json'), 'w', encoding='utf-8') as f:
+        f.write('[')
+        for i in range(comment_count):
+            timestamp = base_timestamp + rng.randint(0, 200000000)
+            is_reply = rng.random() < 0.15
+            author = rng.choice(AUTHORS)
+            comment = {
+                'comment_id': f"c{i:012d}",
+                'video_id': rng.choice(video_ids),
+                'author_display_name': author,
+                'author': author,
+                'text': _random_text(rng),
+                'like_count': int(rng.paretovariate(1.2)) - 1,
+                'published_at': datetime.fromtimestamp(timestamp, timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+                'published_at_timestamp': timestamp,
+                'is_reply': is_reply,
+                'parent_comment_id': f"c{rng.randint(0, max(0, i - 1)):012d}" if is_reply else None
+            }
+            if i:
+                f.write(',\n')
+            json.dump(comment, f)
+        f.write(']')
+
+
+def generate_instagram_exports(comments_dir, comment_count, seed=2):
+    """Write mm_ig_comments-style export files.
+
+    Each file is {uuid: {target, logs: [{storedIds: [...]}]}}; about
+    DUPLICATE_RATE of the IDs repeat an earlier ID, as re-scrapes do.
+    """
+    rng = random.Random(seed)
+    os.makedirs(comments_dir, exist_ok=True)
+
+    post_count = max(1, comment_count // COMMENTS_PER_VIDEO)
+    shortcodes = [f"C{i:010d}" for i in range(post_count)]
+    next_id = 17800000000000000
+    written = 0
+    file_index = 0
+
+    while written < comment_count:
+        in_file = min(COMMENTS_PER_EXPORT_FILE, comment_count - written)
+        entries = {}
+        remaining = in_file
+        while remaining > 0:
+            ids = []
+            for _ in range(min(remaining, rng.randint(20, 400))):
+                if next_id > 17800000000000000 and rng.random() < DUPLICATE_RATE:
+                    ids.append(str(rng.randint(17800000000000000, next_id - 1)))
+                else:
+                    ids.append(str(next_id))
+                    next_id += rng.randint(1, 50)
+            remaining -= len(ids)
+            logs = [{'timestamp': 1700000000 + len(entries), 'storedIds': ids[i:i + 50]} for i in range(0, len(ids), 50)]
+            entries[str(uuid.UUID(int=rng.getrandbits(128)))] = {'target': rng.choice(shortcodes), 'logs': logs}
+
+        with open(os.path.join(comments_dir, f"comments_{file_index:03d}.json"), 'w') as f:
+            json.dump(entries, f)
+        written += in_file
+        file_index += 1
+
+    return shortcodes
+
+
+def generate_parsed_csvs(parsed_dir, comment_count, seed=3):
+    """Write data/parsed/posts.csv and comments.csv as parse_comments_to_db.py --csv does"""
+    rng = random.Random(seed)
+    os.makedirs(parsed_dir, exist_ok=True)
+
+    post_count = max(1, comment_count // COMMENTS_PER_VIDEO)
+    shortcodes = [f"C{i:010d}" for i in range(post_count)]
+    with open(os.path.join(parsed_dir, 'posts.csv'), 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['shortcode', 'post_url', 'created_at', 'likes', 'comment_count', 'caption'])
+        for shortcode in shortcodes:
+            writer.writerow([shortcode, f"https://www.instagram.com/p/{shortcode}/",
+                             '2024-01-01 00:00:00', rng.randint(0, 100000), rng.randint(0, 5000),
+                             _random_text(rng)])
+
+    with open(os.path.join(parsed_dir, 'comments.csv'), 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['comment_id', 'post_shortcode'])
+        for i in range(comment_count):
+            writer.writerow([str(17800000000000000 + i), rng.choice(shortcodes)])
+
+
+def generate_corpus(root, comment_count):
+    """Generate every corpus for one size under `root`"""
+    generate_youtube_corpus(os.path.join(root, 'data'), comment_count)
+    generate_instagram_exports(os.path.join(root, 'mm_ig_comments'), comment_count)
+    generate_parsed_csvs(os.path.join(root, 'data', 'parsed'), comment_count)
+
+
+# ---------------------------------------------------------------------------
+# Stages (each runs in its own process)
+# ---------------------------------------------------------------------------
+
+def stage_preindex(root, options):
+    import preindex_comments
+    comments = preindex_comments.iter_comments(os.path.join(root, 'data', 'comments.json'))
+    result = preindex_comments.build_indexes(comments, workers=options.get('workers', 1))
+    out_dir = os.path.join(root, 'preindex_out')
+    os.makedirs(out_dir, exist_ok=True)
+    for name, index in (('video_comments_index.json', result.video_comments_index),
+                        ('search_index.json', result.search_index),
+                        ('word_freq_index.json', result.word_freq_index)):
+        with open(os.path.join(out_dir, name), 'w', encoding='utf-8') as f:
+            json.dump(index, f, ensure_ascii=False, separators=(',', ':'))
+    return result.comment_count
+
+
+def stage_comment_parser(root, options):
+    from parse_comments_to_db import CommentParser
+    parser = CommentParser(os.path.join(root, 'mm_ig_comments'), None)
+    return len(parser.parse_comment_files(workers=options.get('workers', 1)))
+
+
+def stage_static_organizer(root, options):
+    from organize_comments_static import StaticCommentOrganizer
+    # Time a cold build; a kept --work-dir would otherwise make it incremental
+    output_dir = os.path.join(root, 'organized')
+    shutil.rmtree(output_dir, ignore_errors=True)
+    organizer = StaticCommentOrganizer(os.path.join(root, 'mm_ig_comments'), output_dir=output_dir)
+    organizer.process()
+    return organizer.index_data['stats']['total_comments']
+
+
+def stage_render_import_csv(root, options):
+    from import_to_render import RenderImporter
+    # RenderImporter reads its SQL files and ./data/parsed/*.csv relative to the working directory
+    for sql_file in ('database_schema.sql', 'refresh_post_comment_counts.sql'):
+        shutil.copy(os.path.join(os.path.dirname(os.path.abspath(__file__)), sql_file), root)
+    os.chdir(root)
+    importer = RenderImporter(options['database_url'])
+    importer.create_schema()
+    importer.import_posts()
+    importer.import_comments()
+    importer.refresh_comment_counts()
+    with open(os.path.join(root, 'data', 'parsed', 'comments.csv')) as f:
+        return sum(1 for _ in f) - 1
+
+
+STAGES = {
+    'preindex': stage_preindex,
+    'comment_parser': stage_comment_parser,
+    'static_organizer': stage_static_organizer,
+    'render_import_csv': stage_render_import_csv,
+}
+
+
+def _peak_rss_mb(who):
+    if not HAS_RESOURCE:
+        return None
+    peak = resource.getrusage(who).ru_maxrss
+    # ru_maxrss is bytes on macOS and kilobytes elsewhere
+    divisor = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return round(peak / divisor, 1)
+
+
+def _peak_rss_fields():
+    """Peak RSS of the stage process and of its largest finished worker process.
+
+    Stages with --workers do their heavy lifting in pool processes, which
+    RUSAGE_SELF never sees; peak_rss_mb is the larger of the two.
+    """
+    if not HAS_RESOURCE:
+        return {'peak_rss_mb': None}
+    own = _peak_rss_mb(resource.RUSAGE_SELF)
+    children = _peak_rss_mb(resource.RUSAGE_CHILDREN)
+    return {'peak_rss_mb': max(own, children), 'peak_rss_self_mb': own, 'peak_rss_children_mb': children}
+
+
+def _stage_worker(stage, root, options, queue):
+    """Child process entry point: run one stage quietly and report back"""
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    try:
+        with redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            items = STAGES[stage](root, options)
+            elapsed = time.perf_counter() - start
+        queue.put({'status': 'ok', 'seconds': round(elapsed, 3), 'items': items,
+                   **_peak_rss_fields()})
+    except Exception as e:
+        queue.put({'status': 'error', 'error': f"{type(e).__name__}: {e}"})
+
+
+def run_stage(stage, root, options):
+    """Run a stage in a fresh process so its timing and peak RSS are isolated"""
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    process = context.Process(target=_stage_worker, args=(stage, root, options, queue))
+    process.start()
+    process.join()
+    if queue.empty():
+        return {'status': 'error', 'error': f"process exited with code {process.exitcode}"}
+    return queue.get()
+
+
+# ---------------------------------------------------------------------------
+# Reporting
+# ---------------------------------------------------------------------------
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare_reports(previous, current):
+    """Print per-stage time and memory changes between two reports"""
+    previous_results = {(r['stage'], r['size']): r for r in previous.get('results', [])}
+    print(f"\n📊 Compared with {previous.get('git_commit') or 'previous report'}:")
+    for result in current['results']:
+        before = previous_results.get((result['stage'], result['size']))
+        if not before or before.get('status') != 'ok' or result.get('status') != 'ok':
+            continue
+        time_change = (result['seconds'] / before['seconds'] - 1) * 100 if before['seconds'] else 0
+        line = (f"  {result['stage']:<20} {result['size']:>5}: {before['seconds']:.2f}s -> "
+                f"{result['seconds']:.2f}s ({time_change:+.1f}%)")
+        if before.get('peak_rss_mb') and result.get('peak_rss_mb'):
+            line += f", {before['peak_rss_mb']:.0f} -> {result['peak_rss_mb']:.0f} MB peak RSS"
+        print(line)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Benchmark the Python data pipelines on synthetic corpora')
+    arg_parser.add_argument('--sizes', default='100k', help='Comma-separated corpus sizes, e.g. 100k,1M,10M')
+    arg_parser.add_argument('--stages', default=','.join(s for s in STAGES if s != 'render_import_csv'),
+                            help=f"Comma-separated stages to run ({', '.join(STAGES)})")
+    arg_parser.add_argument('--workers', type=int, default=1, help='Worker count passed to parallel stages')
+    arg_parser.add_argument('--render-db', help='Database URL for render_import_csv (the stage writes to it)')
+    arg_parser.add_argument('--work-dir', help='Keep generated corpora here instead of a temporary directory')
+    arg_parser.add_argument('--output', default='benchmark_report.json', help='Report file to write')
+    arg_parser.add_argument('--compare', help='Previous report to compare against')
+    args = arg_parser.parse_args()
+
+    sizes = [parse_size(size) for size in args.sizes.split(',')]
+    stages = [stage.strip() for stage in args.stages.split(',') if stage.strip()]
+    unknown = [stage for stage in stages if stage not in STAGES]
+    if unknown:
+        print(f"Error: unknown stages: {', '.join(unknown)}")
+        sys.exit(1)
+
+    options = {'workers': args.workers, 'database_url': args.render_db}
+    work_root = args.work_dir or tempfile.mkdtemp(prefix='mm_bench_')
+
+    report = {
+        'version': REPORT_VERSION,
+        'created': datetime.now(timezone.utc).isoformat(),
+        'git_commit': _git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'results': []
+    }
+
+    try:
+        for size in sizes:
+            label = format_size(size)
+            root = os.path.join(work_root, label)
+            if not os.path.exists(os.path.join(root, 'data', 'comments.json')):
+                print(f"🔄 Generating {label} comment corpus in {root}...")
+                start = time.perf_counter()
+                generate_corpus(root, size)
+                print(f"   done in {time.perf_counter() - start:.1f}s")
+
+            for stage in stages:
+                if stage == 'render_import_csv' and not args.render_db:
+                    result = {'status': 'skipped', 'error': 'pass --render-db to benchmark the importer'}
+                else:
+                    print(f"⏱️  {stage} ({label})...")
+                    result = run_stage(stage, root, options)
+
+                result.update({'stage': stage, 'size': label, 'comments': size})
+                if result.get('status') == 'ok' and result['seconds']:
+                    result['items_per_second'] = round(result['items'] / result['seconds'])
+                report['results'].append(result)
+
+                if result['status'] == 'ok':
+                    print(f"   {result['seconds']:.2f}s, {result['items']:,} items, "
+                          f"peak RSS {result['peak_rss_mb']} MB")
+                else:
+                    print(f"   {result['status']}: {result.get('error')}")
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_root, ignore_errors=True)
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n✅ Report written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare_reports(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Streaming reader for mm_ig_comments export files.
+
+Each export is a JSON object of scraper runs:
+
+    {"<uuid>": {"target": "<shortcode>",
+                "logs": [{"storedIds": ["<comment_id>", ...], ...}, ...]}, ...}
+
+CommentExportReader walks the outer levels of the file with
+json_stream.JSONStream and decodes each log entry in one piece, yielding
+(shortcode, comment_id) pairs in file order without ever building the
+whole document, so exports larger than memory can be read. Only the
+comment IDs of a single entry whose `target` comes after its `logs` are
+held back until the target is known.
+"""
+
+from itertools import repeat
+
+from json_stream import JSONStream, READ_SIZE
+
+
+class ExportFormatError(ValueError):
+    """The file is valid JSON but not an export object"""
+
+
+class CommentExportReader:
+    """Iterate (shortcode, comment_id) pairs from an open export file.
+
+    Entries that are not objects, have no truthy `target`, or whose
+    `logs` / `storedIds` are not lists contribute nothing, matching how
+    the scripts treated them when they used json.load. A top-level array
+    of entries is accepted only with allow_array=True.
+
+    Counters are updated as the file is read:
+        entries          every top-level entry
+        invalid_entries  entries that are not objects
+        targeted_entries object entries with a truthy target
+    """
+
+    def __init__(self, f, allow_array=False, read_size=READ_SIZE):
+        self.stream = JSONStream(f, read_size)
+        self.allow_array = allow_array
+        self.entries = 0
+        self.invalid_entries = 0
+        self.targeted_entries = 0
+
+    def __iter__(self):
+        stream = self.stream
+        first = stream.peek()
+        if first == '{':
+            members = stream.iter_object()
+        elif first == '[' and self.allow_array:
+            members = stream.iter_array()
+        else:
+            kind = {'[': 'an array', '': 'an empty file'}.get(first, 'a scalar')
+            expected = 'a JSON object or array' if self.allow_array else 'a JSON object'
+            raise ExportFormatError(f"Expected {expected} of export entries, got {kind}")
+
+        for _ in members:
+            self.entries += 1
+            if stream.peek() != '{':
+                stream.decode_value()
+                self.invalid_entries += 1
+                continue
+            yield from self._read_entry()
+
+    def _read_entry(self):
+        stream = self.stream
+        shortcode = None
+        pending = []  # IDs seen before the entry's target
+
+        for key in stream.iter_object():
+            if key == 'target':
+                shortcode = stream.decode_value()
+                if shortcode and pending:
+                    yield from zip(repeat(shortcode), pending)
+                pending = []
+            elif key == 'logs' and stream.peek() == '[':
+                for stored_ids in self._read_logs():
+                    if shortcode:
+                        yield from zip(repeat(shortcode), stored_ids)
+                    elif shortcode is None:
+                        pending.extend(stored_ids)
+            else:
+                stream.decode_value()
+
+        if shortcode:
+            self.targeted_entries += 1
+
+    def _read_logs(self):
+        """Yield the storedIds list of each log entry"""
+        # Each log entry is decoded whole: one raw_decode per entry is far
+        # cheaper than walking its storedIds item by item, and memory stays
+        # bounded by the largest entry
+        stream = self.stream
+        for _ in stream.iter_array():
+            log = stream.decode_value()
+            if isinstance(log, dict):
+                stored_ids = log.get('storedIds')
+                if isinstance(stored_ids, list):
+                    yield stored_ids
+
+
+def iter_export_comment_ids(path, allow_array=False):
+    """Yield (shortcode, comment_id) pairs from the export file at `path`"""
+    with open(path, 'r') as f:
+        yield from CommentExportReader(f, allow_array)
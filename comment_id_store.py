@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Compact in-memory storage for large numbers of Instagram comment IDs.
+
+Comment IDs are 17-19 digit numeric strings. Kept as Python strings in a
+set plus a list of {'comment_id', 'post_shortcode'} dicts they cost
+hundreds of bytes each; packed as 64-bit integers they cost about 25:
+
+    CommentIdSet    exact dedupe: an open-addressing hash table of
+                    integers in a single array('Q')
+    CommentRecords  (comment_id, shortcode) rows in insertion order: IDs
+                    in an array('Q'), shortcodes interned to array('I')
+                    codes
+
+Only canonical decimal strings below 2**63 are packed (the string can be
+rebuilt exactly with str(int)). Anything else, such as IDs with leading
+zeros or numbers stored as JSON integers, falls back to ordinary Python
+objects, so dedupe stays exact for every ID.
+
+encode_id_deltas() / decode_id_deltas() serialize a sorted run of packed
+IDs as LEB128 varints: the count, then each ID's difference from the one
+before it (the first from 0). This is the binary chunk format the static
+comment loader decodes.
+"""
+
+import array
+
+# Canonical IDs are stored as int + 1 so that 0 can mark an empty slot
+_EMPTY = 0
+_MAX_PACKED = 1 << 63
+_FALLBACK_FLAG = 1 << 63
+
+# Fibonacci hashing: multiply, keep the top bits
+_MULTIPLIER = 0x9E3779B97F4A7C15
+_WORD = (1 << 64) - 1
+
+_MIN_CAPACITY_BITS = 10
+_MAX_LOAD = 0.7
+
+
+def pack_comment_id(comment_id):
+    """The integer for a canonical decimal ID string, or None if it can't be packed"""
+    if type(comment_id) is str and len(comment_id) <= 19 and comment_id.isdecimal():
+        # isdecimal() also accepts non-ASCII digits, so round-trip to reject
+        # those and leading zeros
+        value = int(comment_id)
+        if value < _MAX_PACKED and str(value) == comment_id:
+            return value
+    return None
+
+
+class CommentIdSet:
+    """Exact set of comment IDs with add() reporting whether the ID was new"""
+
+    def __init__(self):
+        self._bits = _MIN_CAPACITY_BITS
+        self._slots = array.array('Q', bytes(8 << self._bits))
+        self._packed_count = 0
+        self._grow_at = int(len(self._slots) * _MAX_LOAD)
+        self._fallback = set()
+
+    def _find(self, key):
+        """Slot index holding `key`, or the empty slot where it belongs"""
+        slots = self._slots
+        mask = len(slots) - 1
+        index = ((key * _MULTIPLIER) & _WORD) >> (64 - self._bits)
+        while True:
+            slot = slots[index]
+            if slot == key or slot == _EMPTY:
+                return index
+            index = (index + 1) & mask
+
+    def _grow(self):
+        old_slots = self._slots
+        self._bits += 1
+        self._slots = array.array('Q', bytes(8 << self._bits))
+        self._grow_at = int(len(self._slots) * _MAX_LOAD)
+        for key in old_slots:
+            if key != _EMPTY:
+                self._slots[self._find(key)] = key
+
+    def add(self, comment_id):
+        """Add an ID; returns True if it was not already present"""
+        value = pack_comment_id(comment_id)
+        if value is None:
+            if comment_id in self._fallback:
+                return False
+            self._fallback.add(comment_id)
+            return True
+
+        # Probe loop inlined from _find(): this is the hot path
+        key = value + 1
+        slots = self._slots
+        mask = len(slots) - 1
+        index = ((key * _MULTIPLIER) & _WORD) >> (64 - self._bits)
+        while True:
+            slot = slots[index]
+            if slot == key:
+                return False
+            if slot == _EMPTY:
+                break
+            index = (index + 1) & mask
+
+        slots[index] = key
+        self._packed_count += 1
+        if self._packed_count > self._grow_at:
+            self._grow()
+        return True
+
+    def __contains__(self, comment_id):
+        value = pack_comment_id(comment_id)
+        if value is None:
+            return comment_id in self._fallback
+        key = value + 1
+        return self._slots[self._find(key)] == key
+
+    def __len__(self):
+        return self._packed_count + len(self._fallback)
+
+    def memory_bytes(self):
+        """Approximate size of the packed table (excluding fallback IDs)"""
+        return len(self._slots) * self._slots.itemsize
+
+
+class CommentRecords:
+    """Append-only (comment_id, shortcode) rows.
+
+    Iterating or indexing yields {'comment_id': ..., 'post_shortcode': ...}
+    dicts built on demand, so it can stand in for the list of dicts that
+    save_to_csv() and insert_to_postgres() consume.
+    """
+
+    def __init__(self):
+        self._ids = array.array('Q')
+        self._codes = array.array('I')
+        self._fallback_ids = []
+        self._shortcode_codes = {}
+        self.shortcodes = []
+
+    def intern_shortcode(self, shortcode):
+        code = self._shortcode_codes.get(shortcode)
+        if code is None:
+            code = self._shortcode_codes[shortcode] = len(self.shortcodes)
+            self.shortcodes.append(shortcode)
+        return code
+
+    def append(self, comment_id, shortcode):
+        value = pack_comment_id(comment_id)
+        if value is None:
+            value = _FALLBACK_FLAG | len(self._fallback_ids)
+            self._fallback_ids.append(comment_id)
+        self._ids.append(value)
+        self._codes.append(self.intern_shortcode(shortcode))
+
+    def _comment_id(self, value):
+        if value & _FALLBACK_FLAG:
+            return self._fallback_ids[value & ~_FALLBACK_FLAG]
+        return str(value)
+
+    def iter_pairs(self):
+        """Yield (comment_id, shortcode) tuples in insertion order"""
+        shortcodes = self.shortcodes
+        for value, code in zip(self._ids, self._codes):
+            yield self._comment_id(value), shortcodes[code]
+
+    def __iter__(self):
+        for comment_id, shortcode in self.iter_pairs():
+            yield {'comment_id': comment_id, 'post_shortcode': shortcode}
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return {'comment_id': self._comment_id(self._ids[index]),
+                'post_shortcode': self.shortcodes[self._codes[index]]}
+
+    def __len__(self):
+        return len(self._ids)
+
+    def memory_bytes(self):
+        """Approximate size of the packed columns (excluding interned strings)"""
+        return len(self._ids) * self._ids.itemsize + len(self._codes) * self._codes.itemsize
+
+
+def _write_varint(out, value):
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def varint_size(value):
+    """Bytes _write_varint() uses for `value`"""
+    return max(1, (value.bit_length() + 6) // 7)
+
+
+def encode_id_deltas(values):
+    """Varint count + deltas for strictly increasing non-negative integers"""
+    out = bytearray()
+    _write_varint(out, len(values))
+    previous = None
+    for value in values:
+        if previous is None:
+            _write_varint(out, value)
+        elif value > previous:
+            _write_varint(out, value - previous)
+        else:
+            raise ValueError("IDs must be unique and sorted")
+        previous = value
+    return bytes(out)
+
+
+def decode_id_deltas(data):
+    """The integers encoded by encode_id_deltas()"""
+    values = []
+    position = 0
+    count = None
+    total = 0
+    while count is None or len(values) < count:
+        value = 0
+        shift = 0
+        while True:
+            byte = data[position]
+            position += 1
+            value |= (byte & 0x7F) << shift
+            shift += 7
+            if not byte & 0x80:
+                break
+        if count is None:
+            count = value
+        else:
+            total += value
+            values.append(total)
+    return values
@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+"""
+Columnar binary comment store.
+
+Comments are stored column by column instead of as repeated JSON objects:
+numeric fields as typed little-endian arrays, text fields as one UTF-8
+blob with offsets, and authors / video IDs as indexes into a single
+deduplicated string table. Rows are grouped by video (in the same order
+as video_comments_index.json) with per-video row offsets, so one video's
+comments are a contiguous slice of every column.
+
+File layout:
+    b'MMCS' | u32 version | u32 header length | JSON header | aligned arrays
+
+The header lists each array as [typecode, byte offset, item count].
+ColumnarCommentStore memory-maps the file and only decodes the rows that
+are asked for.
+"""
+
+import array
+import json
+import mmap
+import struct
+import sys
+
+MAGIC = b'MMCS'
+FORMAT_VERSION = 2
+# Version 1 files never have masks on numeric columns, so they read the same
+READABLE_VERSIONS = (1, 2)
+ALIGNMENT = 8
+
+# Fields stored as indexes into the shared string table
+INTERNED_FIELDS = ('video_id', 'author', 'author_display_name', 'author_channel_id')
+
+# Per-row mask values for nullable columns
+PRESENT, NULL, ABSENT = 0, 1, 2
+
+# Stands in for a field a comment doesn't have
+_MISSING = object()
+
+NO_STRING = 0xFFFFFFFF
+
+
+def _infer_column_type(name, values):
+    """Pick the most compact column type that can hold every present value losslessly.
+
+    None and missing values don't count: the column's mask records them,
+    whatever its type.
+    """
+    present = [value for value in values if value is not None and value is not _MISSING]
+    kinds = {type(value) for value in present}
+    if kinds == {bool}:
+        return 'bool'
+    if kinds == {int} and all(-(1 << 63) <= value < (1 << 63) for value in present):
+        return 'int'
+    if kinds == {float}:
+        return 'float'
+    if kinds <= {str}:
+        return 'interned' if name in INTERNED_FIELDS else 'str'
+    return 'json'
+
+
+class _StringTable:
+    """Deduplicated strings, addressed by position"""
+
+    def __init__(self):
+        self.positions = {}
+        self.strings = []
+
+    def intern(self, value):
+        position = self.positions.get(value)
+        if position is None:
+            position = self.positions[value] = len(self.strings)
+            self.strings.append(value)
+        return position
+
+
+def _pack_strings(strings):
+    """UTF-8 blob plus n+1 byte offsets"""
+    offsets = array.array('Q', [0])
+    parts = []
+    total = 0
+    for value in strings:
+        encoded = value.encode('utf-8')
+        parts.append(encoded)
+        total += len(encoded)
+        offsets.append(total)
+    return array.array('B', b''.join(parts)), offsets
+
+
+def write_columnar_store(path, video_comments_index):
+    """Write `video_comments_index` ({video_id: [comment, ...]}) as a columnar store.
+
+    The mapping is iterated twice (type inference, then encoding), so it
+    must be a real mapping rather than a one-shot generator. Returns the
+    number of comments written.
+    """
+    field_names = []
+    seen_fields = set()
+    row_count = 0
+    for comments in video_comments_index.values():
+        for comment in comments:
+            row_count += 1
+            for name in comment:
+                if name not in seen_fields:
+                    seen_fields.add(name)
+                    field_names.append(name)
+
+    column_types = {}
+    for name in field_names:
+        values = [comment.get(name, _MISSING) for comments in video_comments_index.values()
+                  for comment in comments]
+        column_types[name] = _infer_column_type(name, values)
+
+    strings = _StringTable()
+    arrays = {}
+
+    video_string_ids = array.array('I')
+    video_offsets = array.array('Q', [0])
+    for video_id, comments in video_comments_index.items():
+        video_string_ids.append(strings.intern(video_id))
+        video_offsets.append(video_offsets[-1] + len(comments))
+    arrays['videos.ids'] = video_string_ids
+    arrays['videos.offsets'] = video_offsets
+
+    for name in field_names:
+        column_type = column_types[name]
+        values = (comment.get(name, _MISSING) for comments in video_comments_index.values()
+                  for comment in comments)
+
+        mask = array.array('B')
+        if column_type in ('bool', 'int', 'float'):
+            typecode = {'bool': 'B', 'int': 'q', 'float': 'd'}[column_type]
+            numbers = array.array(typecode)
+            for value in values:
+                if value is _MISSING or value is None:
+                    mask.append(ABSENT if value is _MISSING else NULL)
+                    numbers.append(0)
+                else:
+                    mask.append(PRESENT)
+                    numbers.append(value)
+            arrays[f'{name}.values'] = numbers
+        elif column_type == 'interned':
+            ids = array.array('I')
+            for value in values:
+                if value is _MISSING or value is None:
+                    mask.append(ABSENT if value is _MISSING else NULL)
+                    ids.append(NO_STRING)
+                else:
+                    mask.append(PRESENT)
+                    ids.append(strings.intern(value))
+            arrays[f'{name}.values'] = ids
+        else:
+            texts = []
+            for value in values:
+                if value is _MISSING or value is None:
+                    mask.append(ABSENT if value is _MISSING else NULL)
+                    texts.append('')
+                else:
+                    mask.append(PRESENT)
+                    texts.append(value if column_type == 'str'
+                                 else json.dumps(value, ensure_ascii=False, separators=(',', ':')))
+            arrays[f'{name}.blob'], arrays[f'{name}.offsets'] = _pack_strings(texts)
+
+        if any(mask):
+            arrays[f'{name}.mask'] = mask
+
+    arrays['strings.blob'], arrays['strings.offsets'] = _pack_strings(strings.strings)
+
+    # Lay out arrays after the header, each aligned to 8 bytes
+    header = {
+        'rows': row_count,
+        'fields': [[name, column_types[name]] for name in field_names],
+        'arrays': {}
+    }
+    layout = []
+    position = 0
+    for key, values in arrays.items():
+        position = (position + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+        header['arrays'][key] = [values.typecode, position, len(values)]
+        layout.append((position, values))
+        position += len(values) * values.itemsize
+
+    header_bytes = json.dumps(header, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    data_start = (12 + len(header_bytes) + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+    with open(path, 'wb') as f:
+        f.write(MAGIC + struct.pack('<II', FORMAT_VERSION, len(header_bytes)) + header_bytes)
+        f.write(b'\0' * (data_start - f.tell()))
+        for offset, values in layout:
+            f.write(b'\0' * (data_start + offset - f.tell()))
+            if sys.byteorder == 'big' and values.itemsize > 1:
+                values = array.array(values.typecode, values)
+                values.byteswap()
+            values.tofile(f)
+
+    return row_count
+
+
+class ColumnarCommentStore:
+    """Read-only access to a file written by write_columnar_store().
+
+    Columns are memory-mapped; get_comments() decodes just the requested
+    rows. Use as a context manager or call close() when done.
+    """
+
+    def __init__(self, path):
+        self._cache = {}
+        self._views = []
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._map[:4] != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a columnar comment store")
+        version, header_length = struct.unpack_from('<II', self._map, 4)
+        if version not in READABLE_VERSIONS:
+            self.close()
+            raise ValueError(f"Unsupported columnar store version {version}")
+
+        header = json.loads(self._map[12:12 + header_length].decode('utf-8'))
+        self._data_start = (12 + header_length + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+        self._arrays = header['arrays']
+        self.row_count = header['rows']
+        self.fields = [name for name, _ in header['fields']]
+        self.field_types = dict(header['fields'])
+
+        strings = self._array('strings.offsets')
+        self._strings = self._decode_strings('strings.blob', strings, 0, len(strings) - 1)
+
+        offsets = self._array('videos.offsets')
+        self._video_ranges = {}
+        for i, string_id in enumerate(self._array('videos.ids')):
+            self._video_ranges[self._strings[string_id]] = (offsets[i], offsets[i + 1])
+
+    def _array(self, key):
+        """Typed view of one stored array (copied only on big-endian hosts)"""
+        if key not in self._cache:
+            typecode, offset, count = self._arrays[key]
+            start = self._data_start + offset
+            size = array.array(typecode).itemsize
+            if sys.byteorder == 'big' and size > 1:
+                values = array.array(typecode, self._map[start:start + count * size])
+                values.byteswap()
+                view = memoryview(values)
+            else:
+                base = memoryview(self._map)
+                window = base[start:start + count * size]
+                view = window.cast(typecode)
+                self._views.extend([base, window])
+            self._views.append(view)
+            self._cache[key] = view
+        return self._cache[key]
+
+    def _decode_strings(self, blob_key, offsets, start, stop):
+        blob = self._array(blob_key)
+        return [bytes(blob[offsets[i]:offsets[i + 1]]).decode('utf-8') for i in range(start, stop)]
+
+    def __len__(self):
+        return self.row_count
+
+    def video_ids(self):
+        """Video IDs in stored order"""
+        return list(self._video_ranges)
+
+    def count(self, video_id):
+        """Number of comments stored for a video"""
+        start, stop = self._video_ranges.get(video_id, (0, 0))
+        return stop - start
+
+    def column(self, name, video_id=None):
+        """Raw typed values of a numeric column (bool/int/float) as a memoryview.
+
+        Rows that are null or absent hold 0; mask() tells them apart.
+        """
+        if self.field_types.get(name) not in ('bool', 'int', 'float'):
+            raise ValueError(f"{name} is not a numeric column")
+        values = self._array(f'{name}.values')
+        if video_id is None:
+            return values
+        start, stop = self._video_ranges.get(video_id, (0, 0))
+        return values[start:stop]
+
+    def mask(self, name, video_id=None):
+        """Per-row PRESENT/NULL/ABSENT flags of a column, or None if every row is present"""
+        if name not in self.field_types:
+            raise ValueError(f"Unknown column {name}")
+        if f'{name}.mask' not in self._arrays:
+            return None
+        flags = self._array(f'{name}.mask')
+        if video_id is None:
+            return flags
+        start, stop = self._video_ranges.get(video_id, (0, 0))
+        return flags[start:stop]
+
+    def _column_values(self, name, start, stop):
+        column_type = self.field_types[name]
+        if column_type in ('bool', 'int', 'float'):
+            values = self._array(f'{name}.values')[start:stop].tolist()
+            if column_type == 'bool':
+                values = [bool(value) for value in values]
+        elif column_type == 'interned':
+            values = [self._strings[i] if i != NO_STRING else None
+                      for i in self._array(f'{name}.values')[start:stop]]
+        else:
+            values = self._decode_strings(f'{name}.blob', self._array(f'{name}.offsets'), start, stop)
+            if column_type == 'json':
+                values = [json.loads(value) if value else None for value in values]
+
+        if f'{name}.mask' in self._arrays:
+            mask = self._array(f'{name}.mask')[start:stop]
+            values = [_MISSING if flag == ABSENT else None if flag == NULL else value
+                      for value, flag in zip(values, mask)]
+        return values
+
+    def get_comments(self, video_id, start=0, stop=None):
+        """Comments for one video as dicts, in stored order, optionally sliced"""
+        video_start, video_stop = self._video_ranges.get(video_id, (0, 0))
+        row_start = min(video_start + start, video_stop)
+        row_stop = video_stop if stop is None else min(video_start + stop, video_stop)
+        if row_stop <= row_start:
+            return []
+
+        columns = [(name, self._column_values(name, row_start, row_stop)) for name in self.fields]
+        comments = []
+        for row in range(row_stop - row_start):
+            comment = {}
+            for name, values in columns:
+                value = values[row]
+                if value is not _MISSING:
+                    comment[name] = value
+            comments.append(comment)
+        return comments
+
+    def iter_comments(self):
+        """Yield every (video_id, comments) pair in stored order"""
+        for video_id in self._video_ranges:
+            yield video_id, self.get_comments(video_id)
+
+    def close(self):
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        self._cache = {}
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                pass  # a caller still holds a column() view; the map closes when it is freed
+            self._map = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
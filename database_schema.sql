@@ -22,20 +22,28 @@ CREATE TABLE IF NOT EXISTS comments (
 );
 
 -- Indexes for performance
-CREATE INDEX idx_comments_post_shortcode ON comments(post_shortcode);
-CREATE INDEX idx_comments_comment_id ON comments(comment_id);
-CREATE INDEX idx_posts_shortcode ON posts(shortcode);
-CREATE INDEX idx_posts_created_at ON posts(created_at);
+-- (comments.comment_id and posts.shortcode are already indexed by their UNIQUE constraints)
+DROP INDEX IF EXISTS idx_comments_comment_id;
+DROP INDEX IF EXISTS idx_posts_shortcode;
+CREATE INDEX IF NOT EXISTS idx_comments_post_shortcode ON comments(post_shortcode);
+CREATE INDEX IF NOT EXISTS idx_posts_created_at ON posts(created_at);
 
--- View for comment statistics per post
-CREATE VIEW post_comment_stats AS
+-- Stored comment count per post, recomputed at the end of each import
+-- by refresh_post_comment_counts.sql
+CREATE TABLE IF NOT EXISTS post_comment_counts (
+    post_shortcode VARCHAR(50) PRIMARY KEY,
+    comment_count BIGINT NOT NULL DEFAULT 0,
+    FOREIGN KEY (post_shortcode) REFERENCES posts(shortcode) ON DELETE CASCADE
+);
+
+-- View for comment statistics per post (reads the stored counts)
+CREATE OR REPLACE VIEW post_comment_stats AS
 SELECT 
     p.shortcode,
     p.post_url,
     p.created_at,
     p.likes,
     p.comment_count as metadata_comment_count,
-    COUNT(c.id) as actual_comment_count
+    COALESCE(s.comment_count, 0) as actual_comment_count
 FROM posts p
-LEFT JOIN comments c ON p.shortcode = c.post_shortcode
-GROUP BY p.shortcode, p.post_url, p.created_at, p.likes, p.comment_count;
\ No newline at end of file
+LEFT JOIN post_comment_counts s ON p.shortcode = s.post_shortcode;
\ No newline at end of file
@@ -0,0 +1,23 @@
+-- Bulk-load schema for Instagram Archive Comments (import_to_render.py --bulk)
+--
+-- Same tables as database_schema.sql but with no keys, constraints or
+-- indexes, so rows load without maintaining B-trees or checking foreign
+-- keys. database_schema_bulk_finalize.sql adds them after the load.
+
+CREATE TABLE posts (
+    id SERIAL,
+    shortcode VARCHAR(50) NOT NULL,
+    post_url TEXT,
+    created_at TIMESTAMP,
+    likes INTEGER DEFAULT 0,
+    comment_count INTEGER DEFAULT 0,
+    caption TEXT,
+    created_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE comments (
+    id SERIAL,
+    comment_id VARCHAR(50) NOT NULL,
+    post_shortcode VARCHAR(50) NOT NULL,
+    created_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
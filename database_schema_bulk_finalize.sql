@@ -0,0 +1,48 @@
+-- Finish a bulk load started with database_schema_bulk.sql
+--
+-- Resolves duplicate rows the way the incremental importer does, then
+-- builds every key, constraint and index once, leaving the same schema
+-- as database_schema.sql.
+
+-- A repeated post keeps its last row; a repeated comment keeps its first
+DELETE FROM posts a USING posts b
+WHERE a.shortcode = b.shortcode AND a.id < b.id;
+
+DELETE FROM comments a USING comments b
+WHERE a.comment_id = b.comment_id AND a.id > b.id;
+
+-- Keys and constraints (names match those database_schema.sql creates)
+ALTER TABLE posts ADD CONSTRAINT posts_pkey PRIMARY KEY (id);
+ALTER TABLE posts ADD CONSTRAINT posts_shortcode_key UNIQUE (shortcode);
+
+ALTER TABLE comments ADD CONSTRAINT comments_pkey PRIMARY KEY (id);
+ALTER TABLE comments ADD CONSTRAINT comments_comment_id_key UNIQUE (comment_id);
+ALTER TABLE comments ADD CONSTRAINT comments_post_shortcode_fkey
+    FOREIGN KEY (post_shortcode) REFERENCES posts(shortcode) ON DELETE CASCADE;
+
+-- Indexes (shortcode and comment_id are already indexed by their UNIQUE constraints)
+CREATE INDEX idx_comments_post_shortcode ON comments(post_shortcode);
+CREATE INDEX idx_posts_created_at ON posts(created_at);
+
+-- Stored comment count per post, recomputed at the end of each import
+-- by refresh_post_comment_counts.sql (import_to_render.py runs it after this file)
+CREATE TABLE post_comment_counts (
+    post_shortcode VARCHAR(50) PRIMARY KEY,
+    comment_count BIGINT NOT NULL DEFAULT 0,
+    FOREIGN KEY (post_shortcode) REFERENCES posts(shortcode) ON DELETE CASCADE
+);
+
+-- View for comment statistics per post (reads the stored counts)
+CREATE VIEW post_comment_stats AS
+SELECT 
+    p.shortcode,
+    p.post_url,
+    p.created_at,
+    p.likes,
+    p.comment_count as metadata_comment_count,
+    COALESCE(s.comment_count, 0) as actual_comment_count
+FROM posts p
+LEFT JOIN post_comment_counts s ON p.shortcode = s.post_shortcode;
+
+ANALYZE posts;
+ANALYZE comments;
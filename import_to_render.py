@@ -5,16 +5,150 @@ Handles large data volumes with batching and progress tracking
 """
 import os
 import csv
+import io
+import json
 import psycopg2
 from psycopg2.extras import execute_batch
+from psycopg2.pool import ThreadedConnectionPool
 import time
+import queue
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import sys
+import argparse
+
+class CopyProgress:
+    """Binary file wrapper that prints progress and ETA while COPY reads it.
+    
+    Rows are estimated from newlines seen so far and the file size, so no
+    separate counting pass over the CSV is needed.
+    """
+    
+    def __init__(self, f, total_bytes, label, interval=0.5):
+        self.f = f
+        self.total_bytes = total_bytes
+        self.label = label
+        self.interval = interval
+        self.bytes_read = 0
+        self.lines_read = 0
+        self.start_time = time.time()
+        self.last_report = 0
+    
+    def read(self, size=-1):
+        return self._track(self.f.read(size))
+    
+    def readline(self, size=-1):
+        return self._track(self.f.readline(size))
+    
+    def _track(self, data):
+        self.bytes_read += len(data)
+        self.lines_read += data.count(b'\n')
+        now = time.time()
+        if not data or now - self.last_report >= self.interval:
+            self.last_report = now
+            self.report(end='' if data else '\n')
+        return data
+    
+    @property
+    def rows(self):
+        return max(0, self.lines_read - 1)  # Subtract header
+    
+    def report(self, end=''):
+        elapsed = time.time() - self.start_time
+        fraction = self.bytes_read / self.total_bytes if self.total_bytes else 1
+        rate = self.rows / elapsed if elapsed > 0 else 0
+        byte_rate = self.bytes_read / elapsed if elapsed > 0 else 0
+        eta = (self.total_bytes - self.bytes_read) / byte_rate if byte_rate > 0 else 0
+        estimated_total = int(self.rows / fraction) if fraction > 0 else 0
+        print(f"\r  Sent {self.rows:,}/~{estimated_total:,} {self.label} "
+              f"({int(fraction * 100)}%) - "
+              f"Rate: {rate:.0f}/s - ETA: {eta/60:.1f} min", end=end)
+
+# Column order of the posts data produced by _posts_copy_buffer()
+POST_COPY_COLUMNS = 'shortcode, post_url, created_at, likes, comment_count, caption'
+# csv.writer quotes the empty field written for a missing created_at, which
+# COPY would read as '' rather than NULL; FORCE_NULL reads it as NULL
+POST_COPY_OPTIONS = 'FORMAT csv, FORCE_NULL (created_at)'
+
+# Queue marker telling parallel import workers to roll back and stop
+_ABORT = object()
+
+class TrackedLines:
+    """Decoded lines of a binary file, tracking the byte offset consumed.
+    
+    csv.reader pulls one line at a time, so after it yields a row `offset`
+    is exactly where the next row starts.
+    """
+    
+    def __init__(self, f, encoding='utf-8'):
+        self.f = f
+        self.encoding = encoding
+        self.offset = f.tell()
+    
+    def __iter__(self):
+        return self
+    
+    def __next__(self):
+        line = self.f.readline()
+        if not line:
+            raise StopIteration
+        self.offset += len(line)
+        return line.decode(self.encoding)
+    
+    def seek(self, offset):
+        self.f.seek(offset)
+        self.offset = offset
+
+class ImportCheckpoint:
+    """Durable record of how far an import of one CSV file has committed.
+    
+    Stored next to the CSV as <name>.checkpoint. It is ignored if the CSV's
+    size or modification time no longer match.
+    """
+    
+    def __init__(self, csv_path):
+        self.csv_path = csv_path
+        self.path = csv_path + '.checkpoint'
+    
+    def _source(self):
+        stat = os.stat(self.csv_path)
+        return {'size': stat.st_size, 'mtime': stat.st_mtime}
+    
+    def load(self):
+        """(byte offset, committed rows) to resume from; (0, 0) if none"""
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return 0, 0
+        
+        if data.get('source') != self._source():
+            print(f"  {self.csv_path} changed since the last checkpoint, starting over")
+            return 0, 0
+        
+        return data['offset'], data['rows']
+    
+    def save(self, offset, rows):
+        """Atomically record that everything before `offset` is committed"""
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump({'source': self._source(), 'offset': offset, 'rows': rows}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+    
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
 
 class RenderImporter:
     def __init__(self, database_url):
         self.database_url = database_url
         self.batch_size = 5000  # Optimal batch size for network operations
+        self.commit_interval = 50000  # Rows per transaction / checkpoint
+        self.queue_depth = 4  # Batches buffered per parallel worker
         
     def connect(self):
         """Create database connection with optimal settings"""
@@ -98,23 +232,40 @@ class RenderImporter:
         """
         execute_batch(cur, query, batch, page_size=self.batch_size)
     
-    def import_comments(self):
-        """Import comments with progress tracking and memory optimization"""
+    def import_comments(self, resume=True):
+        """Import comments with progress tracking and memory optimization.
+        
+        After every commit the byte offset and row count reached are saved
+        to a checkpoint file, so a run that dies part-way resumes from the
+        last committed batch (re-sent rows are skipped by ON CONFLICT).
+        Progress is measured in bytes, so there is no counting pass.
+        """
         print("\nImporting comments (this may take several minutes)...")
         conn = self.connect()
         cur = conn.cursor()
         
         comments_file = './data/parsed/comments.csv'
+        checkpoint = ImportCheckpoint(comments_file)
+        total_bytes = os.path.getsize(comments_file)
         
-        # Count total for progress
-        print("  Counting comments...")
-        total_rows = sum(1 for _ in open(comments_file)) - 1
-        print(f"  Total comments to import: {total_rows:,}")
+        offset, imported = checkpoint.load() if resume else (0, 0)
+        if offset:
+            print(f"  Resuming after {imported:,} committed comments "
+                  f"({offset*100//total_bytes}% of {comments_file})")
+        elif not resume:
+            checkpoint.clear()
         
-        with open(comments_file, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
+        with open(comments_file, 'rb') as f:
+            lines = TrackedLines(f)
+            reader = csv.DictReader(lines)
+            if offset:
+                reader.fieldnames  # Read the header before jumping ahead
+                lines.seek(offset)
+            
             batch = []
-            imported = 0
+            uncommitted = 0
+            start_offset = lines.offset
+            start_rows = imported
             start_time = time.time()
             
             for row in reader:
@@ -126,21 +277,26 @@ class RenderImporter:
                 if len(batch) >= self.batch_size:
                     self._insert_comments_batch(cur, batch)
                     imported += len(batch)
+                    uncommitted += len(batch)
                     
-                    # Progress reporting
+                    # Progress reporting, by bytes read this run
                     elapsed = time.time() - start_time
-                    rate = imported / elapsed if elapsed > 0 else 0
-                    eta = (total_rows - imported) / rate if rate > 0 else 0
+                    done = lines.offset - start_offset
+                    byte_rate = done / elapsed if elapsed > 0 else 0
+                    rate = (imported - start_rows) / elapsed if elapsed > 0 else 0
+                    eta = (total_bytes - lines.offset) / byte_rate if byte_rate > 0 else 0
                     
-                    print(f"  Imported {imported:,}/{total_rows:,} comments "
-                          f"({imported*100//total_rows}%) - "
+                    print(f"  Imported {imported:,} comments "
+                          f"({lines.offset*100//total_bytes}%) - "
                           f"Rate: {rate:.0f}/s - ETA: {eta/60:.1f} min", end='\r')
                     
                     batch = []
                     
                     # Commit periodically to avoid long transactions
-                    if imported % 50000 == 0:
+                    if uncommitted >= self.commit_interval:
                         conn.commit()
+                        checkpoint.save(lines.offset, imported)
+                        uncommitted = 0
             
             # Insert remaining
             if batch:
@@ -148,13 +304,138 @@ class RenderImporter:
                 imported += len(batch)
             
             elapsed = time.time() - start_time
-            print(f"\n  Imported {imported:,}/{total_rows:,} comments (100%) "
+            print(f"\n  Imported {imported:,} comments (100%) "
                   f"in {elapsed/60:.1f} minutes")
         
         conn.commit()
+        checkpoint.clear()
         cur.close()
         conn.close()
     
+    def import_comments_parallel(self, workers):
+        """Import comments over `workers` connections at once.
+        
+        Rows are partitioned by a hash of their post shortcode, one
+        partition per worker, so all comments of a post go through the same
+        connection. The reader hands each worker batches through a bounded
+        queue, which caps memory, and each worker commits its whole
+        partition in one transaction. If a partition fails, its rows roll
+        back; the other partitions still commit and a re-run skips them via
+        ON CONFLICT.
+        """
+        print(f"\nImporting comments over {workers} connections...")
+        pool = ThreadedConnectionPool(
+            workers, workers, self.database_url,
+            cursor_factory=psycopg2.extras.RealDictCursor,
+            connect_timeout=30
+        )
+        
+        comments_file = './data/parsed/comments.csv'
+        total_bytes = os.path.getsize(comments_file)
+        queues = [queue.Queue(maxsize=self.queue_depth) for _ in range(workers)]
+        lock = threading.Lock()
+        progress = {'imported': 0}
+        partition_rows = [0] * workers
+        
+        def load_partition(partition):
+            """Insert one partition's batches; returns the error that stopped it, if any.
+            
+            Always drains its queue to the end, even after an error, so the
+            reader can never block on a dead worker.
+            """
+            conn = cur = None
+            error = None
+            while True:
+                batch = queues[partition].get()
+                if batch is None:
+                    break
+                if batch is _ABORT:
+                    error = error or RuntimeError("reading comments.csv failed")
+                    break
+                if error:
+                    continue
+                try:
+                    if conn is None:
+                        conn = pool.getconn()
+                        cur = conn.cursor()
+                    self._insert_comments_batch(cur, batch)
+                    partition_rows[partition] += len(batch)
+                    with lock:
+                        progress['imported'] += len(batch)
+                except Exception as e:
+                    error = e
+            
+            if conn is not None:
+                try:
+                    if error:
+                        conn.rollback()
+                    else:
+                        conn.commit()
+                except Exception as e:
+                    error = error or e
+                finally:
+                    cur.close()
+                    pool.putconn(conn)
+            return error
+        
+        start_time = time.time()
+        last_report = 0
+        
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = [executor.submit(load_partition, partition) for partition in range(workers)]
+                finished = False
+                
+                try:
+                    with open(comments_file, 'rb') as f:
+                        lines = TrackedLines(f)
+                        batches = [[] for _ in range(workers)]
+                        
+                        for row in csv.DictReader(lines):
+                            shortcode = row['post_shortcode']
+                            partition = zlib.crc32(shortcode.encode('utf-8')) % workers
+                            batch = batches[partition]
+                            batch.append((row['comment_id'], shortcode))
+                            
+                            if len(batch) >= self.batch_size:
+                                queues[partition].put(batch)
+                                batches[partition] = []
+                                
+                                # Aggregate progress across workers, by bytes read
+                                now = time.time()
+                                if now - last_report >= 0.5:
+                                    last_report = now
+                                    elapsed = now - start_time
+                                    rate = progress['imported'] / elapsed if elapsed > 0 else 0
+                                    byte_rate = lines.offset / elapsed if elapsed > 0 else 0
+                                    eta = (total_bytes - lines.offset) / byte_rate if byte_rate > 0 else 0
+                                    print(f"  Imported {progress['imported']:,} comments "
+                                          f"({lines.offset*100//total_bytes}% read) - "
+                                          f"Rate: {rate:.0f}/s - ETA: {eta/60:.1f} min", end='\r')
+                        
+                        for partition, batch in enumerate(batches):
+                            if batch:
+                                queues[partition].put(batch)
+                    finished = True
+                finally:
+                    # Always release the workers; if reading failed they roll back
+                    for partition_queue in queues:
+                        partition_queue.put(None if finished else _ABORT)
+                errors = {partition: future.result() for partition, future in enumerate(futures)}
+        finally:
+            pool.closeall()
+        
+        elapsed = time.time() - start_time
+        failed = {partition: error for partition, error in errors.items() if error}
+        committed_rows = sum(rows for partition, rows in enumerate(partition_rows) if partition not in failed)
+        print(f"\n  Imported {committed_rows:,} comments in {elapsed/60:.1f} minutes "
+              f"({workers - len(failed)}/{workers} partitions committed)")
+        
+        if failed:
+            for partition, error in failed.items():
+                print(f"  Partition {partition} rolled back: {error}")
+            raise RuntimeError(f"{len(failed)} partition(s) failed; re-run to import them")
+    
     def _insert_comments_batch(self, cur, batch):
         """Insert batch of comments"""
         query = """
@@ -164,6 +445,187 @@ class RenderImporter:
         """
         execute_batch(cur, query, batch, page_size=self.batch_size)
     
+    def _posts_copy_buffer(self):
+        """posts.csv converted for COPY (columns POST_COPY_COLUMNS); returns (buffer, rows)
+        
+        Posts are small, so values are converted in Python exactly as
+        import_posts() does and held in memory.
+        """
+        posts_file = './data/parsed/posts.csv'
+        buffer = io.StringIO()
+        # Quote strings so empty captions stay ''; see POST_COPY_OPTIONS for created_at
+        writer = csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC)
+        rows = 0
+        with open(posts_file, 'r', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                created_at = None
+                if row['created_at']:
+                    try:
+                        created_at = datetime.fromisoformat(row['created_at'])
+                    except:
+                        pass
+                
+                writer.writerow([
+                    row['shortcode'],
+                    row['post_url'],
+                    created_at.isoformat(sep=' ') if created_at else None,
+                    int(row['likes']) if row['likes'] else 0,
+                    int(row['comment_count']) if row['comment_count'] else 0,
+                    row['caption']
+                ])
+                rows += 1
+        buffer.seek(0)
+        return buffer, rows
+    
+    def copy_posts(self):
+        """Bulk-load posts with COPY into a staging table, then merge.
+        
+        Matches import_posts(): existing posts get their likes and
+        comment_count updated, and if a shortcode repeats in the CSV the
+        last row wins.
+        """
+        print("\nImporting posts (COPY)...")
+        conn = self.connect()
+        cur = conn.cursor()
+        
+        buffer, rows = self._posts_copy_buffer()
+        
+        cur.execute("""
+            CREATE TEMP TABLE posts_staging (
+                line BIGSERIAL,
+                shortcode VARCHAR(50),
+                post_url TEXT,
+                created_at TIMESTAMP,
+                likes INTEGER,
+                comment_count INTEGER,
+                caption TEXT
+            ) ON COMMIT DROP
+        """)
+        cur.copy_expert(f"COPY posts_staging ({POST_COPY_COLUMNS}) FROM STDIN WITH ({POST_COPY_OPTIONS})", buffer)
+        print(f"  Staged {rows:,} posts")
+        
+        cur.execute("""
+            INSERT INTO posts (shortcode, post_url, created_at, likes, comment_count, caption)
+            SELECT DISTINCT ON (shortcode)
+                shortcode, post_url, created_at, likes, comment_count, caption
+            FROM posts_staging
+            ORDER BY shortcode, line DESC
+            ON CONFLICT (shortcode) DO UPDATE SET
+                likes = EXCLUDED.likes,
+                comment_count = EXCLUDED.comment_count
+        """)
+        print(f"  Merged {cur.rowcount:,} posts")
+        
+        conn.commit()
+        cur.close()
+        conn.close()
+    
+    def copy_comments(self):
+        """Bulk-load comments by streaming comments.csv through COPY.
+        
+        Rows go into a temporary staging table, then one set-based INSERT
+        merges them into comments, skipping IDs that already exist, as
+        import_comments() does. Everything commits in one transaction.
+        """
+        print("\nImporting comments (COPY)...")
+        conn = self.connect()
+        cur = conn.cursor()
+        
+        comments_file = './data/parsed/comments.csv'
+        start_time = time.time()
+        
+        cur.execute("""
+            CREATE TEMP TABLE comments_staging (
+                comment_id VARCHAR(50),
+                post_shortcode VARCHAR(50)
+            ) ON COMMIT DROP
+        """)
+        
+        with open(comments_file, 'rb') as f:
+            progress = CopyProgress(f, os.path.getsize(comments_file), 'comments')
+            cur.copy_expert(
+                "COPY comments_staging (comment_id, post_shortcode) FROM STDIN WITH (FORMAT csv, HEADER true)",
+                progress
+            )
+        staged = cur.rowcount if cur.rowcount >= 0 else progress.rows
+        
+        print(f"  Merging {staged:,} staged comments...")
+        cur.execute("""
+            INSERT INTO comments (comment_id, post_shortcode)
+            SELECT comment_id, post_shortcode FROM comments_staging
+            ON CONFLICT (comment_id) DO NOTHING
+        """)
+        inserted = cur.rowcount
+        
+        conn.commit()
+        cur.close()
+        conn.close()
+        
+        elapsed = time.time() - start_time
+        print(f"  Imported {inserted:,} new comments ({staged - inserted:,} already present) "
+              f"in {elapsed/60:.1f} minutes")
+    
+    def bulk_import(self):
+        """Initial load into an empty database, deferring indexes and constraints.
+        
+        Creates bare tables (database_schema_bulk.sql), COPYs both CSVs
+        straight into them, then resolves duplicates and builds every key,
+        constraint and index in one pass (database_schema_bulk_finalize.sql).
+        It all runs in one transaction, so a failure leaves nothing behind.
+        """
+        print("\nBulk-loading into an empty database...")
+        conn = self.connect()
+        cur = conn.cursor()
+        
+        cur.execute("SELECT to_regclass('posts') IS NOT NULL OR to_regclass('comments') IS NOT NULL AS existing")
+        if cur.fetchone()['existing']:
+            cur.close()
+            conn.close()
+            raise RuntimeError("Bulk mode creates the tables itself and needs an empty database; "
+                               "use --copy to merge into existing tables")
+        
+        start_time = time.time()
+        with open('database_schema_bulk.sql', 'r') as f:
+            cur.execute(f.read())
+        
+        buffer, rows = self._posts_copy_buffer()
+        cur.copy_expert(f"COPY posts ({POST_COPY_COLUMNS}) FROM STDIN WITH ({POST_COPY_OPTIONS})", buffer)
+        print(f"  Loaded {rows:,} posts")
+        
+        comments_file = './data/parsed/comments.csv'
+        with open(comments_file, 'rb') as f:
+            progress = CopyProgress(f, os.path.getsize(comments_file), 'comments')
+            cur.copy_expert(
+                "COPY comments (comment_id, post_shortcode) FROM STDIN WITH (FORMAT csv, HEADER true)",
+                progress
+            )
+        print(f"  Loaded {progress.rows:,} comments in {(time.time() - start_time)/60:.1f} minutes")
+        
+        print("  Building indexes and validating constraints...")
+        finalize_start = time.time()
+        with open('database_schema_bulk_finalize.sql', 'r') as f:
+            cur.execute(f.read())
+        
+        conn.commit()
+        cur.close()
+        conn.close()
+        print(f"  Finalized in {(time.time() - finalize_start)/60:.1f} minutes")
+    
+    def refresh_comment_counts(self):
+        """Recompute the stored per-post comment counts in one transaction"""
+        print("\nRefreshing per-post comment counts...")
+        conn = self.connect()
+        cur = conn.cursor()
+        
+        start_time = time.time()
+        with open('refresh_post_comment_counts.sql', 'r') as f:
+            cur.execute(f.read())
+        
+        conn.commit()
+        cur.close()
+        conn.close()
+        print(f"  Refreshed in {time.time() - start_time:.1f} seconds")
+    
     def verify_import(self):
         """Verify import completed successfully"""
         print("\nVerifying import...")
@@ -177,15 +639,20 @@ class RenderImporter:
         cur.execute("SELECT COUNT(*) as count FROM comments")
         comment_count = cur.fetchone()['count']
         
+        cur.execute("SELECT COALESCE(SUM(comment_count), 0) as count FROM post_comment_counts")
+        counted_comments = cur.fetchone()['count']
+        
         print(f"  Posts in database: {post_count:,}")
         print(f"  Comments in database: {comment_count:,}")
+        if counted_comments != comment_count:
+            print(f"  Warning: stored per-post counts total {counted_comments:,}; "
+                  f"run refresh_post_comment_counts.sql")
         
-        # Check a sample
+        # Check a sample (stored counts, no aggregation over comments)
         cur.execute("""
-            SELECT p.shortcode, p.likes, COUNT(c.comment_id) as actual_comments
+            SELECT p.shortcode, p.likes, COALESCE(s.comment_count, 0) as actual_comments
             FROM posts p
-            LEFT JOIN comments c ON p.shortcode = c.post_shortcode
-            GROUP BY p.shortcode, p.likes
+            LEFT JOIN post_comment_counts s ON p.shortcode = s.post_shortcode
             ORDER BY p.likes DESC
             LIMIT 5
         """)
@@ -199,6 +666,17 @@ class RenderImporter:
         conn.close()
 
 def main():
+    arg_parser = argparse.ArgumentParser(description='Import parsed CSVs into Render PostgreSQL')
+    arg_parser.add_argument('--copy', action='store_true',
+                            help='Bulk-load with COPY into staging tables instead of batched INSERTs')
+    arg_parser.add_argument('--bulk', action='store_true',
+                            help='Initial load into an empty database: bare tables, then indexes and constraints')
+    arg_parser.add_argument('--restart', action='store_true',
+                            help='Ignore any saved checkpoint and import comments from the beginning')
+    arg_parser.add_argument('--workers', type=int, default=1,
+                            help='Parallel connections for importing comments (each commits one partition)')
+    args = arg_parser.parse_args()
+    
     # Get database URL
     database_url = os.environ.get('DATABASE_URL')
     if not database_url:
@@ -215,12 +693,22 @@ def main():
     importer = RenderImporter(database_url)
     
     try:
-        # Create schema
-        importer.create_schema()
-        
         # Import data
-        importer.import_posts()
-        importer.import_comments()
+        if args.bulk:
+            importer.bulk_import()
+        elif args.copy:
+            importer.create_schema()
+            importer.copy_posts()
+            importer.copy_comments()
+        else:
+            importer.create_schema()
+            importer.import_posts()
+            if args.workers > 1:
+                importer.import_comments_parallel(args.workers)
+            else:
+                importer.import_comments(resume=not args.restart)
+        
+        importer.refresh_comment_counts()
         
         # Verify
         importer.verify_import()
@@ -3,6 +3,46 @@
  * Manages JSON loading, IndexedDB storage, and data querying
  * Now supports both YouTube and Instagram data
  */
+
+const SEARCH_EXPANSION_CACHE_SIZE = 200;
+
+/** Terms in the sorted array `sorted` that start with `prefix` */
+function termsWithPrefix(sorted, prefix) {
+    let low = 0;
+    let high = sorted.length;
+    while (low < high) {
+        const mid = (low + high) >> 1;
+        if (sorted[mid] < prefix) low = mid + 1;
+        else high = mid;
+    }
+    const terms = [];
+    for (let i = low; i < sorted.length && sorted[i].startsWith(prefix); i++) {
+        terms.push(sorted[i]);
+    }
+    return terms;
+}
+
+function reverseString(text) {
+    return text.split('').reverse().join('');
+}
+
+/** Map each three-character sequence to the indexes of the terms containing it */
+function buildTrigramIndex(terms) {
+    const trigrams = new Map();
+    terms.forEach((term, index) => {
+        for (let i = 0; i + 3 <= term.length; i++) {
+            const trigram = term.slice(i, i + 3);
+            const termIndexes = trigrams.get(trigram);
+            if (!termIndexes) {
+                trigrams.set(trigram, [index]);
+            } else if (termIndexes[termIndexes.length - 1] !== index) {
+                termIndexes.push(index);
+            }
+        }
+    });
+    return trigrams;
+}
+
 class DataManager {
     constructor() {
         this.db = null;
@@ -21,6 +61,15 @@ class DataManager {
         this.videoCommentsIndex = null;
         this.searchIndex = null;
         this.wordFreqIndex = null;
+        this.searchTerms = null; // Lookup structures over searchIndex.terms, built on first search
+        this.commentsById = null;
+        
+        // Sharded pre-indexed comments: manifest of counts/shard files, loaded on demand
+        this.videoCommentsManifest = null;
+        this.videoShardRequests = new Map();
+        
+        // Precomputed per-video sort permutations: { videoId: { newest: [...], oldest: [...], longest: [...] } }
+        this.videoSortOrders = {};
     }
 
     /**
@@ -305,6 +354,11 @@ class DataManager {
         try {
             console.log('📄 Attempting to load pre-indexed data...');
             
+            // Prefer sharded comments: only the manifest is fetched up front
+            if (await this.loadShardedCommentData()) {
+                return;
+            }
+            
             // Try to load pre-indexed data files first
             try {
                 const [videoCommentsResponse, searchIndexResponse, wordFreqResponse] = await Promise.all([
@@ -324,9 +378,19 @@ class DataManager {
                     this.searchIndex = await searchIndexResponse.json();
                     this.wordFreqIndex = await wordFreqResponse.json();
                     
+                    // Sort orders are optional; without them comments are sorted in the browser
+                    try {
+                        const sortOrdersResponse = await fetch('data/video_sort_orders.json');
+                        if (sortOrdersResponse.ok) {
+                            this.videoSortOrders = await sortOrdersResponse.json();
+                        }
+                    } catch (sortOrdersError) {
+                        console.warn('⚠️ Precomputed sort orders not available:', sortOrdersError.message);
+                    }
+                    
                     console.log('✅ Loaded pre-indexed data');
                     console.log(`📊 Indexed ${Object.keys(this.videoCommentsIndex).length} videos`);
-                    console.log(`🔍 Search index contains ${Object.keys(this.searchIndex).length} comments`);
+                    console.log(`🔍 Search index contains ${this.searchIndex.docs?.comment_id.length ?? 0} comments`);
                     
                     // For backward compatibility, reconstruct the comments array from pre-indexed data
                     this.comments = [];
@@ -370,6 +434,87 @@ class DataManager {
         }
     }
 
+    /**
+     * Load the sharded pre-index: a manifest of per-video comment counts and
+     * shard files, plus the search and word frequency indexes. Each video's
+     * comments are fetched by ensureVideoComments() when the video is opened.
+     */
+    async loadShardedCommentData() {
+        try {
+            const [manifestResponse, searchIndexResponse, wordFreqResponse] = await Promise.all([
+                fetch('data/video_comments_manifest.json'),
+                fetch('data/search_index.json'),
+                fetch('data/word_freq_index.json')
+            ]);
+            
+            if (!manifestResponse.ok || !searchIndexResponse.ok || !wordFreqResponse.ok) {
+                return false;
+            }
+            
+            // The manifest is written last, so one older than the indexes next
+            // to it was left behind by an earlier --shards build
+            const lastModified = response => Date.parse(response.headers.get('Last-Modified'));
+            const indexesModified = Math.max(lastModified(searchIndexResponse), lastModified(wordFreqResponse));
+            if (lastModified(manifestResponse) < indexesModified) {
+                console.warn('⚠️ Ignoring stale video_comments_manifest.json (older than the search index)');
+                return false;
+            }
+            
+            this.videoCommentsManifest = await manifestResponse.json();
+            this.searchIndex = await searchIndexResponse.json();
+            this.wordFreqIndex = await wordFreqResponse.json();
+            this.videoCommentsIndex = {};
+            this.comments = [];
+            
+            console.log(`✅ Loaded sharded pre-index manifest for ${Object.keys(this.videoCommentsManifest.videos).length} videos`);
+            this.usingPreIndexedData = true;
+            return true;
+        } catch (error) {
+            console.warn('⚠️ Sharded pre-index not available:', error.message);
+            this.videoCommentsManifest = null;
+            return false;
+        }
+    }
+
+    /**
+     * Make sure a video's comments are loaded when using sharded pre-indexed data
+     */
+    async ensureVideoComments(videoId) {
+        const entry = this.videoCommentsManifest?.videos[videoId];
+        if (!entry || this.videoCommentsIndex[videoId]) {
+            return;
+        }
+        
+        if (!this.videoShardRequests.has(videoId)) {
+            const request = fetch(`data/${entry.shard}`)
+                .then(response => {
+                    if (!response.ok) throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+                    return response.json();
+                })
+                .then(shard => {
+                    const videoComments = Array.isArray(shard) ? shard : shard.comments;
+                    if (shard.orders) {
+                        this.videoSortOrders[videoId] = shard.orders;
+                    }
+                    videoComments.forEach(comment => {
+                        if (typeof comment.published_at === 'string') {
+                            comment.published_at = new Date(comment.published_at);
+                        }
+                        this.commentsById?.set(comment.comment_id, this.comments.length);
+                        this.comments.push(comment);
+                    });
+                    this.videoCommentsIndex[videoId] = videoComments;
+                })
+                .catch(error => {
+                    console.error(`❌ Failed to load comments for ${videoId}:`, error);
+                })
+                .finally(() => this.videoShardRequests.delete(videoId));
+            this.videoShardRequests.set(videoId, request);
+        }
+        
+        await this.videoShardRequests.get(videoId);
+    }
+
     /**
      * Load video file mapping
      */
@@ -783,13 +928,71 @@ class DataManager {
         return this.videos.find(video => video.video_id === videoId);
     }
 
+    /**
+     * Get a video's comments already in the requested order, using the
+     * permutations precomputed by preindex_comments.py. Returns null when
+     * no precomputed order applies (the caller sorts instead).
+     */
+    getPresortedComments(videoId, sortBy) {
+        const orderKey = {
+            'newest': 'newest', 'date-desc': 'newest',
+            'oldest': 'oldest', 'date-asc': 'oldest',
+            'likes': 'likes', 'longest': 'longest'
+        }[sortBy];
+        const videoComments = this.videoCommentsIndex?.[videoId];
+        const orders = this.videoSortOrders[videoId];
+        if (!orderKey || !videoComments || !orders) {
+            return null;
+        }
+        
+        // Stored order is already most liked first
+        if (orderKey === 'likes') {
+            return [...videoComments];
+        }
+        
+        const order = orders[orderKey];
+        if (!order || order.length !== videoComments.length) {
+            return null;
+        }
+        return order.map(position => videoComments[position]);
+    }
+
+    /**
+     * Attach each top-level comment's replies, preserving the current order
+     */
+    groupCommentsWithReplies(videoComments) {
+        const topLevelComments = [];
+        const repliesByParent = new Map();
+        videoComments.forEach(comment => {
+            if (!comment.is_reply) {
+                topLevelComments.push(comment);
+            } else {
+                if (!repliesByParent.has(comment.parent_comment_id)) {
+                    repliesByParent.set(comment.parent_comment_id, []);
+                }
+                repliesByParent.get(comment.parent_comment_id).push(comment);
+            }
+        });
+
+        return topLevelComments.map(comment => ({
+            ...comment,
+            replies: repliesByParent.get(comment.comment_id) || []
+        }));
+    }
+
     /**
      * Get comments for a video with filtering and pagination
      */
     async getComments(videoId, filters = {}, pagination = { page: 1, limit: 50 }) {
+        await this.ensureVideoComments(videoId);
+        
         // Use pre-indexed data if available for faster access
+        const sortBy = filters.sortBy || 'newest';
+        const presorted = this.getPresortedComments(videoId, sortBy);
         let videoComments = [];
-        if (this.videoCommentsIndex && this.videoCommentsIndex[videoId]) {
+        if (presorted) {
+            videoComments = presorted;
+        } else if (this.videoCommentsIndex && this.videoCommentsIndex[videoId]) {
             videoComments = [...this.videoCommentsIndex[videoId]];
         } else {
             videoComments = this.comments.filter(comment => comment.video_id === videoId);
@@ -818,9 +1021,8 @@ class DataManager {
             videoComments = videoComments.filter(comment => comment.is_reply);
         }
 
-        // Apply sorting
-        const sortBy = filters.sortBy || 'newest';
-        videoComments.sort((a, b) => {
+        // Apply sorting (filtering keeps a precomputed order intact)
+        if (!presorted) videoComments.sort((a, b) => {
             switch (sortBy) {
                 case 'relevance':
                     // Calculate relevance scores on demand
@@ -857,19 +1059,20 @@ class DataManager {
                     const dateA2 = new Date(a.published_at || a.created_at || 0).getTime();
                     const dateB2 = new Date(b.published_at || b.created_at || 0).getTime();
                     return dateA2 - dateB2;
+                case 'likes':
+                    if ((b.like_count || 0) !== (a.like_count || 0)) {
+                        return (b.like_count || 0) - (a.like_count || 0);
+                    }
+                    return new Date(b.published_at || b.created_at || 0).getTime() - new Date(a.published_at || a.created_at || 0).getTime();
+                case 'longest':
+                    return (b.text?.length || 0) - (a.text?.length || 0);
                 default:
                     return new Date(b.published_at || b.created_at || 0).getTime() - new Date(a.published_at || a.created_at || 0).getTime();
             }
         });
 
         // Group comments with their replies
-        const topLevelComments = videoComments.filter(comment => !comment.is_reply);
-        const replies = videoComments.filter(comment => comment.is_reply);
-
-        const commentsWithReplies = topLevelComments.map(comment => ({
-            ...comment,
-            replies: replies.filter(reply => reply.parent_comment_id === comment.comment_id)
-        }));
+        const commentsWithReplies = this.groupCommentsWithReplies(videoComments);
 
         // Apply pagination
         const startIndex = (pagination.page - 1) * pagination.limit;
@@ -890,10 +1093,16 @@ class DataManager {
      * Get ALL comments for a video without pagination (for export)
      */
     async getAllComments(videoId, filters = {}) {
+        await this.ensureVideoComments(videoId);
+        
+        const sortBy = filters.sortBy || 'newest';
+        const presorted = this.getPresortedComments(videoId, sortBy);
         let videoComments = [];
         
         // Use pre-indexed data if available for faster access
-        if (this.videoCommentsIndex && this.videoCommentsIndex[videoId]) {
+        if (presorted) {
+            videoComments = presorted;
+        } else if (this.videoCommentsIndex && this.videoCommentsIndex[videoId]) {
             videoComments = [...this.videoCommentsIndex[videoId]];
         } else {
             // Fallback to original method
@@ -923,9 +1132,8 @@ class DataManager {
             videoComments = videoComments.filter(comment => comment.is_reply);
         }
 
-        // Apply sorting
-        const sortBy = filters.sortBy || 'newest';
-        videoComments.sort((a, b) => {
+        // Apply sorting (filtering keeps a precomputed order intact)
+        if (!presorted) videoComments.sort((a, b) => {
             switch (sortBy) {
                 case 'relevance':
                     // Calculate relevance scores on demand
@@ -955,19 +1163,20 @@ class DataManager {
                     const dateA4 = new Date(a.published_at || a.created_at || 0).getTime();
                     const dateB4 = new Date(b.published_at || b.created_at || 0).getTime();
                     return dateA4 - dateB4;
+                case 'likes':
+                    if ((b.like_count || 0) !== (a.like_count || 0)) {
+                        return (b.like_count || 0) - (a.like_count || 0);
+                    }
+                    return new Date(b.published_at || b.created_at || 0).getTime() - new Date(a.published_at || a.created_at || 0).getTime();
+                case 'longest':
+                    return (b.text?.length || 0) - (a.text?.length || 0);
                 default:
                     return new Date(b.published_at || b.created_at || 0).getTime() - new Date(a.published_at || a.created_at || 0).getTime();
             }
         });
 
         // Group comments with their replies (same as getComments)
-        const topLevelComments = videoComments.filter(comment => !comment.is_reply);
-        const replies = videoComments.filter(comment => comment.is_reply);
-
-        const commentsWithReplies = topLevelComments.map(comment => ({
-            ...comment,
-            replies: replies.filter(reply => reply.parent_comment_id === comment.comment_id)
-        }));
+        const commentsWithReplies = this.groupCommentsWithReplies(videoComments);
 
         return commentsWithReplies;
     }
@@ -1023,9 +1232,16 @@ class DataManager {
      */
     async searchComments(query, videoId = null) {
         const searchLower = query.toLowerCase();
-        let searchComments = videoId 
-            ? this.comments.filter(comment => comment.video_id === videoId)
-            : this.comments;
+        let searchComments = await this.getSearchCandidates(searchLower, videoId);
+        if (!searchComments) {
+            if (this.videoCommentsManifest) {
+                const videoIds = videoId ? [videoId] : Object.keys(this.videoCommentsManifest.videos);
+                await Promise.all(videoIds.map(id => this.ensureVideoComments(id)));
+            }
+            searchComments = videoId 
+                ? this.comments.filter(comment => comment.video_id === videoId)
+                : this.comments;
+        }
 
         const results = searchComments.filter(comment => 
             comment.text.toLowerCase().includes(searchLower) ||
@@ -1042,6 +1258,122 @@ class DataManager {
         return results;
     }
 
+    /**
+     * Narrow a search to candidate comments using the inverted search index.
+     * A comment containing the query holds each query word inside one of its
+     * indexed terms: inner words are whole terms, the first word ends a term,
+     * the last word starts one and a lone word can sit anywhere in a term.
+     * Only the postings of those terms are visited.
+     * Returns null when the index can't answer the query (caller scans instead).
+     */
+    async getSearchCandidates(searchLower, videoId = null) {
+        if (!this.searchIndex?.terms) return null;
+
+        const queryTerms = searchLower.match(/[\p{L}\p{N}_]+/gu);
+        if (!queryTerms) return null;
+
+        if (!this.searchTerms) {
+            this.searchTerms = {
+                sorted: Object.keys(this.searchIndex.terms).sort(),
+                reversed: null,
+                trigrams: null,
+                expansions: new Map()
+            };
+            this.commentsById = new Map(this.comments.map((comment, position) => [comment.comment_id, position]));
+        }
+
+        const last = queryTerms.length - 1;
+        const lookups = new Map();
+        queryTerms.forEach((queryTerm, i) => {
+            const match = last === 0 ? 'substring' : i === 0 ? 'suffix' : i === last ? 'prefix' : 'exact';
+            lookups.set(`${match}:${queryTerm}`, [queryTerm, match]);
+        });
+
+        let candidates = null;
+        for (const [queryTerm, match] of lookups.values()) {
+            const docs = new Set();
+            for (const term of this.expandSearchTerm(queryTerm, match)) {
+                let doc = 0;
+                for (const gap of this.searchIndex.terms[term]) {
+                    doc += gap;
+                    if (!candidates || candidates.has(doc)) docs.add(doc);
+                }
+            }
+            candidates = docs;
+            if (candidates.size === 0) break;
+        }
+
+        const { docs, videos } = this.searchIndex;
+        const matches = [...candidates].filter(doc => !videoId || videos[docs.video[doc]] === videoId);
+        
+        // Sharded comments are only in memory once their video has been loaded
+        if (this.videoCommentsManifest) {
+            const matchedVideos = new Set(matches.map(doc => videos[docs.video[doc]]));
+            await Promise.all([...matchedVideos].map(id => this.ensureVideoComments(id)));
+        }
+        
+        // Keep the same order as this.comments so relevance ties match a full scan
+        const positions = [];
+        for (const doc of matches) {
+            const position = this.commentsById.get(docs.comment_id[doc]);
+            if (position !== undefined) positions.push(position);
+        }
+        return positions.sort((a, b) => a - b).map(position => this.comments[position]);
+    }
+
+    /**
+     * Index terms that equal, end with, start with or contain `queryTerm`
+     * (match = 'exact', 'suffix', 'prefix' or 'substring'). Prefixes are
+     * found by binary search in the sorted terms, suffixes the same way in
+     * the reversed terms, and substrings through a trigram index; each is
+     * built on first use. Recent expansions are cached, since a search box
+     * repeats words as the user types.
+     */
+    expandSearchTerm(queryTerm, match) {
+        if (match === 'exact') {
+            return Object.hasOwn(this.searchIndex.terms, queryTerm) ? [queryTerm] : [];
+        }
+        
+        const lookup = this.searchTerms;
+        const key = `${match}:${queryTerm}`;
+        if (lookup.expansions.has(key)) {
+            return lookup.expansions.get(key);
+        }
+        
+        let terms;
+        if (match === 'prefix') {
+            terms = termsWithPrefix(lookup.sorted, queryTerm);
+        } else if (match === 'suffix') {
+            if (!lookup.reversed) {
+                lookup.reversed = lookup.sorted.map(reverseString).sort();
+            }
+            terms = termsWithPrefix(lookup.reversed, reverseString(queryTerm)).map(reverseString);
+        } else if (queryTerm.length < 3) {
+            // Too short for a trigram; such words match a large share of terms anyway
+            terms = lookup.sorted.filter(term => term.includes(queryTerm));
+        } else {
+            if (!lookup.trigrams) {
+                lookup.trigrams = buildTrigramIndex(lookup.sorted);
+            }
+            // Verify the terms sharing the query's rarest trigram
+            let rarest = null;
+            for (let i = 0; i + 3 <= queryTerm.length; i++) {
+                const termIndexes = lookup.trigrams.get(queryTerm.slice(i, i + 3)) || [];
+                if (!rarest || termIndexes.length < rarest.length) rarest = termIndexes;
+            }
+            terms = [];
+            for (const index of rarest) {
+                if (lookup.sorted[index].includes(queryTerm)) terms.push(lookup.sorted[index]);
+            }
+        }
+        
+        lookup.expansions.set(key, terms);
+        if (lookup.expansions.size > SEARCH_EXPANSION_CACHE_SIZE) {
+            lookup.expansions.delete(lookup.expansions.keys().next().value);
+        }
+        return terms;
+    }
+
     /**
      * Calculate search relevance score
      */
@@ -1078,8 +1410,15 @@ class DataManager {
      * Get statistics about the data
      */
     getStats() {
-        const totalComments = this.comments.length;
-        const totalReplies = this.comments.filter(c => c.is_reply).length;
+        const manifestEntries = this.videoCommentsManifest ? Object.values(this.videoCommentsManifest.videos) : null;
+        const totalComments = manifestEntries
+            ? manifestEntries.reduce((sum, entry) => sum + entry.count, 0)
+            : this.comments.length;
+        // Sharded: only opened videos are in memory, so count from the manifest
+        // (manifests before version 3 have no reply counts)
+        const totalReplies = manifestEntries && manifestEntries.every(entry => entry.replies !== undefined)
+            ? manifestEntries.reduce((sum, entry) => sum + entry.replies, 0)
+            : this.comments.filter(c => c.is_reply).length;
         const totalVideos = this.videos.length;
         const totalViews = this.videos.reduce((sum, v) => sum + v.view_count, 0);
         
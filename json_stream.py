@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Incremental JSON readers for files too large to json.load at once.
+Values are decoded one at a time with the stdlib decoder, so peak memory
+is bounded by the largest single item rather than the whole document.
+
+iter_json_array() covers the common case of a top-level array. For
+nested documents, JSONStream lets the caller walk containers key by key
+and item by item, decoding only the leaves it needs.
+"""
+
+import json
+import re
+
+READ_SIZE = 1 << 20  # 1MB per read
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_NUMBER_CHARS = '0123456789.eE+-'
+
+
+class JSONStream:
+    """Sliding text window over a file object, read one JSON token at a time.
+
+    peek() shows the next significant character. At a value, the caller
+    either decodes it with decode_value() or, for '[' / '{', walks into it
+    with iter_array() / iter_object(); every item or member yielded by
+    those must be consumed one of these ways before the next one.
+    """
+
+    def __init__(self, f, read_size=READ_SIZE):
+        self.f = f
+        self.read_size = read_size
+        self.text = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        """Drop consumed text and read the next block. Returns False at EOF."""
+        if self.eof:
+            return False
+        block = self.f.read(self.read_size)
+        if not block:
+            self.eof = True
+            return False
+        self.text = self.text[self.pos:] + block
+        self.pos = 0
+        return True
+
+    def next_char(self):
+        """Skip whitespace and return the next significant character ('' at EOF)"""
+        while True:
+            self.pos = _WHITESPACE.match(self.text, self.pos).end()
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self.fill():
+                return ''
+
+    def peek(self):
+        """The next significant character without consuming it ('' at EOF)"""
+        return self.next_char()
+
+    def expect(self, chars):
+        char = self.next_char()
+        if not char or char not in chars:
+            raise ValueError(f"Expected one of {chars!r} at offset {self.pos}, got {char!r}")
+        self.pos += 1
+        return char
+
+    def decode_value(self):
+        """Decode one complete JSON value starting at the current position"""
+        self.next_char()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.text, self.pos)
+            except json.JSONDecodeError:
+                if not self.fill():
+                    raise
+                continue
+            # A number cut off by the end of the window decodes as a shorter
+            # number, so only trust it once the character after it is known.
+            if not self.eof and (end == len(self.text) or self.text[end] in _NUMBER_CHARS):
+                if self.fill():
+                    continue
+            self.pos = end
+            return value
+
+    def iter_array(self):
+        """Walk the array at the current position, stopping before each item"""
+        self.expect('[')
+        if self.next_char() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield
+            if self.expect(',]') == ']':
+                return
+
+    def iter_object(self):
+        """Walk the object at the current position, yielding each key with the
+        stream positioned at its value"""
+        self.expect('{')
+        if self.next_char() == '}':
+            self.pos += 1
+            return
+        while True:
+            if self.next_char() != '"':
+                raise ValueError(f"Expected an object key at offset {self.pos}, got {self.next_char()!r}")
+            key = self.decode_value()
+            self.expect(':')
+            yield key
+            if self.expect(',}') == '}':
+                return
+
+
+def iter_json_array(f, read_size=READ_SIZE):
+    """Yield the items of a top-level JSON array from an open text file"""
+    stream = JSONStream(f, read_size)
+    for _ in stream.iter_array():
+        yield stream.decode_value()
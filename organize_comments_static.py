@@ -2,19 +2,130 @@
 """
 Organize comments into a static folder structure for GitHub Pages hosting.
 Creates chunked JSON files organized by shortcode for efficient static loading.
+
+Rebuilds are incremental: each post's chunks live in a directory named
+after a hash of its comment IDs (posts/<shortcode>/v<hash>/), so only
+posts whose comments changed are rewritten. New post directories are
+built under .staging/ and renamed into place, and index.json is replaced
+atomically last, so readers see either the old database or the new one.
+
+With --delta-ids, a post whose IDs are all numeric has them sorted and
+stored as binary varint deltas (chunk_N.bin, decoded by the loader)
+instead of JSON string arrays, which is about a quarter of the size.
+
+With --packed, every chunk is instead stored gzipped in one
+comments-<id>.pack file and index.json records each chunk's byte range;
+the loader fetches chunks with HTTP Range requests. Changed posts are
+appended to the existing pack, which is rewritten once more than half of
+it is no longer referenced.
 """
+import argparse
+import hashlib
 import json
 import os
+import secrets
 import shutil
 from collections import defaultdict
 from pathlib import Path
 import gzip
 
+from comment_export_reader import CommentExportReader
+from comment_id_store import encode_id_deltas, pack_comment_id, varint_size
+from precompress import (DEFAULT_GZIP_LEVEL, compress_bytes, format_size_report, strip_sidecar_suffix,
+                         write_sidecars)
+
+# Chunks are sized so each one is about this many bytes gzipped, so fetching
+# a chunk costs about the same whatever the post's size
+CHUNK_TARGET_BYTES = 32 * 1024
+# A chunk may overshoot the target by this factor before it is split again
+CHUNK_TOLERANCE = 1.25
+# Quick level used only to estimate a post's compression ratio
+ESTIMATE_GZIP_LEVEL = 6
+# Bump when the chunk file format changes so every post is rewritten
+CHUNK_LAYOUT_VERSION = 1
+
+# Index `format` of binary chunks; JSON chunks have no format key
+DELTA_FORMAT = 'delta-varint'
+
+STAGING_DIR = '.staging'
+
+# Packed output is rewritten when less than this share of the pack is live
+PACK_MIN_LIVE_RATIO = 0.5
+PACK_COPY_SIZE = 1024 * 1024
+
+
+def write_file_atomic(path, text):
+    """Replace `path` with `text` so readers see the old or new file, never a partial one"""
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w') as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+
+def referenced_post_dirs(index_data):
+    """posts/<shortcode>/<version> directories (and legacy chunk files) an index points at"""
+    paths = set()
+    if index_data:
+        for post in index_data.get('posts', {}).values():
+            for chunk in post.get('chunks', []):
+                if 'file' in chunk:
+                    paths.add(os.path.dirname(chunk['file']))
+                    paths.add(chunk['file'])
+    return paths
+
+
+def new_pack_name(output_dir):
+    while True:
+        name = f'comments-{secrets.token_hex(4)}.pack'
+        if not os.path.exists(os.path.join(output_dir, name)):
+            return name
+
+
+class PackWriter:
+    """Appends chunk payloads to a pack file and reports their byte ranges"""
+    
+    def __init__(self, path):
+        self.path = path
+        self.f = open(path, 'ab')
+        self.offset = self.f.seek(0, os.SEEK_END)
+    
+    def append(self, payload):
+        offset = self.offset
+        self.f.write(payload)
+        self.offset += len(payload)
+        return offset, len(payload)
+    
+    def copy_range(self, source, offset, length):
+        """Copy `length` bytes at `offset` of the open file `source`; returns the new range"""
+        new_offset = self.offset
+        source.seek(offset)
+        remaining = length
+        while remaining:
+            data = source.read(min(remaining, PACK_COPY_SIZE))
+            if not data:
+                raise ValueError(f"{self.path}: source pack ends before byte {offset + length}")
+            self.f.write(data)
+            remaining -= len(data)
+        self.offset += length
+        return new_offset, length
+    
+    def close(self):
+        # The pack must be on disk before an index.json that points into it
+        self.f.flush()
+        os.fsync(self.f.fileno())
+        self.f.close()
+
+
 class StaticCommentOrganizer:
-    def __init__(self, comments_dir, output_dir='/Volumes/Crucial X9/MMInstaArchive/mm_ig_comments/organized'):
+    def __init__(self, comments_dir, output_dir='/Volumes/Crucial X9/MMInstaArchive/mm_ig_comments/organized',
+                 packed=False, delta_ids=False):
         self.comments_dir = comments_dir
         self.output_dir = output_dir
-        self.chunk_size = 1000  # Comments per chunk file
+        self.packed = packed  # One pack file + byte ranges instead of a file per chunk
+        self.delta_ids = delta_ids  # Sorted varint-delta binary chunks where possible
+        self.chunk_target_bytes = CHUNK_TARGET_BYTES  # Compressed bytes per chunk file
         self.index_data = {
             'posts': {},
             'stats': {
@@ -24,14 +135,34 @@ class StaticCommentOrganizer:
             }
         }
         
-    def clean_output_directory(self):
-        """Clean and recreate output directory"""
-        if os.path.exists(self.output_dir):
-            print(f"Cleaning existing output directory: {self.output_dir}")
-            shutil.rmtree(self.output_dir)
-        os.makedirs(self.output_dir)
-        os.makedirs(os.path.join(self.output_dir, 'posts'))
-        
+    def prepare_output_directory(self):
+        """Create the output directory if needed and clear any interrupted staging"""
+        os.makedirs(os.path.join(self.output_dir, 'posts'), exist_ok=True)
+        staging_dir = os.path.join(self.output_dir, STAGING_DIR)
+        if os.path.exists(staging_dir):
+            print("Removing staging files from an interrupted build...")
+            shutil.rmtree(staging_dir)
+        os.makedirs(staging_dir)
+    
+    def load_previous_index(self):
+        """The index.json of the current database, or None"""
+        index_file = os.path.join(self.output_dir, 'index.json')
+        if not os.path.exists(index_file):
+            return None
+        try:
+            with open(index_file, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable previous index: {e}")
+            return None
+    
+    def post_version(self, comments):
+        """Directory name that changes whenever a post's chunk files would"""
+        id_format = DELTA_FORMAT if self.delta_ids else 'json'
+        digest = hashlib.sha1(f"{CHUNK_LAYOUT_VERSION}:{self.chunk_target_bytes}:{id_format}:".encode())
+        digest.update(json.dumps(comments, separators=(',', ':')).encode())
+        return 'v' + digest.hexdigest()[:12]
+    
     def parse_json_files(self):
         """Parse all JSON files and organize by shortcode"""
         print("Parsing comment JSON files...")
@@ -48,19 +179,10 @@ class StaticCommentOrganizer:
             
             try:
                 with open(filepath, 'r') as f:
-                    data = json.load(f)
-                
-                for uuid, entry in data.items():
-                    if isinstance(entry, dict):
-                        shortcode = entry.get('target', '')
-                        if shortcode:
-                            # Extract all comment IDs from logs
-                            for log in entry.get('logs', []):
-                                if isinstance(log, dict):
-                                    comment_ids = log.get('storedIds', [])
-                                    if isinstance(comment_ids, list):
-                                        shortcode_comments[shortcode].extend(comment_ids)
-                            total_entries += 1
+                    reader = CommentExportReader(f)
+                    for shortcode, comment_id in reader:
+                        shortcode_comments[shortcode].append(comment_id)
+                    total_entries += reader.targeted_entries
                             
             except Exception as e:
                 print(f"Error processing {filepath}: {e}")
@@ -85,64 +207,306 @@ class StaticCommentOrganizer:
         
         return shortcode_comments
     
-    def create_chunked_files(self, shortcode_comments):
-        """Create chunked JSON files for each post"""
+    def delta_values(self, comments):
+        """A post's IDs as sorted integers for delta encoding, or None to keep JSON"""
+        if not self.delta_ids:
+            return None
+        values = [pack_comment_id(comment_id) for comment_id in comments]
+        if None in values:
+            return None
+        return sorted(values)
+    
+    def plan_chunks(self, comments, values=None):
+        """Split a post's comment IDs into runs of about chunk_target_bytes once gzipped.
+
+        The post's compression ratio is estimated once, then IDs are grouped
+        by their encoded size against the equivalent raw budget. With
+        `values` (sorted integer IDs) the runs are of values, sized as
+        varint deltas.
+        """
+        if values is None:
+            items = comments
+            raw = json.dumps(comments, separators=(',', ':')).encode()
+            # Quoted ID plus its separating comma
+            item_sizes = (len(json.dumps(comment_id)) + 1 for comment_id in comments)
+        else:
+            items = values
+            raw = encode_id_deltas(values)
+            item_sizes = (varint_size(value - previous) for previous, value in zip([0] + values, values))
+        compressed = len(gzip.compress(raw, compresslevel=ESTIMATE_GZIP_LEVEL, mtime=0))
+        raw_budget = self.chunk_target_bytes * len(raw) / max(compressed, 1)
+        
+        runs = []
+        start = 0
+        run_bytes = 0
+        for i, item_bytes in enumerate(item_sizes):
+            if run_bytes + item_bytes > raw_budget and i > start:
+                runs.append(items[start:i])
+                start = i
+                run_bytes = 0
+            run_bytes += item_bytes
+        runs.append(items[start:])
+        return runs
+    
+    def encode_chunk(self, shortcode, chunk_index, chunk, delta=False):
+        if delta:
+            data = encode_id_deltas(chunk)
+        else:
+            chunk_data = {
+                'shortcode': shortcode,
+                'chunk_index': chunk_index,
+                'comment_ids': chunk,
+                'count': len(chunk)
+            }
+            data = json.dumps(chunk_data, separators=(',', ':')).encode()
+        if self.packed:
+            # Packed chunks are only ever sent gzipped
+            return data, {'gzip': gzip.compress(data, compresslevel=DEFAULT_GZIP_LEVEL, mtime=0)}
+        return data, compress_bytes(data)
+    
+    def iter_post_chunks(self, shortcode, comments):
+        """Yield (chunk_index, chunk, data, variants) for each chunk of a post, plus
+        the chunk format (None for JSON).
+
+        A run that compresses worse than estimated is halved until it fits
+        the budget.
+        """
+        values = self.delta_values(comments)
+        chunk_format = DELTA_FORMAT if values is not None else None
+        chunk_index = 0
+        pending = self.plan_chunks(comments, values)
+        pending.reverse()
+        while pending:
+            chunk = pending.pop()
+            data, variants = self.encode_chunk(shortcode, chunk_index, chunk, delta=chunk_format is not None)
+            
+            if len(chunk) > 1 and len(variants['gzip']) > self.chunk_target_bytes * CHUNK_TOLERANCE:
+                middle = len(chunk) // 2
+                pending.append(chunk[middle:])
+                pending.append(chunk[:middle])
+                continue
+            
+            yield chunk_index, chunk, data, variants, chunk_format
+            chunk_index += 1
+    
+    def write_post_chunks(self, shortcode, comments, version):
+        """Write a post's chunk files under .staging/, then move them to posts/<shortcode>/<version>"""
+        staging_post_dir = os.path.join(self.output_dir, STAGING_DIR, f'{shortcode}-{version}')
+        os.makedirs(staging_post_dir)
+        relative_dir = f'posts/{shortcode}/{version}'
+        
+        chunks = []
+        sizes_total = {}
+        for chunk_index, chunk, data, variants, chunk_format in self.iter_post_chunks(shortcode, comments):
+            filename = f"chunk_{chunk_index}.{'bin' if chunk_format else 'json'}"
+            chunk_file = os.path.join(staging_post_dir, filename)
+            with open(chunk_file, 'wb') as f:
+                f.write(data)
+            sizes = write_sidecars(chunk_file, data, variants)
+            for encoding, size in sizes.items():
+                sizes_total[encoding] = sizes_total.get(encoding, 0) + size
+            
+            entry = {
+                'index': chunk_index,
+                'count': len(chunk),
+                'bytes': len(data),
+                'file': f'{relative_dir}/{filename}'
+            }
+            if chunk_format:
+                entry['format'] = chunk_format
+            chunks.append(entry)
+        
+        post_dir = os.path.join(self.output_dir, relative_dir)
+        os.makedirs(os.path.dirname(post_dir), exist_ok=True)
+        if os.path.exists(post_dir):
+            # Same content rewritten (full rebuild or a leftover from an
+            # interrupted run): swap the old copy out of the way first
+            replaced_dir = staging_post_dir + '.replaced'
+            os.rename(post_dir, replaced_dir)
+            os.rename(staging_post_dir, post_dir)
+            shutil.rmtree(replaced_dir)
+        else:
+            os.rename(staging_post_dir, post_dir)
+        
+        return chunks, sizes_total
+    
+    def pack_post_chunks(self, pack, shortcode, comments):
+        """Append a post's gzipped chunks to `pack`; index entries record their byte ranges"""
+        chunks = []
+        sizes_total = {'raw': 0, 'gzip': 0}
+        for chunk_index, chunk, data, variants, chunk_format in self.iter_post_chunks(shortcode, comments):
+            offset, length = pack.append(variants['gzip'])
+            sizes_total['raw'] += len(data)
+            sizes_total['gzip'] += length
+            
+            entry = {
+                'index': chunk_index,
+                'count': len(chunk),
+                'bytes': len(data),
+                'offset': offset,
+                'length': length
+            }
+            if chunk_format:
+                entry['format'] = chunk_format
+            chunks.append(entry)
+        
+        return chunks, sizes_total
+    
+    def open_pack(self, previous_index):
+        """PackWriter appending to the previous build's pack, or to a new one"""
+        previous_pack = (previous_index or {}).get('pack')
+        if previous_pack and os.path.isfile(os.path.join(self.output_dir, previous_pack['file'])):
+            name = previous_pack['file']
+        else:
+            name = new_pack_name(self.output_dir)
+        return PackWriter(os.path.join(self.output_dir, name)), name
+    
+    def compact_pack(self, pack_name):
+        """Copy the live chunks into a new pack once most of `pack_name` is dead.
+
+        Returns the name of the pack the index should point at.
+        """
+        pack_path = os.path.join(self.output_dir, pack_name)
+        pack_bytes = os.path.getsize(pack_path)
+        live_bytes = sum(chunk['length'] for post in self.index_data['posts'].values()
+                         for chunk in post['chunks'])
+        if pack_bytes == 0 or live_bytes >= pack_bytes * PACK_MIN_LIVE_RATIO:
+            return pack_name
+        
+        print(f"Compacting pack: {live_bytes / pack_bytes:.0%} of {pack_bytes / 1024 / 1024:.1f} MB is live")
+        new_name = new_pack_name(self.output_dir)
+        new_pack = PackWriter(os.path.join(self.output_dir, new_name))
+        with open(pack_path, 'rb') as source:
+            for shortcode, post in self.index_data['posts'].items():
+                # Copy entries so reused ones shared with the previous index stay unchanged
+                post = self.index_data['posts'][shortcode] = dict(post)
+                post['chunks'] = [dict(chunk) for chunk in post['chunks']]
+                for chunk in post['chunks']:
+                    chunk['offset'], chunk['length'] = new_pack.copy_range(source, chunk['offset'], chunk['length'])
+        new_pack.close()
+        return new_name
+    
+    def create_chunked_files(self, shortcode_comments, previous_index=None):
+        """Create byte-budgeted JSON chunks (plus .gz/.br variants, or packed) for each changed post.
+
+        Posts whose comment IDs match their entry in `previous_index` keep
+        their existing files (or pack ranges) and index entry.
+        """
         print("\nCreating chunked comment files...")
         
+        previous_posts = previous_index.get('posts', {}) if previous_index else {}
+        previous_shortcodes = set(previous_posts)
         total_comments = 0
         total_chunks = 0
+        total_sizes = {}
+        rewritten = 0
+        
+        pack = None
+        if self.packed:
+            pack, pack_name = self.open_pack(previous_index)
+            # Ranges from the previous build are only valid in the same pack
+            if previous_index and previous_index.get('pack', {}).get('file') != pack_name:
+                previous_posts = {}
         
         for shortcode, comments in shortcode_comments.items():
             if not comments:
                 continue
-                
-            post_dir = os.path.join(self.output_dir, 'posts', shortcode)
-            os.makedirs(post_dir, exist_ok=True)
             
-            # Create chunks
-            chunks = []
-            for i in range(0, len(comments), self.chunk_size):
-                chunk = comments[i:i + self.chunk_size]
-                chunk_index = i // self.chunk_size
+            version = self.post_version(comments)
+            previous = previous_posts.get(shortcode)
+            if previous and previous.get('version') == version and self.has_post_data(shortcode, previous):
+                self.index_data['posts'][shortcode] = previous
+            else:
+                if pack:
+                    chunks, sizes = self.pack_post_chunks(pack, shortcode, comments)
+                else:
+                    chunks, sizes = self.write_post_chunks(shortcode, comments, version)
+                for encoding, size in sizes.items():
+                    total_sizes[encoding] = total_sizes.get(encoding, 0) + size
+                rewritten += 1
                 
-                # Save chunk as compressed JSON
-                chunk_data = {
-                    'shortcode': shortcode,
-                    'chunk_index': chunk_index,
-                    'comment_ids': chunk,
-                    'count': len(chunk)
+                # Update index
+                self.index_data['posts'][shortcode] = {
+                    'total_comments': len(comments),
+                    'version': version,
+                    'chunks': chunks,
+                    'chunk_count': len(chunks)
                 }
-                
-                chunk_file = os.path.join(post_dir, f'chunk_{chunk_index}.json')
-                with open(chunk_file, 'w') as f:
-                    json.dump(chunk_data, f, separators=(',', ':'))
-                
-                chunks.append({
-                    'index': chunk_index,
-                    'count': len(chunk),
-                    'file': f'posts/{shortcode}/chunk_{chunk_index}.json'
-                })
-                
-                total_chunks += 1
-            
-            # Update index
-            self.index_data['posts'][shortcode] = {
-                'total_comments': len(comments),
-                'chunks': chunks,
-                'chunk_count': len(chunks)
-            }
             
             total_comments += len(comments)
+            total_chunks += self.index_data['posts'][shortcode]['chunk_count']
             
             if len(shortcode_comments) > 100 and len(self.index_data['posts']) % 100 == 0:
                 print(f"  Processed {len(self.index_data['posts'])} posts...")
         
+        if pack:
+            pack.close()
+            pack_name = self.compact_pack(pack_name)
+            self.index_data['pack'] = {
+                'file': pack_name,
+                'encoding': 'gzip',
+                'bytes': os.path.getsize(os.path.join(self.output_dir, pack_name))
+            }
+        
         self.index_data['stats']['total_posts'] = len(self.index_data['posts'])
         self.index_data['stats']['total_comments'] = total_comments
         self.index_data['stats']['total_chunks'] = total_chunks
         
-        print(f"\nCreated {total_chunks} chunk files for {len(self.index_data['posts'])} posts")
+        removed = len(previous_shortcodes - set(self.index_data['posts']))
+        unchanged = len(self.index_data['posts']) - rewritten
+        kind = 'packed chunks' if pack else 'chunk files'
+        print(f"\n{total_chunks} {kind} for {len(self.index_data['posts'])} posts "
+              f"({rewritten} rewritten, {unchanged} unchanged, {removed} removed)")
         print(f"Total comments: {total_comments:,}")
+        if total_sizes:
+            print(format_size_report("Chunks written", total_sizes))
+    
+    def has_post_data(self, shortcode, post):
+        """True when a previous index entry's data is stored the way this build stores it"""
+        chunks = post.get('chunks', [])
+        if self.packed:
+            return all('offset' in chunk for chunk in chunks)
+        return (all('file' in chunk for chunk in chunks)
+                and os.path.isdir(os.path.join(self.output_dir, 'posts', shortcode, post['version'])))
+    
+    def remove_unreferenced_files(self, previous_index):
+        """Delete post files that neither the new nor the previous index uses.
+
+        The previous generation is kept so pages that loaded the old
+        index.json can still fetch their chunks; it goes on the next build.
+        """
+        keep = referenced_post_dirs(self.index_data) | referenced_post_dirs(previous_index)
+        posts_dir = os.path.join(self.output_dir, 'posts')
+        removed = 0
+        
+        for shortcode in os.listdir(posts_dir):
+            shortcode_dir = os.path.join(posts_dir, shortcode)
+            if not os.path.isdir(shortcode_dir):
+                continue
+            for name in os.listdir(shortcode_dir):
+                relative = f'posts/{shortcode}/{name}'
+                # Sidecars belong to the chunk file they compress
+                if strip_sidecar_suffix(relative) in keep:
+                    continue
+                path = os.path.join(shortcode_dir, name)
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+                else:
+                    os.remove(path)
+                removed += 1
+            if not os.listdir(shortcode_dir):
+                os.rmdir(shortcode_dir)
+        
+        keep_packs = {index['pack']['file'] for index in (self.index_data, previous_index)
+                      if index and 'pack' in index}
+        for name in os.listdir(self.output_dir):
+            if name.endswith('.pack') and name not in keep_packs:
+                os.remove(os.path.join(self.output_dir, name))
+                removed += 1
+        
+        shutil.rmtree(os.path.join(self.output_dir, STAGING_DIR), ignore_errors=True)
+        if removed:
+            print(f"Removed {removed} outdated post files")
     
     def create_index_files(self):
         """Create index files for efficient lookups"""
@@ -150,8 +514,6 @@ class StaticCommentOrganizer:
         
         # Main index file
         index_file = os.path.join(self.output_dir, 'index.json')
-        with open(index_file, 'w') as f:
-            json.dump(self.index_data, f, separators=(',', ':'))
         
         # Create smaller index with just post list and counts
         post_list = []
@@ -164,11 +526,13 @@ class StaticCommentOrganizer:
         post_list.sort(key=lambda x: x['comment_count'], reverse=True)
         
         summary_file = os.path.join(self.output_dir, 'summary.json')
-        with open(summary_file, 'w') as f:
-            json.dump({
-                'posts': post_list,
-                'stats': self.index_data['stats']
-            }, f, separators=(',', ':'))
+        write_file_atomic(summary_file, json.dumps({
+            'posts': post_list,
+            'stats': self.index_data['stats']
+        }, separators=(',', ':')))
+        
+        # index.json goes last: replacing it switches readers to the new build
+        write_file_atomic(index_file, json.dumps(self.index_data, separators=(',', ':')))
         
         print(f"Created index with {len(post_list)} posts")
     
@@ -176,13 +540,92 @@ class StaticCommentOrganizer:
         """Create a JavaScript module for loading comments"""
         loader_script = '''/**
  * Static Comment Database Loader
- * Loads comment data from chunked JSON files
+ * Loads comment data from chunked JSON files, or from byte ranges of a
+ * single pack file when the database was built with --packed
  */
+
+/**
+ * Decode a delta-varint chunk: a LEB128 count, then each ID's difference
+ * from the previous one. IDs go up to 2^63, beyond exact Number range, so
+ * the running value is kept as base-1e9 high/low halves. Deltas too large
+ * for a Number (normally just the first) take the BigInt path, kept in its
+ * own function so the main loop stays fast.
+ */
+function addBigDelta(bytes, position, value, scale, high, low) {
+    let delta = BigInt(value);
+    let bigScale = BigInt(scale);
+    let byte;
+    do {
+        byte = bytes[position++];
+        delta += BigInt(byte & 0x7f) * bigScale;
+        bigScale *= 128n;
+    } while (byte & 0x80);
+    const total = BigInt(high) * 1000000000n + BigInt(low) + delta;
+    return [position, Number(total / 1000000000n), Number(total % 1000000000n)];
+}
+
+function decodeCommentIds(bytes) {
+    let position = 0;
+    let count = 0;
+    let scale = 1;
+    let byte;
+    do {
+        byte = bytes[position++];
+        count += (byte & 0x7f) * scale;
+        scale *= 128;
+    } while (byte & 0x80);
+    
+    const ids = new Array(count);
+    let high = 0;
+    let low = 0;
+    let highText = '';
+    for (let i = 0; i < count; i++) {
+        let delta = 0;
+        scale = 1;
+        do {
+            byte = bytes[position++];
+            if (scale > 2 ** 42) {
+                [position, high, low] = addBigDelta(bytes, position - 1, delta, scale, high, low);
+                highText = high ? String(high) : '';
+                delta = 0;
+                break;
+            }
+            delta += (byte & 0x7f) * scale;
+            scale *= 128;
+        } while (byte & 0x80);
+        
+        low += delta;
+        if (low >= 1e9) {
+            const carry = Math.floor(low / 1e9);
+            high += carry;
+            low -= carry * 1e9;
+            highText = String(high);
+        }
+        ids[i] = highText ? highText + (low + 1e9).toString().slice(1) : String(low);
+    }
+    return ids;
+}
+
+// Rough heap cost of one cached comment ID: a ~19 character string plus
+// its array slot
+const CACHE_BYTES_PER_ID = 64;
+
 class CommentDatabase {
-    constructor(databasePath) {
+    /**
+     * options.maxCacheBytes bounds the chunk cache (least recently used
+     * chunks are evicted first); options.prefetch fetches the next page's
+     * chunks in the background after each page.
+     */
+    constructor(databasePath, options = {}) {
         this.databasePath = databasePath;
         this.index = null;
+        this.maxCacheBytes = options.maxCacheBytes || 32 * 1024 * 1024;
+        this.prefetch = options.prefetch !== false;
+        // Map iteration order doubles as LRU order: oldest first
         this.cache = new Map();
+        this.cacheBytes = 0;
+        this.inflight = new Map();
+        this.stats = { hits: 0, misses: 0, evictions: 0, prefetches: 0 };
     }
     
     async initialize() {
@@ -197,6 +640,24 @@ class CommentDatabase {
         }
     }
     
+    chunksForRange(postData, startIndex, endIndex) {
+        const chunks = [];
+        let currentIndex = 0;
+        let firstChunkStart = null;
+        
+        for (const chunk of postData.chunks) {
+            const chunkEnd = currentIndex + chunk.count;
+            if (currentIndex < endIndex && chunkEnd > startIndex) {
+                if (firstChunkStart === null) {
+                    firstChunkStart = currentIndex;
+                }
+                chunks.push(chunk);
+            }
+            currentIndex = chunkEnd;
+        }
+        return { chunks, firstChunkStart: firstChunkStart || 0 };
+    }
+    
     async getCommentsForPost(shortcode, page = 1, limit = 50) {
         if (!this.index || !this.index.posts[shortcode]) {
             return { comments: [], total: 0, hasMore: false };
@@ -206,45 +667,132 @@ class CommentDatabase {
         const startIndex = (page - 1) * limit;
         const endIndex = startIndex + limit;
         
-        // Determine which chunks we need
-        const neededChunks = [];
-        let currentIndex = 0;
-        
-        for (const chunk of postData.chunks) {
-            const chunkEnd = currentIndex + chunk.count;
-            if (currentIndex < endIndex && chunkEnd > startIndex) {
-                neededChunks.push(chunk);
-            }
-            currentIndex = chunkEnd;
-        }
+        // Load every needed chunk at once; a failed chunk is skipped
+        const { chunks, firstChunkStart } = this.chunksForRange(postData, startIndex, endIndex);
+        const loaded = await Promise.all(chunks.map(chunk =>
+            this.loadChunk(shortcode, chunk).catch(error => {
+                console.error(`Failed to load chunk ${shortcode}-${chunk.index}:`, error);
+                return [];
+            })
+        ));
+        const comments = [].concat(...loaded);
         
-        // Load needed chunks
-        const comments = [];
-        for (const chunk of neededChunks) {
-            const chunkKey = `${shortcode}-${chunk.index}`;
-            
-            if (!this.cache.has(chunkKey)) {
-                try {
-                    const response = await fetch(`${this.databasePath}/${chunk.file}`);
-                    const chunkData = await response.json();
-                    this.cache.set(chunkKey, chunkData.comment_ids);
-                } catch (error) {
-                    console.error(`Failed to load chunk ${chunk.file}:`, error);
-                    continue;
-                }
-            }
-            
-            comments.push(...this.cache.get(chunkKey));
+        if (this.prefetch && endIndex < postData.total_comments) {
+            this.prefetchRange(shortcode, postData, endIndex, endIndex + limit);
         }
         
-        // Return paginated results
+        // Return paginated results; chunks vary in size, so offset from
+        // where the first loaded chunk starts
+        const offset = startIndex - firstChunkStart;
         return {
-            comments: comments.slice(startIndex % limit, (startIndex % limit) + limit),
+            comments: comments.slice(offset, offset + limit),
             total: postData.total_comments,
             hasMore: endIndex < postData.total_comments
         };
     }
     
+    prefetchRange(shortcode, postData, startIndex, endIndex) {
+        for (const chunk of this.chunksForRange(postData, startIndex, endIndex).chunks) {
+            const key = `${shortcode}-${chunk.index}`;
+            if (!this.cache.has(key) && !this.inflight.has(key)) {
+                this.stats.prefetches++;
+                this.fetchIntoCache(key, chunk).catch(() => {});
+            }
+        }
+    }
+    
+    async loadChunk(shortcode, chunk) {
+        const key = `${shortcode}-${chunk.index}`;
+        if (this.cache.has(key)) {
+            // Re-insert to mark as most recently used
+            const entry = this.cache.get(key);
+            this.cache.delete(key);
+            this.cache.set(key, entry);
+            this.stats.hits++;
+            return entry.ids;
+        }
+        if (this.inflight.has(key)) {
+            // Already being fetched, e.g. by a prefetch
+            this.stats.hits++;
+            return this.inflight.get(key);
+        }
+        this.stats.misses++;
+        return this.fetchIntoCache(key, chunk);
+    }
+    
+    fetchIntoCache(key, chunk) {
+        const promise = this.fetchChunk(chunk)
+            .then(chunkData => {
+                this.cacheChunk(key, chunkData.comment_ids);
+                return chunkData.comment_ids;
+            })
+            .finally(() => this.inflight.delete(key));
+        this.inflight.set(key, promise);
+        return promise;
+    }
+    
+    cacheChunk(key, ids) {
+        // Sized by the decoded IDs, not the chunk file: the ID strings take
+        // several times the memory of a JSON chunk and far more than a
+        // delta-varint one
+        const bytes = ids.length * CACHE_BYTES_PER_ID;
+        if (bytes > this.maxCacheBytes) {
+            return;
+        }
+        this.cache.set(key, { ids, bytes });
+        this.cacheBytes += bytes;
+        for (const [oldKey, entry] of this.cache) {
+            if (this.cacheBytes <= this.maxCacheBytes) {
+                break;
+            }
+            this.cache.delete(oldKey);
+            this.cacheBytes -= entry.bytes;
+            this.stats.evictions++;
+        }
+    }
+    
+    getCacheStats() {
+        const lookups = this.stats.hits + this.stats.misses;
+        return {
+            ...this.stats,
+            hitRate: lookups ? this.stats.hits / lookups : 0,
+            entries: this.cache.size,
+            bytes: this.cacheBytes,
+            maxBytes: this.maxCacheBytes
+        };
+    }
+    
+    async fetchChunk(chunk) {
+        let response;
+        if (chunk.offset === undefined) {
+            response = await fetch(`${this.databasePath}/${chunk.file}`);
+            if (!response.ok) {
+                throw new Error(`HTTP ${response.status}`);
+            }
+        } else {
+            // Packed: request just this chunk's gzipped bytes from the pack file
+            const end = chunk.offset + chunk.length - 1;
+            const packResponse = await fetch(`${this.databasePath}/${this.index.pack.file}`, {
+                headers: { Range: `bytes=${chunk.offset}-${end}` }
+            });
+            if (!packResponse.ok) {
+                throw new Error(`HTTP ${packResponse.status}`);
+            }
+            let bytes = await packResponse.arrayBuffer();
+            if (packResponse.status !== 206) {
+                // The server ignored Range and sent the whole pack
+                bytes = bytes.slice(chunk.offset, end + 1);
+            }
+            const stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream('gzip'));
+            response = new Response(stream);
+        }
+        
+        if (chunk.format === 'delta-varint') {
+            return { comment_ids: decodeCommentIds(new Uint8Array(await response.arrayBuffer())) };
+        }
+        return response.json();
+    }
+    
     getPostCommentCount(shortcode) {
         if (!this.index || !this.index.posts[shortcode]) {
             return 0;
@@ -263,18 +811,23 @@ window.CommentDatabase = CommentDatabase;
 '''
         
         loader_file = os.path.join(self.output_dir, 'comment-database.js')
-        with open(loader_file, 'w') as f:
-            f.write(loader_script)
+        write_file_atomic(loader_file, loader_script)
         
         print("Created comment-database.js loader script")
     
-    def process(self):
-        """Run the complete organization process"""
+    def process(self, full_rebuild=False):
+        """Run the complete organization process.
+
+        Only posts whose comments changed since the last build are
+        rewritten, unless full_rebuild is set.
+        """
         print(f"Starting static comment organization...")
         print(f"Output directory: {self.output_dir}")
         
-        # Clean output directory
-        self.clean_output_directory()
+        self.prepare_output_directory()
+        previous_index = self.load_previous_index()
+        if previous_index and not full_rebuild:
+            print(f"Updating existing database ({len(previous_index.get('posts', {}))} posts)")
         
         # Parse JSON files
         shortcode_comments = self.parse_json_files()
@@ -282,15 +835,17 @@ window.CommentDatabase = CommentDatabase;
         # Deduplicate
         shortcode_comments = self.deduplicate_comments(shortcode_comments)
         
-        # Create chunked files
-        self.create_chunked_files(shortcode_comments)
-        
-        # Create index files
-        self.create_index_files()
+        # Create chunked files for new and changed posts
+        self.create_chunked_files(shortcode_comments, None if full_rebuild else previous_index)
         
         # Create loader script
         self.create_loader_script()
         
+        # Create index files; this publishes the new build
+        self.create_index_files()
+        
+        self.remove_unreferenced_files(previous_index)
+        
         # Calculate size
         total_size = 0
         for root, dirs, files in os.walk(self.output_dir):
@@ -306,9 +861,18 @@ window.CommentDatabase = CommentDatabase;
         print("3. Initialize with: const db = new CommentDatabase('./static-comments-db')")
 
 def main():
+    arg_parser = argparse.ArgumentParser(description='Organize comments into a static chunked database')
+    arg_parser.add_argument('--full', action='store_true',
+                            help='Rewrite every post instead of only posts whose comments changed')
+    arg_parser.add_argument('--packed', action='store_true',
+                            help='Store all chunks in one pack file read with HTTP Range requests')
+    arg_parser.add_argument('--delta-ids', action='store_true',
+                            help='Store numeric comment IDs sorted, as binary varint deltas')
+    args = arg_parser.parse_args()
+    
     comments_dir = "/Volumes/Crucial X9/MMInstaArchive/mm_ig_comments"
-    organizer = StaticCommentOrganizer(comments_dir)
-    organizer.process()
+    organizer = StaticCommentOrganizer(comments_dir, packed=args.packed, delta_ids=args.delta_ids)
+    organizer.process(full_rebuild=args.full)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
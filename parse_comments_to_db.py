@@ -4,13 +4,19 @@ Parse Instagram comment JSON files and prepare for database insertion.
 Can output to CSV files or directly insert into PostgreSQL.
 """
 
-import json
 import csv
 import os
-from collections import defaultdict
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from itertools import islice
 import argparse
+import queue
 import sys
+import threading
+
+from comment_id_store import CommentIdSet, CommentRecords
+from comment_export_reader import CommentExportReader, ExportFormatError
 
 # Optional PostgreSQL support
 try:
@@ -20,13 +26,39 @@ try:
 except ImportError:
     HAS_POSTGRES = False
 
+COMMENT_INSERT_QUERY = """
+    INSERT INTO comments (comment_id, post_shortcode)
+    VALUES (%(comment_id)s, %(post_shortcode)s)
+    ON CONFLICT (comment_id) DO NOTHING
+"""
+
+REFRESH_COUNTS_SQL = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'refresh_post_comment_counts.sql')
+
+def read_comment_pairs(filepath):
+    """Read one export file and return ([(shortcode, comment_id), ...], message).
+
+    Pairs are in file order. `message` is a warning or error to report, or
+    None; pairs read before an error are still returned. Module-level so
+    it can run in a ProcessPoolExecutor worker.
+    """
+    pairs = []
+    try:
+        with open(filepath, 'r') as f:
+            pairs.extend(CommentExportReader(f))
+        return pairs, None
+    except ExportFormatError as e:
+        return pairs, f"Warning: {e}"
+    except Exception as e:
+        return pairs, f"Error processing file: {e}"
+
 class CommentParser:
     def __init__(self, comments_dir, metadata_path):
         self.comments_dir = comments_dir
         self.metadata_path = metadata_path
         self.posts_data = []
-        self.comments_data = []
-        self.seen_comment_ids = set()
+        # Packed storage: a set and list of dicts need tens of GB at 100M IDs
+        self.comments_data = CommentRecords()
+        self.seen_comment_ids = CommentIdSet()
         
     def parse_metadata_csv(self):
         """Parse the metadata CSV to get post information"""
@@ -73,68 +105,74 @@ class CommentParser:
         print(f"Found {len(self.posts_data)} posts in metadata")
         return self.posts_data
     
-    def parse_comment_files(self):
-        """Parse all JSON comment files"""
+    def parse_comment_files(self, workers=1):
+        """Parse all JSON comment files.
+
+        With workers > 1 the files are decoded on a process pool; each worker
+        returns its file's (shortcode, comment_id) pairs and they are merged
+        here in file order, so dedupe keeps the same first-seen comments as
+        the serial path. At most two files per worker are in flight, so only
+        those files' pairs are held in memory at once.
+        """
         json_files = [f for f in os.listdir(self.comments_dir) 
                       if f.endswith('.json') and not f.startswith('._')]
+        filepaths = [os.path.join(self.comments_dir, json_file) for json_file in json_files]
         
         print(f"\nParsing {len(json_files)} JSON comment files...")
         
-        for json_file in json_files:
-            filepath = os.path.join(self.comments_dir, json_file)
-            self._parse_single_json(filepath)
+        if workers <= 1 or len(filepaths) <= 1:
+            for filepath in filepaths:
+                self._parse_single_json(filepath)
+        else:
+            print(f"  Using {workers} worker processes")
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                remaining = iter(filepaths)
+                pending = deque((filepath, pool.submit(read_comment_pairs, filepath))
+                                for filepath in islice(remaining, workers * 2))
+                while pending:
+                    filepath, future = pending.popleft()
+                    next_filepath = next(remaining, None)
+                    if next_filepath is not None:
+                        pending.append((next_filepath, pool.submit(read_comment_pairs, next_filepath)))
+                    pairs, message = future.result()
+                    print(f"  Processing {os.path.basename(filepath)}...")
+                    try:
+                        self._merge_comment_pairs(pairs, report=message is None)
+                    except Exception as e:
+                        message = f"Error processing file: {e}"
+                    if message:
+                        print(f"    {message}")
         
         print(f"\nTotal unique comments collected: {len(self.comments_data)}")
         return self.comments_data
     
     def _parse_single_json(self, filepath):
-        """Parse a single JSON file"""
+        """Parse a single JSON file, streaming it rather than loading it whole"""
         print(f"  Processing {os.path.basename(filepath)}...")
         
         try:
             with open(filepath, 'r') as f:
-                data = json.load(f)
-            
-            if not isinstance(data, dict):
-                print(f"    Warning: Expected dict but got {type(data)}")
-                return
-            
-            new_comments = 0
-            duplicate_comments = 0
-            
-            for uuid, entry in data.items():
-                if not isinstance(entry, dict):
-                    continue
-                
-                shortcode = entry.get('target', '')
-                if not shortcode:
-                    continue
-                
-                # Extract all comment IDs from logs
-                for log in entry.get('logs', []):
-                    if not isinstance(log, dict):
-                        continue
-                    
-                    comment_ids = log.get('storedIds', [])
-                    if not isinstance(comment_ids, list):
-                        continue
-                    
-                    for comment_id in comment_ids:
-                        if comment_id not in self.seen_comment_ids:
-                            self.seen_comment_ids.add(comment_id)
-                            self.comments_data.append({
-                                'comment_id': comment_id,
-                                'post_shortcode': shortcode
-                            })
-                            new_comments += 1
-                        else:
-                            duplicate_comments += 1
-            
-            print(f"    Added {new_comments} new comments, skipped {duplicate_comments} duplicates")
-            
+                self._merge_comment_pairs(CommentExportReader(f))
+        except ExportFormatError as e:
+            print(f"    Warning: {e}")
         except Exception as e:
             print(f"    Error processing file: {e}")
     
+    def _merge_comment_pairs(self, pairs, report=True):
+        """Add (shortcode, comment_id) pairs, skipping IDs already seen"""
+        new_comments = 0
+        duplicate_comments = 0
+        
+        for shortcode, comment_id in pairs:
+            if self.seen_comment_ids.add(comment_id):
+                self.comments_data.append(comment_id, shortcode)
+                new_comments += 1
+            else:
+                duplicate_comments += 1
+        
+        if report:
+            print(f"    Added {new_comments} new comments, skipped {duplicate_comments} duplicates")
+    
     def save_to_csv(self, output_dir):
         """Save parsed data to CSV files"""
         os.makedirs(output_dir, exist_ok=True)
@@ -156,6 +194,27 @@ class CommentParser:
             writer.writerows(self.comments_data)
         print(f"Saved {len(self.comments_data)} comments to {comments_file}")
     
+    def _insert_posts(self, cur):
+        """Insert or update every parsed post"""
+        print("\nInserting posts into database...")
+        post_query = """
+            INSERT INTO posts (shortcode, post_url, created_at, likes, comment_count, caption)
+            VALUES (%(shortcode)s, %(post_url)s, %(created_at)s, %(likes)s, %(comment_count)s, %(caption)s)
+            ON CONFLICT (shortcode) DO UPDATE SET
+                likes = EXCLUDED.likes,
+                comment_count = EXCLUDED.comment_count
+        """
+        execute_batch(cur, post_query, self.posts_data, page_size=1000)
+        print(f"Inserted/updated {len(self.posts_data)} posts")
+    
+    def _refresh_comment_counts(self, cur):
+        """Keep the stored per-post counts (database_schema.sql) current"""
+        cur.execute("SELECT to_regclass('post_comment_counts')")
+        if cur.fetchone()[0]:
+            with open(REFRESH_COUNTS_SQL, 'r') as f:
+                cur.execute(f.read())
+            print("Refreshed per-post comment counts")
+    
     def insert_to_postgres(self, connection_params):
         """Insert data directly into PostgreSQL"""
         if not HAS_POSTGRES:
@@ -166,28 +225,15 @@ class CommentParser:
             conn = psycopg2.connect(**connection_params)
             cur = conn.cursor()
             
-            # Insert posts
-            print("\nInserting posts into database...")
-            post_query = """
-                INSERT INTO posts (shortcode, post_url, created_at, likes, comment_count, caption)
-                VALUES (%(shortcode)s, %(post_url)s, %(created_at)s, %(likes)s, %(comment_count)s, %(caption)s)
-                ON CONFLICT (shortcode) DO UPDATE SET
-                    likes = EXCLUDED.likes,
-                    comment_count = EXCLUDED.comment_count
-            """
-            execute_batch(cur, post_query, self.posts_data, page_size=1000)
-            print(f"Inserted/updated {len(self.posts_data)} posts")
+            self._insert_posts(cur)
             
             # Insert comments
             print("\nInserting comments into database...")
-            comment_query = """
-                INSERT INTO comments (comment_id, post_shortcode)
-                VALUES (%(comment_id)s, %(post_shortcode)s)
-                ON CONFLICT (comment_id) DO NOTHING
-            """
-            execute_batch(cur, comment_query, self.comments_data, page_size=5000)
+            execute_batch(cur, COMMENT_INSERT_QUERY, self.comments_data, page_size=5000)
             print(f"Inserted {len(self.comments_data)} comments")
             
+            self._refresh_comment_counts(cur)
+            
             conn.commit()
             cur.close()
             conn.close()
@@ -200,10 +246,104 @@ class CommentParser:
                 conn.rollback()
                 conn.close()
 
+    def stream_to_postgres(self, connection_params, batch_size=5000, queue_size=8):
+        """Parse comment files straight into PostgreSQL, without CSVs or a full parse first.
+        
+        This thread streams each export file and puts batches of new
+        (comment_id, shortcode) rows on a bounded queue. A loader thread
+        inserts them over its own connection, so JSON decoding overlaps
+        with network writes. Only the compact seen-ID set stays in memory;
+        comments_data is not filled. Everything commits at the end in one
+        transaction, as insert_to_postgres() does.
+        """
+        if not HAS_POSTGRES:
+            print("Error: psycopg2 not installed. Run: pip install psycopg2-binary")
+            return
+        
+        conn = psycopg2.connect(**connection_params)
+        cur = conn.cursor()
+        batches = queue.Queue(maxsize=queue_size)
+        loader = {'inserted': 0, 'error': None}
+        
+        def load_batches():
+            while True:
+                batch = batches.get()
+                if batch is None:
+                    return
+                if loader['error']:
+                    continue  # Keep draining so the parser never blocks
+                try:
+                    execute_batch(cur, COMMENT_INSERT_QUERY, batch, page_size=batch_size)
+                    loader['inserted'] += len(batch)
+                except Exception as e:
+                    loader['error'] = e
+        
+        try:
+            # Posts first: comments reference them
+            self._insert_posts(cur)
+            
+            json_files = [f for f in os.listdir(self.comments_dir) 
+                          if f.endswith('.json') and not f.startswith('._')]
+            print(f"\nStreaming {len(json_files)} JSON comment files into the database...")
+            
+            loader_thread = threading.Thread(target=load_batches, daemon=True)
+            loader_thread.start()
+            
+            batch = []
+            try:
+                for json_file in json_files:
+                    if loader['error']:
+                        break
+                    print(f"  Processing {json_file}...")
+                    new_comments = 0
+                    duplicate_comments = 0
+                    try:
+                        with open(os.path.join(self.comments_dir, json_file), 'r') as f:
+                            for shortcode, comment_id in CommentExportReader(f):
+                                if not self.seen_comment_ids.add(comment_id):
+                                    duplicate_comments += 1
+                                    continue
+                                new_comments += 1
+                                batch.append({'comment_id': comment_id, 'post_shortcode': shortcode})
+                                if len(batch) >= batch_size:
+                                    batches.put(batch)
+                                    batch = []
+                        print(f"    Queued {new_comments} new comments, skipped {duplicate_comments} duplicates "
+                              f"({loader['inserted']:,} inserted so far)")
+                    except ExportFormatError as e:
+                        print(f"    Warning: {e}")
+                    except Exception as e:
+                        print(f"    Error processing file: {e}")
+                
+                if batch:
+                    batches.put(batch)
+            finally:
+                batches.put(None)
+                loader_thread.join()
+            
+            if loader['error']:
+                raise loader['error']
+            print(f"\nInserted {loader['inserted']:,} comments")
+            
+            self._refresh_comment_counts(cur)
+            conn.commit()
+            print("\nDatabase insertion complete!")
+            
+        except Exception as e:
+            print(f"Error inserting to database: {e}")
+            conn.rollback()
+        finally:
+            cur.close()
+            conn.close()
+
 def main():
     arg_parser = argparse.ArgumentParser(description='Parse Instagram comments for database storage')
     arg_parser.add_argument('--csv', action='store_true', help='Output to CSV files instead of database')
     arg_parser.add_argument('--output-dir', default='./data/parsed', help='Output directory for CSV files')
+    arg_parser.add_argument('--workers', type=int, default=1,
+                            help='Processes for parsing comment files (0 = one per CPU core)')
+    arg_parser.add_argument('--pipeline', action='store_true',
+                            help='Stream parsed comments into the database while parsing (no CSVs, no full parse in memory)')
     
     # Database connection parameters
     arg_parser.add_argument('--db-host', default='localhost', help='PostgreSQL host')
@@ -222,23 +362,29 @@ def main():
     
     # Parse data
     comment_parser.parse_metadata_csv()
-    comment_parser.parse_comment_files()
+    
+    if not args.csv and not args.db_password:
+        print("Error: Database password required for insertion")
+        sys.exit(1)
+    
+    connection_params = {
+        'host': args.db_host,
+        'port': args.db_port,
+        'database': args.db_name,
+        'user': args.db_user,
+        'password': args.db_password
+    }
+    
+    if args.pipeline and not args.csv:
+        comment_parser.stream_to_postgres(connection_params)
+        return
+    
+    comment_parser.parse_comment_files(workers=args.workers or os.cpu_count() or 1)
     
     # Save or insert data
     if args.csv:
         comment_parser.save_to_csv(args.output_dir)
     else:
-        if not args.db_password:
-            print("Error: Database password required for insertion")
-            sys.exit(1)
-        
-        connection_params = {
-            'host': args.db_host,
-            'port': args.db_port,
-            'database': args.db_name,
-            'user': args.db_user,
-            'password': args.db_password
-        }
         comment_parser.insert_to_postgres(connection_params)
 
 if __name__ == "__main__":
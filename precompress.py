@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Write precompressed .gz/.br sidecar files next to generated data files,
+so static servers (and serve_archive.py) can send them without
+compressing on every request.
+"""
+
+import gzip
+import os
+
+# Optional Brotli support
+try:
+    import brotli
+    HAS_BROTLI = True
+except ImportError:
+    HAS_BROTLI = False
+
+DEFAULT_GZIP_LEVEL = 9
+DEFAULT_BROTLI_QUALITY = 11
+
+SIDECAR_SUFFIXES = ('.gz', '.br')
+
+
+def compress_bytes(data, gzip_level=DEFAULT_GZIP_LEVEL, brotli_quality=DEFAULT_BROTLI_QUALITY):
+    """Return {'gzip': bytes, 'br': bytes} (brotli only when installed)"""
+    # mtime=0 keeps the gzip output reproducible between runs
+    variants = {'gzip': gzip.compress(data, compresslevel=gzip_level, mtime=0)}
+    if HAS_BROTLI:
+        variants['br'] = brotli.compress(data, quality=brotli_quality)
+    return variants
+
+
+def write_compressed_variants(path, gzip_level=DEFAULT_GZIP_LEVEL, brotli_quality=DEFAULT_BROTLI_QUALITY):
+    """Write path.gz (and path.br) next to `path`.
+
+    Returns the size in bytes of each variant, keyed 'raw', 'gzip' and 'br'.
+    A sidecar for an encoding that isn't written (.br without brotli) is
+    removed, so it can never be served for newer content.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    
+    return write_sidecars(path, data, compress_bytes(data, gzip_level, brotli_quality))
+
+
+def write_sidecars(path, data, variants):
+    """Write already-compressed `variants` (from compress_bytes) of `data` next to `path`.
+
+    For callers that compress in memory before writing `path` itself;
+    returns sizes like write_compressed_variants().
+    """
+    sizes = {'raw': len(data)}
+    for encoding, suffix in (('gzip', '.gz'), ('br', '.br')):
+        if encoding in variants:
+            with open(path + suffix, 'wb') as f:
+                f.write(variants[encoding])
+            sizes[encoding] = len(variants[encoding])
+        elif os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    
+    return sizes
+
+
+def remove_sidecars(path):
+    """Delete the .gz/.br sidecars of `path`, e.g. after rewriting it without compression.
+
+    Static servers such as nginx's gzip_static don't compare mtimes, so a
+    sidecar left beside a rewritten file would be served in its place.
+    """
+    for suffix in SIDECAR_SUFFIXES:
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
+def has_fresh_variants(path):
+    """True when every sidecar we would write exists and is newer than `path`"""
+    suffixes = SIDECAR_SUFFIXES if HAS_BROTLI else ('.gz',)
+    mtime = os.path.getmtime(path)
+    return all(os.path.exists(path + suffix) and os.path.getmtime(path + suffix) >= mtime
+               for suffix in suffixes)
+
+
+def existing_variant_sizes(path):
+    """Sizes of `path` and whichever sidecars already exist, keyed like write_compressed_variants"""
+    sizes = {'raw': os.path.getsize(path)}
+    for encoding, suffix in (('gzip', '.gz'), ('br', '.br')):
+        if os.path.exists(path + suffix):
+            sizes[encoding] = os.path.getsize(path + suffix)
+    return sizes
+
+
+def strip_sidecar_suffix(filename):
+    """chunk_0.json.gz -> chunk_0.json; other names are returned unchanged"""
+    for suffix in SIDECAR_SUFFIXES:
+        if filename.endswith(suffix):
+            return filename[:-len(suffix)]
+    return filename
+
+
+def format_size_report(label, sizes):
+    """One line describing raw and compressed sizes, e.g. for a size summary"""
+    raw = sizes.get('raw', 0)
+    parts = [f"{raw / (1024 * 1024):.1f} MB raw"]
+    for encoding in ('gzip', 'br'):
+        if encoding in sizes:
+            ratio = raw / sizes[encoding] if sizes[encoding] else 0
+            parts.append(f"{sizes[encoding] / (1024 * 1024):.1f} MB {encoding} ({ratio:.1f}x)")
+    return f"{label}: " + ', '.join(parts)
@@ -5,155 +5,549 @@ This script processes the comments.json file and creates indexed data structures
 that can be loaded directly into IndexedDB without client-side processing.
 """
 
+import argparse
+import hashlib
+import heapq
 import json
 import os
-from collections import defaultdict
+import re
+import shutil
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+from comment_store import write_columnar_store
+from json_stream import iter_json_array
+from precompress import (DEFAULT_BROTLI_QUALITY, DEFAULT_GZIP_LEVEL, HAS_BROTLI, existing_variant_sizes,
+                         format_size_report, has_fresh_variants, remove_sidecars, strip_sidecar_suffix,
+                         write_compressed_variants)
+
+COMMENTS_PATH = 'data/comments.json'
+VIDEOS_PATH = 'data/videos.json'
+VIDEO_INDEX_PATH = 'data/video_comments_index.json'
+SEARCH_INDEX_PATH = 'data/search_index.json'
+WORD_FREQ_INDEX_PATH = 'data/word_freq_index.json'
+MANIFEST_PATH = 'data/preindex_manifest.json'
+SHARD_DIR = 'data/video_comments'
+SHARD_MANIFEST_PATH = 'data/video_comments_manifest.json'
+COLUMNAR_PATH = 'data/video_comments.mmcs'
+SORT_ORDERS_PATH = 'data/video_sort_orders.json'
+
+# Bump when the per-video output format or algorithms change, so
+# incremental runs don't reuse entries computed the old way
+INDEX_VERSION = 2
+
+TERM_PATTERN = re.compile(r'\w+')
+
+# Common English stop words
+STOP_WORDS = {
+    'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with',
+    'by', 'from', 'up', 'about', 'into', 'through', 'during', 'before', 'after',
+    'above', 'below', 'between', 'among', 'throughout', 'alongside', 'towards',
+    'i', 'you', 'he', 'she', 'it', 'we', 'they', 'me', 'him', 'her', 'us', 'them',
+    'my', 'your', 'his', 'her', 'its', 'our', 'their', 'mine', 'yours', 'hers', 'ours', 'theirs',
+    'am', 'is', 'are', 'was', 'were', 'be', 'been', 'being', 'have', 'has', 'had',
+    'do', 'does', 'did', 'will', 'would', 'could', 'should', 'may', 'might', 'must',
+    'this', 'that', 'these', 'those', 'here', 'there', 'where', 'when', 'why', 'how',
+    'what', 'who', 'which', 'whose', 'whom', 'not', 'no', 'yes', 'can', 'cant',
+    'dont', 'wont', 'im', 'youre', 'hes', 'shes', 'were', 'theyre', 'ive', 'youve',
+    'also', 'just', 'really', 'very', 'so', 'too', 'now', 'then', 'well', 'still'
+}
 
 def load_data():
     """Load videos and comments data"""
-    with open('data/videos.json', 'r', encoding='utf-8') as f:
+    with open(VIDEOS_PATH, 'r', encoding='utf-8') as f:
         videos = json.load(f)
     
-    with open('data/comments.json', 'r', encoding='utf-8') as f:
+    with open(COMMENTS_PATH, 'r', encoding='utf-8') as f:
         comments = json.load(f)
     
     return videos, comments
 
-def create_video_comment_index(comments):
-    """Create an index mapping video_id to comment lists"""
-    video_comments = defaultdict(list)
+def iter_comments(path=COMMENTS_PATH):
+    """Yield comments one at a time without loading the whole file"""
+    with open(path, 'r', encoding='utf-8') as f:
+        yield from iter_json_array(f)
+
+def tokenize(text):
+    """Split lowercased text into word tokens (runs of \\w characters)"""
+    return TERM_PATTERN.findall(text.lower())
+
+def cloud_words(tokens):
+    """Keep the tokens that count towards word clouds.
+
+    Equivalent to matching \\b[a-zA-Z]{3,}\\b on the original text: a token
+    qualifies when it is 3+ ASCII letters and not a stop word.
+    """
+    return [token for token in tokens
+            if len(token) >= 3 and token.isascii() and token.isalpha() and token not in STOP_WORDS]
+
+class VideoGroup:
+    """Comments and word statistics for one video, gathered in one pass"""
+
+    __slots__ = ('comments', 'word_counts', 'liked', 'hasher')
+
+    def __init__(self, fingerprint=False):
+        self.comments = []
+        self.word_counts = Counter()
+        self.liked = []  # (like_count, cloud words) for comments with likes
+        self.hasher = hashlib.sha1() if fingerprint else None
+
+    def add(self, comment, tokens):
+        self.comments.append(comment)
+        
+        if self.hasher is not None:
+            self.hasher.update(json.dumps(comment, sort_keys=True, ensure_ascii=False,
+                                          separators=(',', ':')).encode('utf-8'))
+            self.hasher.update(b'\n')
+        
+        words = cloud_words(tokens)
+        self.word_counts.update(words)
+        
+        like_count = comment.get('like_count', 0)
+        if like_count > 0:
+            self.liked.append((like_count, words))
+
+    def fingerprint(self):
+        """Content hash of this video's comments, in ingestion order"""
+        return self.hasher.hexdigest()
+
+class SearchIndexBuilder:
+    """Builds an inverted index over comment text and author.
+
+    Each comment becomes a document number (its position in the document
+    table). Every distinct lowercase term maps to the sorted list of
+    documents containing it, stored as gaps between document numbers so
+    the posting lists serialize compactly.
+    """
+
+    def __init__(self):
+        self.comment_ids = []
+        self.doc_videos = []
+        self.video_numbers = {}
+        self.postings = defaultdict(list)
+
+    def add(self, comment, tokens):
+        doc = len(self.comment_ids)
+        self.comment_ids.append(comment['comment_id'])
+        
+        video_id = comment['video_id']
+        if video_id not in self.video_numbers:
+            self.video_numbers[video_id] = len(self.video_numbers)
+        self.doc_videos.append(self.video_numbers[video_id])
+        
+        # Searchable terms come from the comment content and author
+        terms = set(tokens)
+        terms.update(tokenize(f"{comment.get('author_display_name', '')} {comment.get('author', '')}"))
+        
+        for term in terms:
+            self.postings[term].append(doc)
+
+    def build(self):
+        terms = {}
+        for term in sorted(self.postings):
+            docs = self.postings[term]
+            gaps = [docs[0]]
+            gaps.extend(docs[i] - docs[i - 1] for i in range(1, len(docs)))
+            terms[term] = gaps
+        
+        return {
+            'version': 2,
+            'videos': list(self.video_numbers),
+            'docs': {
+                'comment_id': self.comment_ids,
+                'video': self.doc_videos
+            },
+            'terms': terms
+        }
+
+def ingest_comments(comments, search_builder=None, fingerprint=False):
+    """Group comments by video, tokenizing each comment exactly once.
+
+    The tokens are shared by the per-video word statistics and, when given,
+    the search index builder. `comments` may be a list or a generator such
+    as iter_comments(), so the raw input never has to be held in memory
+    alongside the indexes. With `fingerprint`, each group also hashes its
+    comments for incremental runs. Returns (comment_count, {video_id: VideoGroup}).
+    """
+    groups = {}
+    count = 0
     
     for comment in comments:
+        tokens = tokenize(comment.get('text', ''))
+        
         video_id = comment['video_id']
-        video_comments[video_id].append(comment)
-    
-    # Convert defaultdict to regular dict and sort comments by likes (desc) then date (desc)
-    indexed_comments = {}
-    for video_id, comment_list in video_comments.items():
-        # Sort by likes descending, then by date descending
-        sorted_comments = sorted(comment_list, 
-                               key=lambda x: (-x.get('like_count', 0), -x.get('published_at_timestamp', 0)))
-        indexed_comments[video_id] = sorted_comments
+        group = groups.get(video_id)
+        if group is None:
+            group = groups[video_id] = VideoGroup(fingerprint)
+        group.add(comment, tokens)
+        
+        if search_builder is not None:
+            search_builder.add(comment, tokens)
+        
+        count += 1
+        if count % 100000 == 0:
+            print(f"  Processed {count:,} comments...")
     
-    return indexed_comments
+    return count, groups
 
-def create_search_index(comments):
-    """Create a search index for faster text searches"""
-    search_index = {}
+def sort_video_comments(comment_list):
+    """Sort by likes descending, then by date descending"""
+    return sorted(comment_list, 
+                  key=lambda x: (-x.get('like_count', 0), -x.get('published_at_timestamp', 0)))
+
+def compute_word_frequencies(word_counts, liked):
+    """Word cloud and liked-words analysis for one video's statistics"""
+    # Get top 20 most frequent words
+    top_words = word_counts.most_common(20)
     
-    for comment in comments:
-        comment_id = comment['comment_id']
-        # Create searchable text from comment content and author
-        searchable_text = f"{comment.get('text', '')} {comment.get('author_display_name', '')}".lower()
-        
-        # Split into words for indexing
-        words = searchable_text.split()
-        search_index[comment_id] = {
-            'words': words,
-            'text': comment.get('text', ''),
-            'author': comment.get('author_display_name', ''),
-            'video_id': comment['video_id'],
-            'like_count': comment.get('like_count', 0),
-            'published_at': comment.get('published_at', ''),
-            'published_at_timestamp': comment.get('published_at_timestamp', 0)
-        }
+    # Also compute liked words analysis
+    # Partial selection: same result as a stable full sort then slicing
+    top_20_percent = max(1, len(liked) // 5)
+    top_liked = heapq.nlargest(top_20_percent, liked, key=lambda x: x[0])
     
-    return search_index
+    if top_liked:
+        # Calculate average likes per word
+        word_like_totals = defaultdict(list)
+        for like_count, words in top_liked:
+            for word in words:
+                word_like_totals[word].append(like_count)
+        
+        liked_word_averages = []
+        for word, like_counts in word_like_totals.items():
+            if len(like_counts) >= 2:  # Word appears in at least 2 liked comments
+                avg_likes = round(sum(like_counts) / len(like_counts))
+                liked_word_averages.append((word, avg_likes, len(like_counts)))
+        
+        top_liked_words = heapq.nlargest(15, liked_word_averages, key=lambda x: x[1])
+    else:
+        top_liked_words = []
+    
+    return {
+        'word_cloud': [{'word': word, 'count': count} for word, count in top_words],
+        'liked_words': [{'word': word, 'avgLikes': avg, 'count': count} 
+                       for word, avg, count in top_liked_words]
+    }
 
-def create_word_frequency_index(comments):
-    """Pre-compute word frequencies for each video"""
-    import re
-    from collections import Counter
-    
-    # Common English stop words
-    stop_words = {
-        'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with',
-        'by', 'from', 'up', 'about', 'into', 'through', 'during', 'before', 'after',
-        'above', 'below', 'between', 'among', 'throughout', 'alongside', 'towards',
-        'i', 'you', 'he', 'she', 'it', 'we', 'they', 'me', 'him', 'her', 'us', 'them',
-        'my', 'your', 'his', 'her', 'its', 'our', 'their', 'mine', 'yours', 'hers', 'ours', 'theirs',
-        'am', 'is', 'are', 'was', 'were', 'be', 'been', 'being', 'have', 'has', 'had',
-        'do', 'does', 'did', 'will', 'would', 'could', 'should', 'may', 'might', 'must',
-        'this', 'that', 'these', 'those', 'here', 'there', 'where', 'when', 'why', 'how',
-        'what', 'who', 'which', 'whose', 'whom', 'not', 'no', 'yes', 'can', 'cant',
-        'dont', 'wont', 'im', 'youre', 'hes', 'shes', 'were', 'theyre', 'ive', 'youve',
-        'also', 'just', 'really', 'very', 'so', 'too', 'now', 'then', 'well', 'still'
+def utf16_length(text):
+    """String length as JavaScript measures it (UTF-16 code units)"""
+    return len(text.encode('utf-16-le')) // 2
+
+def compute_sort_orders(sorted_comments):
+    """Permutations of a video's stored comment order for each UI sort order.
+
+    Stored order is already most-liked first (likes desc, then date desc),
+    so 'likes' needs no permutation. Each list holds positions into the
+    stored order; ties keep stored order, matching the browser's stable sort.
+    """
+    timestamps = [comment.get('published_at_timestamp', 0) for comment in sorted_comments]
+    lengths = [utf16_length(comment.get('text') or '') for comment in sorted_comments]
+    positions = range(len(sorted_comments))
+    return {
+        'newest': sorted(positions, key=lambda i: -timestamps[i]),
+        'oldest': sorted(positions, key=lambda i: timestamps[i]),
+        'longest': sorted(positions, key=lambda i: -lengths[i])
     }
+
+def build_video_comment_index(groups):
+    """Map video_id to its comments in display order"""
+    return {video_id: sort_video_comments(group.comments) for video_id, group in groups.items()}
+
+def build_word_frequency_index(groups, workers=1):
+    """Map video_id to its word cloud and liked-words analysis.
+
+    Videos are independent, so with workers > 1 they are spread across a
+    process pool. Results come back in submission order, so the output is
+    identical to the serial path.
+    """
+    if workers <= 1 or len(groups) <= 1:
+        return {video_id: compute_word_frequencies(group.word_counts, group.liked)
+                for video_id, group in groups.items()}
     
-    video_word_freq = {}
-    video_comments = defaultdict(list)
-    
-    # Group comments by video
-    for comment in comments:
-        video_comments[comment['video_id']].append(comment)
-    
-    for video_id, video_comment_list in video_comments.items():
-        all_text = ' '.join([comment.get('text', '') for comment in video_comment_list])
-        
-        # Clean and tokenize text
-        words = re.findall(r'\b[a-zA-Z]{3,}\b', all_text.lower())
-        filtered_words = [word for word in words if word not in stop_words]
-        
-        # Count frequencies
-        word_counts = Counter(filtered_words)
-        
-        # Get top 20 most frequent words
-        top_words = word_counts.most_common(20)
-        
-        # Also compute liked words analysis
-        liked_comments = sorted([c for c in video_comment_list if c.get('like_count', 0) > 0], 
-                               key=lambda x: x.get('like_count', 0), reverse=True)
-        
-        top_20_percent = max(1, len(liked_comments) // 5)
-        top_liked = liked_comments[:top_20_percent]
-        
-        if top_liked:
-            liked_text = ' '.join([comment.get('text', '') for comment in top_liked])
-            liked_words = re.findall(r'\b[a-zA-Z]{3,}\b', liked_text.lower())
-            liked_filtered = [word for word in liked_words if word not in stop_words]
-            
-            # Calculate average likes per word
-            word_like_totals = defaultdict(list)
-            for comment in top_liked:
-                comment_words = re.findall(r'\b[a-zA-Z]{3,}\b', comment.get('text', '').lower())
-                for word in comment_words:
-                    if word not in stop_words:
-                        word_like_totals[word].append(comment.get('like_count', 0))
-            
-            liked_word_averages = []
-            for word, like_counts in word_like_totals.items():
-                if len(like_counts) >= 2:  # Word appears in at least 2 liked comments
-                    avg_likes = round(sum(like_counts) / len(like_counts))
-                    liked_word_averages.append((word, avg_likes, len(like_counts)))
-            
-            liked_word_averages.sort(key=lambda x: x[1], reverse=True)
-            top_liked_words = liked_word_averages[:15]
-        else:
-            top_liked_words = []
+    video_ids = list(groups)
+    chunksize = max(1, len(video_ids) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = pool.map(compute_word_frequencies,
+                           [groups[video_id].word_counts for video_id in video_ids],
+                           [groups[video_id].liked for video_id in video_ids],
+                           chunksize=chunksize)
+        return dict(zip(video_ids, results))
+
+def create_video_comment_index(comments):
+    """Create an index mapping video_id to comment lists"""
+    _, groups = ingest_comments(comments)
+    return build_video_comment_index(groups)
+
+def create_search_index(comments):
+    """Create an inverted index for term lookups in text searches"""
+    builder = SearchIndexBuilder()
+    ingest_comments(comments, builder)
+    return builder.build()
+
+def create_word_frequency_index(comments, workers=1):
+    """Pre-compute word frequencies for each video"""
+    _, groups = ingest_comments(comments)
+    return build_word_frequency_index(groups, workers)
+
+def shard_filename(video_id):
+    """Stable, filesystem-safe shard name for a video.
+
+    Hashing avoids collisions between IDs that differ only in case on
+    case-insensitive filesystems.
+    """
+    return hashlib.sha1(video_id.encode('utf-8')).hexdigest()[:16] + '.json'
+
+def output_stamp(path):
+    """(size, mtime_ns) of an output file, or None if it doesn't exist"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+def load_previous_build(sharded=False):
+    """Load the manifest and per-video indexes written by the last incremental run.
+
+    Returns (fingerprints, video_comments_index, word_freq_index, stamps),
+    or None when any piece is missing, was built by a different
+    INDEX_VERSION or output layout, or has been rewritten since the
+    manifest was saved (its size/mtime no longer match the manifest's
+    stamps), in which case everything is recomputed. For sharded builds
+    the previous comments stay in their shard files, so
+    video_comments_index is None; each reused shard is checked against
+    `stamps` separately.
+    """
+    try:
+        with open(MANIFEST_PATH, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('version') != INDEX_VERSION or manifest.get('sharded', False) != sharded:
+            return None
         
-        video_word_freq[video_id] = {
-            'word_cloud': [{'word': word, 'count': count} for word, count in top_words],
-            'liked_words': [{'word': word, 'avgLikes': avg, 'count': count} 
-                           for word, avg, count in top_liked_words]
-        }
+        stamps = manifest.get('outputs')
+        if not isinstance(stamps, dict):
+            return None
+        shared_outputs = [WORD_FREQ_INDEX_PATH] if sharded else [VIDEO_INDEX_PATH, WORD_FREQ_INDEX_PATH]
+        for path in shared_outputs:
+            if stamps.get(path) is None or stamps.get(path) != output_stamp(path):
+                return None
+        
+        video_comments_index = None
+        if not sharded:
+            with open(VIDEO_INDEX_PATH, 'r', encoding='utf-8') as f:
+                video_comments_index = json.load(f)
+        with open(WORD_FREQ_INDEX_PATH, 'r', encoding='utf-8') as f:
+            word_freq_index = json.load(f)
+    except (OSError, ValueError):
+        return None
     
-    return video_word_freq
+    return manifest['videos'], video_comments_index, word_freq_index, stamps
 
-def main():
-    print("🔄 Loading data...")
-    videos, comments = load_data()
+def save_manifest(fingerprints, output_paths, sharded=False):
+    """Record per-video content fingerprints for the next incremental run,
+    stamped with the outputs they describe"""
+    stamps = {path: output_stamp(path) for path in output_paths}
+    with open(MANIFEST_PATH, 'w', encoding='utf-8') as f:
+        json.dump({'version': INDEX_VERSION, 'sharded': sharded, 'videos': fingerprints,
+                   'outputs': stamps}, f, ensure_ascii=False, separators=(',', ':'))
+
+def remove_manifest():
+    """Forget the last incremental run, e.g. after a full build replaced its outputs"""
+    if os.path.exists(MANIFEST_PATH):
+        os.remove(MANIFEST_PATH)
+
+class PreindexResult:
+    """Everything produced by build_indexes()"""
+
+    def __init__(self, comment_count, video_counts, reply_counts, video_comments_index, search_index,
+                 word_freq_index, fingerprints):
+        self.comment_count = comment_count
+        self.video_counts = video_counts  # video_id -> comment count, in ingestion order
+        self.reply_counts = reply_counts  # video_id -> number of replies
+        self.video_comments_index = video_comments_index
+        self.search_index = search_index
+        self.word_freq_index = word_freq_index
+        self.fingerprints = fingerprints  # None unless running incrementally
+
+def build_indexes(comments, incremental=False, workers=1, sharded=False):
+    """Build all three indexes from a single ingestion pass.
+
+    In incremental mode, videos whose content fingerprint matches the
+    previous manifest reuse their word frequencies and sorted comments from
+    the previous output; only changed or new videos are recomputed.
+    Word frequencies are computed on `workers` processes.
+
+    For sharded output, video_comments_index only holds the videos whose
+    shard has to be (re)written; unchanged shards are left on disk.
+    """
+    previous = load_previous_build(sharded) if incremental else None
+    if incremental and previous is None:
+        print("♻️  No usable previous build found - running a full build")
     
-    print(f"📊 Processing {len(videos)} videos and {len(comments)} comments...")
+    search_builder = SearchIndexBuilder()
+    count, groups = ingest_comments(comments, search_builder, fingerprint=incremental)
+    
+    fingerprints = None
+    changed = groups
+    if incremental:
+        fingerprints = {video_id: group.fingerprint() for video_id, group in groups.items()}
+    if previous is not None:
+        previous_fingerprints, previous_video_index, previous_word_freq, previous_stamps = previous
+        
+        def is_reusable(video_id):
+            if previous_fingerprints.get(video_id) != fingerprints[video_id]:
+                return False
+            if video_id not in previous_word_freq:
+                return False
+            if sharded:
+                # The shard must be the one written alongside the manifest
+                shard_path = os.path.join(SHARD_DIR, shard_filename(video_id))
+                stamp = output_stamp(shard_path)
+                return stamp is not None and previous_stamps.get(shard_path) == stamp
+            return video_id in previous_video_index
+        
+        changed = {video_id: group for video_id, group in groups.items() if not is_reusable(video_id)}
+        print(f"♻️  {len(groups) - len(changed)} unchanged videos reused, {len(changed)} recomputed")
     
-    # Create indexes
     print("🔍 Creating video-comment index...")
-    video_comments_index = create_video_comment_index(comments)
+    video_comments_index = build_video_comment_index(changed)
     
     print("🔍 Creating search index...")
-    search_index = create_search_index(comments)
+    search_index = search_builder.build()
     
     print("🔍 Creating word frequency index...")
-    word_freq_index = create_word_frequency_index(comments)
+    word_freq_index = build_word_frequency_index(changed, workers)
+    
+    if previous is not None:
+        # Reassemble in ingestion order so the output matches a full build
+        if not sharded:
+            video_comments_index = {video_id: video_comments_index[video_id] if video_id in changed
+                                    else previous_video_index[video_id]
+                                    for video_id in groups}
+        word_freq_index = {video_id: word_freq_index[video_id] if video_id in changed
+                           else previous_word_freq[video_id]
+                           for video_id in groups}
+    
+    video_counts = {video_id: len(group.comments) for video_id, group in groups.items()}
+    reply_counts = {video_id: sum(1 for comment in group.comments if comment.get('is_reply'))
+                    for video_id, group in groups.items()}
+    return PreindexResult(count, video_counts, reply_counts, video_comments_index, search_index,
+                          word_freq_index, fingerprints)
+
+def write_video_shards(video_comments_index, video_counts):
+    """Write one shard file per video.
+
+    Each shard holds the video's comments and their precomputed sort
+    orders (see compute_sort_orders). Only the videos in `video_comments_index` are written; shards of other
+    videos listed in `video_counts` are left as they are, and shards of
+    videos that no longer exist are removed.
+    """
+    os.makedirs(SHARD_DIR, exist_ok=True)
+    
+    for video_id, comments in video_comments_index.items():
+        shard = {'comments': comments, 'orders': compute_sort_orders(comments)}
+        with open(os.path.join(SHARD_DIR, shard_filename(video_id)), 'w', encoding='utf-8') as f:
+            json.dump(shard, f, ensure_ascii=False, separators=(',', ':'))
+    
+    expected = {shard_filename(video_id) for video_id in video_counts}
+    for filename in os.listdir(SHARD_DIR):
+        if strip_sidecar_suffix(filename) not in expected:
+            os.remove(os.path.join(SHARD_DIR, filename))
+
+def write_shard_manifest(video_counts, reply_counts):
+    """Write the manifest of per-video comment/reply counts and shard locations.
+
+    Written after every other output of the build, so the browser can
+    tell a current manifest (not older than search_index.json) from one
+    left behind by an earlier sharded build.
+    """
+    shard_prefix = os.path.basename(SHARD_DIR)
+    manifest = {'version': 3, 'videos': {}}
+    for video_id, count in video_counts.items():
+        manifest['videos'][video_id] = {
+            'count': count,
+            'replies': reply_counts[video_id],
+            'shard': f'{shard_prefix}/{shard_filename(video_id)}'
+        }
+    
+    with open(SHARD_MANIFEST_PATH, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, separators=(',', ':'))
+
+def remove_video_shards():
+    """Delete the shards and manifest of an earlier --shards build, which the
+    browser would otherwise keep loading instead of video_comments_index.json"""
+    if os.path.exists(SHARD_MANIFEST_PATH):
+        os.remove(SHARD_MANIFEST_PATH)
+    remove_sidecars(SHARD_MANIFEST_PATH)
+    if os.path.isdir(SHARD_DIR):
+        shutil.rmtree(SHARD_DIR)
+
+def complete_video_comments(result):
+    """Every video's sorted comments, reading unchanged videos back from their shards"""
+    index = result.video_comments_index
+    if len(index) == len(result.video_counts):
+        return index
+    
+    complete = {}
+    for video_id in result.video_counts:
+        if video_id in index:
+            complete[video_id] = index[video_id]
+        else:
+            with open(os.path.join(SHARD_DIR, shard_filename(video_id)), 'r', encoding='utf-8') as f:
+                complete[video_id] = json.load(f)['comments']
+    return complete
+
+def precompress_outputs(outputs, rewritten, gzip_level=DEFAULT_GZIP_LEVEL,
+                        brotli_quality=DEFAULT_BROTLI_QUALITY):
+    """Write .gz/.br sidecars for each output file and print size reports.
+
+    `outputs` is a list of (label, paths). Files that were not rewritten
+    this run keep their existing sidecars when those are still fresh.
+    """
+    for label, paths in outputs:
+        totals = Counter()
+        for path in paths:
+            if path in rewritten or not has_fresh_variants(path):
+                totals.update(write_compressed_variants(path, gzip_level, brotli_quality))
+            else:
+                totals.update(existing_variant_sizes(path))
+        print(f"🗜️  {format_size_report(label, totals)}")
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Pre-index comments for faster browser loading')
+    arg_parser.add_argument('--stream', action='store_true',
+                            help='Read comments.json incrementally instead of loading it all at once')
+    arg_parser.add_argument('--incremental', action='store_true',
+                            help='Only recompute videos whose comments changed since the last incremental run')
+    arg_parser.add_argument('--workers', type=int, default=1,
+                            help='Processes for word-frequency computation (0 = one per CPU core)')
+    arg_parser.add_argument('--shards', action='store_true',
+                            help='Write one comment file per video plus a manifest instead of video_comments_index.json')
+    arg_parser.add_argument('--compress', action='store_true',
+                            help='Also write precompressed .gz (and .br, if brotli is installed) files')
+    arg_parser.add_argument('--compress-level', type=int, default=DEFAULT_GZIP_LEVEL,
+                            help='gzip compression level, 1-9')
+    arg_parser.add_argument('--brotli-quality', type=int, default=DEFAULT_BROTLI_QUALITY,
+                            help='Brotli quality, 0-11')
+    arg_parser.add_argument('--columnar', action='store_true',
+                            help='Also write a columnar binary comment store (see comment_store.py)')
+    args = arg_parser.parse_args()
+    workers = args.workers or os.cpu_count() or 1
+    
+    print("🔄 Loading data...")
+    if args.stream:
+        with open(VIDEOS_PATH, 'r', encoding='utf-8') as f:
+            videos = json.load(f)
+        comments = iter_comments()
+        print(f"📊 Streaming comments for {len(videos)} videos...")
+    else:
+        videos, comments = load_data()
+        print(f"📊 Processing {len(videos)} videos and {len(comments)} comments...")
+    
+    # Create indexes
+    result = build_indexes(comments, incremental=args.incremental, workers=workers, sharded=args.shards)
+    del comments
+    
+    if args.stream:
+        print(f"📊 Processed {result.comment_count:,} comments")
     
     # Create data directory if it doesn't exist
     os.makedirs('data', exist_ok=True)
@@ -161,24 +555,77 @@ def main():
     # Save indexed data
     print("💾 Saving indexed data...")
     
-    with open('data/video_comments_index.json', 'w', encoding='utf-8') as f:
-        json.dump(video_comments_index, f, ensure_ascii=False, separators=(',', ':'))
+    if args.shards:
+        write_video_shards(result.video_comments_index, result.video_counts)
+        print(f"📁 Wrote {len(result.video_comments_index)} of {len(result.video_counts)} video shards")
+        shard_paths = [os.path.join(SHARD_DIR, shard_filename(video_id)) for video_id in result.video_counts]
+        rewritten = {os.path.join(SHARD_DIR, shard_filename(video_id)) for video_id in result.video_comments_index}
+        rewritten.update([SHARD_MANIFEST_PATH, SEARCH_INDEX_PATH, WORD_FREQ_INDEX_PATH])
+        outputs = [('video_comments shards + manifest', [SHARD_MANIFEST_PATH] + shard_paths)]
+    else:
+        remove_video_shards()
+        rewritten = {VIDEO_INDEX_PATH, SORT_ORDERS_PATH, SEARCH_INDEX_PATH, WORD_FREQ_INDEX_PATH}
+        outputs = [('video_comments_index.json', [VIDEO_INDEX_PATH]),
+                   ('video_sort_orders.json', [SORT_ORDERS_PATH])]
+        with open(VIDEO_INDEX_PATH, 'w', encoding='utf-8') as f:
+            json.dump(result.video_comments_index, f, ensure_ascii=False, separators=(',', ':'))
+        
+        sort_orders = {video_id: compute_sort_orders(comments)
+                       for video_id, comments in result.video_comments_index.items()}
+        with open(SORT_ORDERS_PATH, 'w', encoding='utf-8') as f:
+            json.dump(sort_orders, f, separators=(',', ':'))
     
-    with open('data/search_index.json', 'w', encoding='utf-8') as f:
-        json.dump(search_index, f, ensure_ascii=False, separators=(',', ':'))
+    with open(SEARCH_INDEX_PATH, 'w', encoding='utf-8') as f:
+        json.dump(result.search_index, f, ensure_ascii=False, separators=(',', ':'))
     
-    with open('data/word_freq_index.json', 'w', encoding='utf-8') as f:
-        json.dump(word_freq_index, f, ensure_ascii=False, separators=(',', ':'))
+    with open(WORD_FREQ_INDEX_PATH, 'w', encoding='utf-8') as f:
+        json.dump(result.word_freq_index, f, ensure_ascii=False, separators=(',', ':'))
+    
+    if args.shards:
+        write_shard_manifest(result.video_counts, result.reply_counts)
+    
+    if args.columnar:
+        write_columnar_store(COLUMNAR_PATH, complete_video_comments(result))
+    
+    if result.fingerprints is not None:
+        if args.shards:
+            manifest_outputs = [WORD_FREQ_INDEX_PATH] + shard_paths
+        else:
+            manifest_outputs = [VIDEO_INDEX_PATH, WORD_FREQ_INDEX_PATH]
+        save_manifest(result.fingerprints, manifest_outputs, sharded=args.shards)
+    else:
+        # A full build replaced the outputs the manifest described
+        remove_manifest()
     
     # Calculate file sizes
     def get_file_size(filename):
         return os.path.getsize(filename) / (1024 * 1024)  # MB
     
+    if args.shards:
+        video_index_size = get_file_size(SHARD_MANIFEST_PATH) + sum(
+            get_file_size(os.path.join(SHARD_DIR, shard_filename(video_id))) for video_id in result.video_counts)
+        video_index_label = 'video_comments shards + manifest'
+    else:
+        video_index_size = get_file_size(VIDEO_INDEX_PATH) + get_file_size(SORT_ORDERS_PATH)
+        video_index_label = 'video_comments_index.json + sort orders'
+    
     print(f"✅ Indexing complete!")
-    print(f"📁 video_comments_index.json: {get_file_size('data/video_comments_index.json'):.1f} MB")
-    print(f"📁 search_index.json: {get_file_size('data/search_index.json'):.1f} MB")  
-    print(f"📁 word_freq_index.json: {get_file_size('data/word_freq_index.json'):.1f} MB")
-    print(f"📁 Total indexed data: {get_file_size('data/video_comments_index.json') + get_file_size('data/search_index.json') + get_file_size('data/word_freq_index.json'):.1f} MB")
+    print(f"📁 {video_index_label}: {video_index_size:.1f} MB")
+    print(f"📁 search_index.json: {get_file_size(SEARCH_INDEX_PATH):.1f} MB")  
+    print(f"📁 word_freq_index.json: {get_file_size(WORD_FREQ_INDEX_PATH):.1f} MB")
+    print(f"📁 Total indexed data: {video_index_size + get_file_size(SEARCH_INDEX_PATH) + get_file_size(WORD_FREQ_INDEX_PATH):.1f} MB")
+    if args.columnar:
+        print(f"📁 video_comments.mmcs (columnar): {get_file_size(COLUMNAR_PATH):.1f} MB")
+    
+    if args.compress:
+        if not HAS_BROTLI:
+            print("ℹ️  brotli not installed - writing gzip only (pip install brotli)")
+        outputs += [('search_index.json', [SEARCH_INDEX_PATH]), ('word_freq_index.json', [WORD_FREQ_INDEX_PATH])]
+        precompress_outputs(outputs, rewritten, args.compress_level, args.brotli_quality)
+    else:
+        # Sidecars from an earlier --compress run no longer match these files
+        for path in rewritten:
+            remove_sidecars(path)
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
@@ -0,0 +1,11 @@
+-- Recompute the stored per-post comment counts (post_comment_counts)
+--
+-- Run at the end of every import, so stats queries read one row per
+-- post instead of aggregating the whole comments table.
+
+TRUNCATE post_comment_counts;
+
+INSERT INTO post_comment_counts (post_shortcode, comment_count)
+SELECT post_shortcode, COUNT(*)
+FROM comments
+GROUP BY post_shortcode;
@@ -20,14 +20,24 @@ def reorganize_comments():
     print(f"Source: {source_dir}")
     print(f"Target: {target_dir}")
     
-    # Remove target if it exists
-    if os.path.exists(target_dir):
-        print("Removing existing organized folder...")
-        shutil.rmtree(target_dir)
+    # Move the new tree next to the target first, then swap it in with two
+    # renames; the old tree is only deleted once the new one is in place
+    staging_dir = target_dir + '.staging'
+    previous_dir = target_dir + '.previous'
+    for leftover in (staging_dir, previous_dir):
+        if os.path.exists(leftover):
+            shutil.rmtree(leftover)
     
-    # Move the entire directory
     print("Moving files...")
-    shutil.move(source_dir, target_dir)
+    shutil.move(source_dir, staging_dir)
+    
+    if os.path.exists(target_dir):
+        os.rename(target_dir, previous_dir)
+    os.rename(staging_dir, target_dir)
+    
+    if os.path.exists(previous_dir):
+        print("Removing previous organized folder...")
+        shutil.rmtree(previous_dir)
     
     print("✅ Comments database moved successfully!")
     print(f"Location: {target_dir}")
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Local web server for the archive explorer.
+Works like `python -m http.server`, but when a precompressed sidecar
+(file.br / file.gz) exists and the browser accepts that encoding, the
+sidecar is sent with a Content-Encoding header instead of the raw file.
+Single byte-range requests (Range: bytes=start-end) are answered with
+206 Partial Content, which the packed comment database relies on.
+"""
+
+import os
+import re
+import sys
+from http import HTTPStatus
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+RANGE_PATTERN = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def accepted_encodings(header):
+    """Parse an Accept-Encoding header into the set of acceptable codings"""
+    accepted = set()
+    for item in (header or '').split(','):
+        coding, _, params = item.strip().partition(';')
+        params = params.replace(' ', '')
+        if coding and params not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            accepted.add(coding.lower())
+    return accepted
+
+
+def parse_range(header, size):
+    """(start, end) inclusive for a single-range header, None to ignore it, or
+    ValueError when the range can't be satisfied"""
+    match = RANGE_PATTERN.match((header or '').strip())
+    if not match or match.group(1) == match.group(2) == '':
+        # Multiple ranges or malformed: answer with the whole file
+        return None
+    first, last = match.groups()
+    if first == '':
+        length = int(last)
+        if length == 0:
+            raise ValueError("empty suffix range")
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError("range outside the file")
+    return start, end
+
+
+class RangeFile:
+    """File object that reads at most `length` bytes, for copyfile()"""
+
+    def __init__(self, f, length):
+        self.f = f
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.f.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.f.close()
+
+
+class PrecompressedRequestHandler(SimpleHTTPRequestHandler):
+    def send_head(self):
+        path = self.translate_path(self.path)
+        if os.path.isfile(path):
+            if self.headers.get('Range'):
+                return self._send_range(path)
+            accepted = accepted_encodings(self.headers.get('Accept-Encoding'))
+            for encoding, suffix in ENCODINGS:
+                if encoding in accepted and self._is_fresh_sidecar(path, path + suffix):
+                    return self._send_sidecar(path, path + suffix, encoding)
+        return super().send_head()
+
+    @staticmethod
+    def _is_fresh_sidecar(path, sidecar_path):
+        """Only trust sidecars written after the file they compress"""
+        return (os.path.isfile(sidecar_path)
+                and os.path.getmtime(sidecar_path) >= os.path.getmtime(path))
+
+    def _send_range(self, path):
+        """Send part of `path` (never a sidecar: ranges address the raw bytes)"""
+        f = open(path, 'rb')
+        try:
+            stat = os.fstat(f.fileno())
+            try:
+                byte_range = parse_range(self.headers.get('Range'), stat.st_size)
+            except ValueError:
+                f.close()
+                self.send_response(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+                self.send_header('Content-Range', f'bytes */{stat.st_size}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return None
+
+            if byte_range is None:
+                start, end = 0, stat.st_size - 1
+                self.send_response(HTTPStatus.OK)
+            else:
+                start, end = byte_range
+                self.send_response(HTTPStatus.PARTIAL_CONTENT)
+                self.send_header('Content-Range', f'bytes {start}-{end}/{stat.st_size}')
+            self.send_header('Content-Type', self.guess_type(path))
+            self.send_header('Content-Length', str(end - start + 1))
+            self.send_header('Accept-Ranges', 'bytes')
+            self.send_header('Last-Modified', self.date_time_string(stat.st_mtime))
+            self.end_headers()
+            f.seek(start)
+            return RangeFile(f, end - start + 1)
+        except Exception:
+            f.close()
+            raise
+
+    def _send_sidecar(self, path, sidecar_path, encoding):
+        f = open(sidecar_path, 'rb')
+        try:
+            stat = os.fstat(f.fileno())
+            self.send_response(200)
+            self.send_header('Content-Type', self.guess_type(path))
+            self.send_header('Content-Encoding', encoding)
+            self.send_header('Content-Length', str(stat.st_size))
+            self.send_header('Last-Modified', self.date_time_string(stat.st_mtime))
+            self.send_header('Vary', 'Accept-Encoding')
+            self.end_headers()
+            return f
+        except Exception:
+            f.close()
+            raise
+
+
+def main():
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8080
+    server = ThreadingHTTPServer(('', port), PrecompressedRequestHandler)
+    print(f"Serving archive on http://localhost:{port} (precompressed files enabled)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
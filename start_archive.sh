@@ -22,8 +22,8 @@ else
     exit 1
 fi
 
-# Start server in background and get PID
-$PYTHON_CMD -m http.server 8080 &
+# Start server in background and get PID (serves precompressed .gz/.br files when present)
+$PYTHON_CMD serve_archive.py 8080 &
 SERVER_PID=$!
 
 # Wait a moment for server to start
@@ -0,0 +1,190 @@
+import os
+import sqlite3
+
+import pytest
+
+import archive_db
+from archive_db import SORT_ORDERS, CommentArchive, build_archive, iter_source_db
+
+VIDEOS = [
+    {'video_id': 'v1', 'title': 'Celery juice', 'published_at': '2024-02-01T00:00:00Z'},
+    {'video_id': 'v2', 'title': 'Heavy metals', 'published_at': '2024-03-01T00:00:00Z'},
+]
+
+COMMENTS = [
+    {'comment_id': 'c1', 'video_id': 'v1', 'author': 'alice', 'text': 'Celery juice every morning',
+     'like_count': 5, 'published_at_timestamp': 100},
+    {'comment_id': 'c2', 'video_id': 'v1', 'author': 'bob', 'text': 'short',
+     'like_count': 5, 'published_at_timestamp': 100},
+    {'comment_id': 'c3', 'video_id': 'v1', 'author': 'carol', 'text': 'Détox with celery 🌿',
+     'like_count': 9, 'published_at': '1970-01-01T00:03:20Z'},
+    {'comment_id': 'c4', 'video_id': 'v1', 'author': 'dave', 'text': 'equal',
+     'like_count': 0, 'published_at_timestamp': 50},
+    {'comment_id': 'c5', 'video_id': 'v2', 'author': 'erin', 'text': 'metals and juice',
+     'like_count': 1, 'published_at_timestamp': 300},
+    # Duplicate comment_id: the first copy wins
+    {'comment_id': 'c1', 'video_id': 'v1', 'author': 'mallory', 'text': 'duplicate',
+     'like_count': 99, 'published_at_timestamp': 1},
+]
+
+POSTS = [
+    {'id': 'p1', 'caption': 'Morning celery juice', 'likes': 10},
+    {'id': 'p2', 'caption': 'Wild blueberries', 'likes': 3},
+]
+
+
+@pytest.fixture
+def archive_path(tmp_path):
+    path = str(tmp_path / 'archive.sqlite')
+    counts = build_archive(path, VIDEOS, iter(COMMENTS), POSTS)
+    assert counts == {'videos': 2, 'comments': 5, 'posts': 2}
+    return path
+
+
+@pytest.fixture
+def archive(archive_path):
+    with CommentArchive(archive_path) as opened:
+        yield opened
+
+
+def comment_ids(comments):
+    return [comment['comment_id'] for comment in comments]
+
+
+def test_build_leaves_only_the_archive(archive_path):
+    assert os.listdir(os.path.dirname(archive_path)) == ['archive.sqlite']
+
+
+def test_videos_newest_first(archive):
+    assert [video['video_id'] for video in archive.videos()] == ['v2', 'v1']
+    assert archive.get_video('v1') == VIDEOS[0]
+    assert archive.get_video('missing') is None
+
+
+def test_counts_skip_duplicate_comment_ids(archive):
+    assert archive.count_comments() == 5
+    assert archive.count_comments('v1') == 4
+    assert archive.get_comments('v1', 'likes')[1]['author'] == 'alice'
+
+
+@pytest.mark.parametrize('sort, expected', [
+    ('likes', ['c3', 'c1', 'c2', 'c4']),
+    ('newest', ['c3', 'c2', 'c1', 'c4']),
+    ('oldest', ['c4', 'c1', 'c2', 'c3']),
+    ('longest', ['c1', 'c3', 'c2', 'c4']),
+])
+def test_get_comments_sort_orders(archive, sort, expected):
+    assert comment_ids(archive.get_comments('v1', sort)) == expected
+    pages = [comment_ids(archive.get_comments('v1', sort, limit=1, offset=offset)) for offset in range(4)]
+    assert sum(pages, []) == expected
+
+
+@pytest.mark.parametrize('sort', SORT_ORDERS)
+def test_sort_orders_page_off_an_index(archive, sort):
+    plan = archive.conn.execute(
+        f'EXPLAIN QUERY PLAN SELECT data FROM comments WHERE video_id = ? '
+        f'ORDER BY {SORT_ORDERS[sort]} LIMIT ? OFFSET ?', ('v1', 50, 0)).fetchall()
+    details = ' '.join(row[-1] for row in plan)
+    assert 'USING INDEX' in details
+    assert 'TEMP B-TREE' not in details
+
+
+def test_unknown_sort_order(archive):
+    with pytest.raises(ValueError, match='Unknown sort order'):
+        archive.get_comments('v1', 'random')
+
+
+def test_search_comments(archive):
+    assert sorted(comment_ids(archive.search_comments('celery'))) == ['c1', 'c3']
+    assert sorted(comment_ids(archive.search_comments('juic'))) == ['c1', 'c5']
+    assert comment_ids(archive.search_comments('detox')) == ['c3']
+    assert comment_ids(archive.search_comments('carol')) == ['c3']
+    assert comment_ids(archive.search_comments('juice', video_id='v2')) == ['c5']
+    assert archive.search_comments('  !! ') == []
+    assert archive.search_comments('duplicate') == []
+
+
+def test_count_search(archive):
+    assert archive.count_search('celery') == 2
+    assert archive.count_search('juice', video_id='v1') == 1
+    assert archive.count_search('') == 0
+
+
+def test_search_posts(archive):
+    assert [post['id'] for post in archive.search_posts('celery')] == ['p1']
+    assert archive.search_posts('blueberr')[0]['id'] == 'p2'
+    assert archive.search_posts('') == []
+
+
+def test_missing_archive(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        CommentArchive(str(tmp_path / 'missing.sqlite'))
+
+
+def test_rejects_other_schema_versions(archive_path):
+    conn = sqlite3.connect(archive_path)
+    conn.execute(f'PRAGMA user_version = {archive_db.SCHEMA_VERSION + 1}')
+    conn.close()
+    with pytest.raises(ValueError, match='Unsupported archive version'):
+        CommentArchive(archive_path)
+
+
+@pytest.fixture
+def source_db(tmp_path):
+    path = str(tmp_path / 'youtube_comments.db')
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE videos (video_id TEXT, title TEXT, published_at TEXT)')
+    conn.execute('CREATE TABLE comments (comment_id TEXT, video_id TEXT, author TEXT, text TEXT, '
+                 'like_count INTEGER, published_at TEXT)')
+    conn.executemany('INSERT INTO videos VALUES (?, ?, ?)',
+                     [(video['video_id'], video['title'], video['published_at']) for video in VIDEOS])
+    conn.executemany('INSERT INTO comments VALUES (?, ?, ?, ?, ?, ?)',
+                     [('s1', 'v1', 'alice', 'from the source db', 2, '2024-02-02T00:00:00Z'),
+                      ('s2', 'v2', 'bob', 'second source comment', 0, '2024-03-02T00:00:00Z')])
+    conn.commit()
+    conn.close()
+    return path
+
+
+@pytest.fixture
+def opened_connections(monkeypatch):
+    """Every connection archive_db opens during the test"""
+    connections = []
+    connect = sqlite3.connect
+
+    def recording_connect(*args, **kwargs):
+        connections.append(connect(*args, **kwargs))
+        return connections[-1]
+
+    monkeypatch.setattr(archive_db.sqlite3, 'connect', recording_connect)
+    return connections
+
+
+def assert_closed(connections):
+    for conn in connections:
+        with pytest.raises(sqlite3.ProgrammingError):
+            conn.execute('SELECT 1')
+
+
+def test_iter_source_db_builds_an_archive(source_db, tmp_path):
+    videos, comments = iter_source_db(source_db)
+    assert [video['video_id'] for video in videos] == ['v2', 'v1']
+    path = str(tmp_path / 'archive.sqlite')
+    assert build_archive(path, videos, comments)['comments'] == 2
+    with CommentArchive(path) as archive:
+        assert sorted(comment_ids(archive.search_comments('source'))) == ['s1', 's2']
+        assert archive.get_comments('v1')[0]['published_at'] == '2024-02-02T00:00:00Z'
+
+
+def test_iter_source_db_closes_its_connections(source_db, opened_connections):
+    videos, comments = iter_source_db(source_db)
+    assert list(comments)
+    assert opened_connections
+    assert_closed(opened_connections)
+
+
+def test_iter_source_db_closes_an_abandoned_reader(source_db, opened_connections):
+    videos, comments = iter_source_db(source_db)
+    assert next(comments)['comment_id'] == 's1'
+    comments.close()
+    assert_closed(opened_connections)
@@ -0,0 +1,46 @@
+import io
+import json
+
+import pytest
+
+from comment_export_reader import CommentExportReader, ExportFormatError
+
+EXPORT = {
+    'run-1': {'target': 'ABC', 'logs': [{'storedIds': ['1', '2']}, {'storedIds': ['3']}, {'other': 1}]},
+    'run-2': {'logs': [{'storedIds': ['4', '5']}, 'junk', {'storedIds': 'not a list'}], 'target': 'LATE'},
+    'run-3': {'target': '', 'logs': [{'storedIds': ['6']}]},
+    'run-4': ['not', 'an', 'entry'],
+    'run-5': {'target': 'NOLOGS', 'logs': {'storedIds': ['7']}},
+    'run-6': {'logs': [{'storedIds': ['8']}]},
+    'run-7': {'target': 'ABC', 'logs': [{'storedIds': [9, '0010']}], 'extra': {'deep': [1, 2]}},
+}
+
+
+def expected_pairs(entries):
+    """What the scripts produced with json.load"""
+    for entry in entries:
+        if isinstance(entry, dict) and entry.get('target') and isinstance(entry.get('logs'), list):
+            for log in entry['logs']:
+                if isinstance(log, dict) and isinstance(log.get('storedIds'), list):
+                    for comment_id in log['storedIds']:
+                        yield entry['target'], comment_id
+
+
+@pytest.mark.parametrize('read_size', [1, 3, 16, 1 << 20])
+def test_pairs_match_json_load(read_size):
+    reader = CommentExportReader(io.StringIO(json.dumps(EXPORT, indent=1)), read_size=read_size)
+    assert list(reader) == list(expected_pairs(EXPORT.values()))
+    assert (reader.entries, reader.invalid_entries, reader.targeted_entries) == (7, 1, 4)
+
+
+def test_top_level_array_needs_allow_array():
+    text = json.dumps(list(EXPORT.values()))
+    assert list(CommentExportReader(io.StringIO(text), allow_array=True)) == list(expected_pairs(EXPORT.values()))
+    with pytest.raises(ExportFormatError):
+        list(CommentExportReader(io.StringIO(text)))
+
+
+@pytest.mark.parametrize('text', ['', '   ', '42', '"text"'])
+def test_non_object_files_raise_format_error(text):
+    with pytest.raises(ExportFormatError):
+        list(CommentExportReader(io.StringIO(text), allow_array=True))
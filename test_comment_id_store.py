@@ -0,0 +1,127 @@
+import random
+
+import pytest
+
+from comment_id_store import (CommentIdSet, CommentRecords, decode_id_deltas, encode_id_deltas,
+                              pack_comment_id, varint_size)
+
+MAX_PACKED = (1 << 63) - 1
+
+
+def home_slot(comment_id, bits=10):
+    """Initial probe slot of a packed ID in a table of 2**bits slots"""
+    key = int(comment_id) + 1
+    return ((key * 0x9E3779B97F4A7C15) & ((1 << 64) - 1)) >> (64 - bits)
+
+
+def ids_in_slot(slot, count):
+    matches = []
+    value = 0
+    while len(matches) < count:
+        if home_slot(str(value)) == slot:
+            matches.append(str(value))
+        value += 1
+    return matches
+
+
+@pytest.mark.parametrize('comment_id, expected', [
+    ('0', 0),
+    ('17912345678901234', 17912345678901234),
+    (str(MAX_PACKED), MAX_PACKED),
+    (str(MAX_PACKED + 1), None),
+    ('0123', None),
+    ('', None),
+    ('-5', None),
+    ('12 ', None),
+    ('١٢٣', None),
+    (123, None),
+])
+def test_pack_comment_id(comment_id, expected):
+    assert pack_comment_id(comment_id) == expected
+
+
+def test_set_colliding_ids_are_all_kept():
+    colliding = ids_in_slot(5, 6)
+    id_set = CommentIdSet()
+    assert [id_set.add(comment_id) for comment_id in colliding] == [True] * 6
+    assert [id_set.add(comment_id) for comment_id in colliding] == [False] * 6
+    assert all(comment_id in id_set for comment_id in colliding)
+    assert len(id_set) == 6
+
+
+def test_set_probe_wraps_past_last_slot():
+    colliding = ids_in_slot((1 << 10) - 1, 3)
+    id_set = CommentIdSet()
+    for comment_id in colliding:
+        assert id_set.add(comment_id)
+    assert all(comment_id in id_set for comment_id in colliding)
+    assert ids_in_slot(0, 1)[0] not in id_set
+
+
+def test_set_growth_keeps_every_id():
+    rng = random.Random(7)
+    ids = list({str(rng.randrange(1 << 63)) for _ in range(5000)})
+    id_set = CommentIdSet()
+    initial_bytes = id_set.memory_bytes()
+    for comment_id in ids:
+        assert id_set.add(comment_id)
+    assert id_set.memory_bytes() > initial_bytes
+    assert len(id_set) == len(ids)
+    assert all(comment_id in id_set for comment_id in ids)
+    assert not any(id_set.add(comment_id) for comment_id in ids)
+
+
+def test_set_fallback_ids_stay_distinct_from_packed():
+    id_set = CommentIdSet()
+    for comment_id in ['123', '0123', 123, str(MAX_PACKED + 1), '0', 'abc']:
+        assert id_set.add(comment_id)
+    assert not id_set.add('0123')
+    assert not id_set.add(123)
+    assert '00' not in id_set
+    assert len(id_set) == 6
+
+
+def test_records_round_trip_in_insertion_order():
+    rows = [('17900000000000001', 'ABC'), ('0042', 'XYZ'), (str(MAX_PACKED), 'ABC'),
+            (99, 'XYZ'), ('0', 'NEW')]
+    records = CommentRecords()
+    for comment_id, shortcode in rows:
+        records.append(comment_id, shortcode)
+    assert list(records.iter_pairs()) == rows
+    assert list(records) == [{'comment_id': c, 'post_shortcode': s} for c, s in rows]
+    assert records[1] == {'comment_id': '0042', 'post_shortcode': 'XYZ'}
+    assert records[-1] == {'comment_id': '0', 'post_shortcode': 'NEW'}
+    assert records[1:3] == list(records)[1:3]
+    assert records.shortcodes == ['ABC', 'XYZ', 'NEW']
+    assert len(records) == 5
+
+
+@pytest.mark.parametrize('values', [
+    [],
+    [0],
+    [MAX_PACKED],
+    [0, 1, 2, 127, 128, 16383, 16384],
+    [5, MAX_PACKED],
+    sorted(random.Random(3).sample(range(17 * 10 ** 15, 18 * 10 ** 15), 1000)),
+])
+def test_delta_round_trip(values):
+    data = encode_id_deltas(values)
+    assert decode_id_deltas(data) == values
+
+
+def test_delta_size_matches_varint_size():
+    values = [1, 130, 20000, MAX_PACKED]
+    deltas = [values[0]] + [b - a for a, b in zip(values, values[1:])]
+    expected = varint_size(len(values)) + sum(varint_size(delta) for delta in deltas)
+    assert len(encode_id_deltas(values)) == expected
+
+
+@pytest.mark.parametrize('value, size', [(0, 1), (127, 1), (128, 2), (16383, 2), (16384, 3), (MAX_PACKED, 9)])
+def test_varint_size(value, size):
+    assert varint_size(value) == size
+
+
+@pytest.mark.parametrize('values', [[2, 1], [1, 1], [0, 5, 5]])
+def test_delta_rejects_unsorted_or_duplicate(values):
+    with pytest.raises(ValueError):
+        encode_id_deltas(values)
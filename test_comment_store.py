@@ -0,0 +1,86 @@
+import pytest
+
+from comment_store import ABSENT, NULL, PRESENT, ColumnarCommentStore, write_columnar_store
+
+VIDEO_COMMENTS = {
+    'video_a': [
+        {'comment_id': 'c1', 'author': 'alice', 'like_count': 3, 'score': 1.5, 'is_reply': False,
+         'text': 'first 🌿', 'parent_comment_id': None, 'extra': {'tags': ['x']}},
+        {'comment_id': 'c2', 'author': None, 'like_count': None, 'score': None, 'is_reply': True,
+         'text': ''},
+        {'comment_id': 'c3', 'author': 'alice', 'is_reply': None, 'text': 'third',
+         'parent_comment_id': 'c1', 'extra': 7},
+    ],
+    'video_empty': [],
+    'video_b': [
+        {'comment_id': 'c4', 'like_count': -(1 << 63), 'score': 2.0, 'text': 'fourth', 'extra': None},
+        {'comment_id': 'c5', 'author': 'bob', 'like_count': (1 << 63) - 1, 'is_reply': False,
+         'text': 'fifth', 'only_none': None},
+    ],
+}
+
+
+@pytest.fixture
+def store(tmp_path):
+    path = tmp_path / 'comments.mmcs'
+    assert write_columnar_store(str(path), VIDEO_COMMENTS) == 5
+    with ColumnarCommentStore(str(path)) as opened:
+        yield opened
+
+
+def test_round_trip_keeps_nulls_and_absent_fields(store):
+    assert store.video_ids() == list(VIDEO_COMMENTS)
+    for video_id, comments in VIDEO_COMMENTS.items():
+        assert store.count(video_id) == len(comments)
+        assert store.get_comments(video_id) == comments
+    assert dict(store.iter_comments()) == VIDEO_COMMENTS
+
+
+def test_column_types_ignore_null_and_absent_values(store):
+    assert store.field_types == {
+        'comment_id': 'str', 'author': 'interned', 'like_count': 'int', 'score': 'float',
+        'is_reply': 'bool', 'text': 'str', 'parent_comment_id': 'str', 'extra': 'json',
+        'only_none': 'str',
+    }
+
+
+def test_masks_mark_null_and_absent_rows(store):
+    assert store.mask('like_count').tolist() == [PRESENT, NULL, ABSENT, PRESENT, PRESENT]
+    assert store.mask('is_reply', 'video_a').tolist() == [PRESENT, PRESENT, NULL]
+    assert store.mask('author', 'video_b').tolist() == [ABSENT, PRESENT]
+    assert store.mask('comment_id') is None
+    with pytest.raises(ValueError):
+        store.mask('missing')
+
+
+def test_numeric_columns_hold_zero_for_masked_rows(store):
+    assert store.column('like_count').tolist() == [3, 0, 0, -(1 << 63), (1 << 63) - 1]
+    assert store.column('score', 'video_b').tolist() == [2.0, 0.0]
+    with pytest.raises(ValueError):
+        store.column('text')
+
+
+def test_slices_and_unknown_videos(store):
+    assert store.get_comments('video_a', 1, 2) == VIDEO_COMMENTS['video_a'][1:2]
+    assert store.get_comments('video_a', 2) == VIDEO_COMMENTS['video_a'][2:]
+    assert store.get_comments('video_a', 5) == []
+    assert store.get_comments('video_empty') == []
+    assert store.get_comments('nope') == []
+    assert store.count('nope') == 0
+    assert len(store) == 5
+
+
+def test_mixed_types_fall_back_to_json(tmp_path):
+    path = str(tmp_path / 'mixed.mmcs')
+    comments = {'v': [{'value': 1}, {'value': True}, {'value': 1.5}, {'value': 1 << 70}, {}]}
+    write_columnar_store(path, comments)
+    with ColumnarCommentStore(path) as store:
+        assert store.field_types == {'value': 'json'}
+        assert store.get_comments('v') == comments['v']
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / 'other.bin'
+    path.write_bytes(b'NOPE' + bytes(16))
+    with pytest.raises(ValueError):
+        ColumnarCommentStore(str(path))
@@ -0,0 +1,347 @@
+import csv
+import io
+import os
+import shutil
+import zlib
+
+import pytest
+
+# The importer talks to PostgreSQL through psycopg2; the database itself is
+# replaced below by in-memory connections
+pytest.importorskip('psycopg2')
+
+import import_to_render
+from benchmark_pipelines import generate_parsed_csvs
+from import_to_render import ImportCheckpoint, RenderImporter, TrackedLines
+
+COMMENTS_PATH = os.path.join('data', 'parsed', 'comments.csv')
+POSTS_PATH = os.path.join('data', 'parsed', 'posts.csv')
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class FakeConnection:
+    """Keeps inserted rows pending until commit(), like a transaction"""
+
+    def __init__(self, existing_tables=False):
+        self.existing_tables = existing_tables
+        self.pending = []
+        self.committed = []
+        self.statements = []  # SQL run, and (COPY statement, data sent) pairs
+        self.commits = 0
+        self.closed = False
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.committed.extend(self.pending)
+        self.pending = []
+        self.commits += 1
+
+    def rollback(self):
+        self.pending = []
+
+    def close(self):
+        self.closed = True
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.rowcount = -1
+
+    def execute(self, sql, params=None):
+        self.connection.statements.append(sql.strip())
+
+    def fetchone(self):
+        return {'existing': self.connection.existing_tables}
+
+    def copy_expert(self, sql, f):
+        chunks = []
+        while True:
+            chunk = f.read(8192)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        self.connection.statements.append((sql, chunks[0][:0].join(chunks)))
+
+    def close(self):
+        pass
+
+
+class RecordingImporter(RenderImporter):
+    """RenderImporter over in-memory connections.
+
+    Inserting batch number `fail_at_batch`, or any batch holding a comment
+    on `fail_shortcode`, raises.
+    """
+
+    def __init__(self, fail_at_batch=None, fail_shortcode=None, existing_tables=False):
+        super().__init__('postgresql://localhost/test')
+        self.existing_tables = existing_tables
+        self.batch_size = 50
+        self.commit_interval = 200
+        self.fail_at_batch = fail_at_batch
+        self.fail_shortcode = fail_shortcode
+        self.connections = []
+        self.sent = []
+
+    def connect(self):
+        self.connections.append(FakeConnection(self.existing_tables))
+        return self.connections[-1]
+
+    def _insert_comments_batch(self, cur, batch):
+        if len(self.sent) + 1 == self.fail_at_batch or any(row[1] == self.fail_shortcode for row in batch):
+            raise RuntimeError('insert failed')
+        self.sent.append(batch)
+        cur.connection.pending.extend(batch)
+
+    def committed(self):
+        return [row for connection in self.connections for row in connection.committed]
+
+    def sent_rows(self):
+        return [row for batch in self.sent for row in batch]
+
+
+def read_comments():
+    with open(COMMENTS_PATH, newline='', encoding='utf-8') as f:
+        return [(row['comment_id'], row['post_shortcode']) for row in csv.DictReader(f)]
+
+
+@pytest.fixture
+def parsed_csvs(tmp_path, monkeypatch):
+    """data/parsed/ CSVs of 2000 comments over 5 posts, with the working directory set to their root"""
+    monkeypatch.chdir(tmp_path)
+    generate_parsed_csvs(os.path.join('data', 'parsed'), 2000)
+    return tmp_path
+
+
+def test_tracked_lines_offsets_resume_csv_rows(tmp_path):
+    rows = [['comment_id', 'post_shortcode'], ['1', 'plain'], ['2', 'quoted\nnewline'], ['3', 'ünïcode'], ['4', '']]
+    path = tmp_path / 'rows.csv'
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        csv.writer(f).writerows(rows)
+
+    with open(path, 'rb') as f:
+        lines = TrackedLines(f)
+        offsets = [lines.offset for _ in csv.reader(lines)]
+    assert offsets[-1] == os.path.getsize(path)
+
+    for i, offset in enumerate(offsets):
+        with open(path, 'rb') as f:
+            lines = TrackedLines(f)
+            reader = csv.DictReader(lines)
+            assert reader.fieldnames == rows[0]
+            lines.seek(offset)
+            assert [list(row.values()) for row in reader] == rows[i + 1:]
+
+
+def test_checkpoint_round_trip(tmp_path):
+    path = tmp_path / 'comments.csv'
+    path.write_text('comment_id,post_shortcode\n1,a\n')
+    checkpoint = ImportCheckpoint(str(path))
+    assert checkpoint.load() == (0, 0)
+
+    checkpoint.save(26, 1)
+    assert checkpoint.load() == (26, 1)
+    assert sorted(os.listdir(tmp_path)) == ['comments.csv', 'comments.csv.checkpoint']
+
+    checkpoint.clear()
+    assert not os.path.exists(checkpoint.path)
+    checkpoint.clear()
+
+
+def test_checkpoint_ignored_when_csv_changes(tmp_path):
+    path = tmp_path / 'comments.csv'
+    path.write_text('comment_id,post_shortcode\n1,a\n')
+    checkpoint = ImportCheckpoint(str(path))
+    checkpoint.save(26, 1)
+    with open(path, 'a') as f:
+        f.write('2,b\n')
+    assert checkpoint.load() == (0, 0)
+
+    with open(checkpoint.path, 'w') as f:
+        f.write('{not json')
+    assert checkpoint.load() == (0, 0)
+
+
+def test_import_resumes_after_last_commit(parsed_csvs):
+    comments = read_comments()
+    crashed = RecordingImporter(fail_at_batch=11)
+    with pytest.raises(RuntimeError, match='insert failed'):
+        crashed.import_comments()
+    # Batches 1-8 were committed (every 4 batches); 9 and 10 were not
+    assert crashed.committed() == comments[:400]
+    assert ImportCheckpoint(COMMENTS_PATH).load()[1] == 400
+
+    resumed = RecordingImporter()
+    resumed.import_comments()
+    assert resumed.sent_rows() == comments[400:]
+    assert crashed.committed() + resumed.committed() == comments
+    assert not os.path.exists(COMMENTS_PATH + '.checkpoint')
+
+
+def test_restart_ignores_checkpoint(parsed_csvs):
+    with pytest.raises(RuntimeError):
+        RecordingImporter(fail_at_batch=11).import_comments()
+
+    restarted = RecordingImporter()
+    restarted.import_comments(resume=False)
+    assert restarted.committed() == read_comments()
+    assert not os.path.exists(COMMENTS_PATH + '.checkpoint')
+
+
+def test_resume_starts_over_when_csv_changed(parsed_csvs):
+    with pytest.raises(RuntimeError):
+        RecordingImporter(fail_at_batch=11).import_comments()
+    with open(COMMENTS_PATH, 'a', newline='', encoding='utf-8') as f:
+        csv.writer(f).writerow(['17900000000000000', 'C0000000000'])
+
+    resumed = RecordingImporter()
+    resumed.import_comments()
+    assert resumed.sent_rows() == read_comments()
+
+
+class FakePool:
+    """Stands in for ThreadedConnectionPool, handing out the importer's connections"""
+
+    def __init__(self, importer):
+        self.importer = importer
+        self.returned = []
+        self.closed = False
+
+    def getconn(self):
+        return self.importer.connect()
+
+    def putconn(self, conn):
+        self.returned.append(conn)
+
+    def closeall(self):
+        self.closed = True
+
+
+@pytest.fixture
+def parallel_importer(parsed_csvs, monkeypatch):
+    """make(**options) -> (RecordingImporter, FakePool) for import_comments_parallel"""
+    def make(**options):
+        importer = RecordingImporter(**options)
+        importer.queue_depth = 1
+        pool = FakePool(importer)
+        monkeypatch.setattr(import_to_render, 'ThreadedConnectionPool', lambda *args, **kwargs: pool)
+        return importer, pool
+    return make
+
+
+def partition_of(shortcode, workers):
+    return zlib.crc32(shortcode.encode('utf-8')) % workers
+
+
+def test_parallel_import_partitions_by_post(parallel_importer):
+    importer, pool = parallel_importer()
+    importer.import_comments_parallel(3)
+
+    assert sorted(importer.committed()) == sorted(read_comments())
+    assert len(importer.connections) == len(pool.returned) == 3 and pool.closed
+    partitions = []
+    for connection in importer.connections:
+        assert connection.commits == 1
+        partitions.append({partition_of(shortcode, 3) for _, shortcode in connection.committed})
+    assert all(len(partition) == 1 for partition in partitions)
+    assert len(set.union(*partitions)) == 3
+
+
+def test_failed_partition_rolls_back_alone(parallel_importer):
+    comments = read_comments()
+    failing = comments[0][1]
+    importer, pool = parallel_importer(fail_shortcode=failing)
+    with pytest.raises(RuntimeError, match='1 partition'):
+        importer.import_comments_parallel(3)
+
+    expected = [row for row in comments if partition_of(row[1], 3) != partition_of(failing, 3)]
+    assert expected and sorted(importer.committed()) == sorted(expected)
+    assert pool.closed and len(pool.returned) == 3
+
+
+def test_read_error_rolls_back_every_partition(parallel_importer):
+    with open(COMMENTS_PATH, 'a', encoding='utf-8') as f:
+        f.write('17900000000000000\n')  # No post_shortcode column
+    importer, pool = parallel_importer()
+    with pytest.raises(AttributeError):
+        importer.import_comments_parallel(3)
+
+    assert importer.sent and importer.committed() == []
+    assert pool.closed and len(pool.returned) == 3
+
+
+@pytest.fixture
+def bulk_schema(parsed_csvs):
+    for name in ('database_schema_bulk.sql', 'database_schema_bulk_finalize.sql'):
+        shutil.copy(os.path.join(REPO_DIR, name), name)
+    return parsed_csvs
+
+
+def read_text(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def test_bulk_import_loads_then_finalizes_in_one_transaction(bulk_schema, capsys):
+    importer = RecordingImporter()
+    importer.bulk_import()
+
+    [connection] = importer.connections
+    assert connection.commits == 1 and connection.closed
+    check, schema, (copy_posts, posts_data), (copy_comments, comments_data), finalize = connection.statements
+    assert 'to_regclass' in check
+    assert schema == read_text('database_schema_bulk.sql').strip()
+    assert finalize == read_text('database_schema_bulk_finalize.sql').strip()
+
+    assert copy_posts.startswith('COPY posts (') and 'FORCE_NULL (created_at)' in copy_posts
+    with open(POSTS_PATH, newline='', encoding='utf-8') as f:
+        posts = list(csv.DictReader(f))
+    staged = list(csv.reader(io.StringIO(posts_data)))
+    assert [row[0] for row in staged] == [post['shortcode'] for post in posts]
+
+    assert copy_comments.startswith('COPY comments (') and 'HEADER true' in copy_comments
+    with open(COMMENTS_PATH, 'rb') as f:
+        assert comments_data == f.read()
+    assert f"Loaded {len(read_comments()):,} comments" in capsys.readouterr().out
+
+
+def test_bulk_import_needs_an_empty_database(bulk_schema):
+    importer = RecordingImporter(existing_tables=True)
+    with pytest.raises(RuntimeError, match='empty database'):
+        importer.bulk_import()
+
+    [connection] = importer.connections
+    assert len(connection.statements) == 1
+    assert connection.commits == 0 and connection.closed
+
+
+def test_posts_copy_buffer_matches_batched_insert_values(parsed_csvs):
+    with open(POSTS_PATH, 'w', newline='', encoding='utf-8') as f:
+        csv.writer(f).writerows([
+            ['shortcode', 'post_url', 'created_at', 'likes', 'comment_count', 'caption'],
+            ['C1', 'https://example.com/p/C1/', '2024-01-02T03:04:05', '12', '3', 'caption, "quoted"'],
+            ['C2', 'https://example.com/p/C2/', '', '', '', ''],
+            ['C3', 'https://example.com/p/C3/', 'not a date', '1', '0', 'multi\nline'],
+        ])
+
+    buffer, rows = RecordingImporter()._posts_copy_buffer()
+    assert rows == 3
+    assert list(csv.reader(buffer)) == [
+        ['C1', 'https://example.com/p/C1/', '2024-01-02 03:04:05', '12', '3', 'caption, "quoted"'],
+        ['C2', 'https://example.com/p/C2/', '', '0', '0', ''],
+        ['C3', 'https://example.com/p/C3/', '', '1', '0', 'multi\nline'],
+    ]
+
+
+def test_copy_posts_reads_missing_created_at_as_null(parsed_csvs):
+    importer = RecordingImporter()
+    importer.copy_posts()
+
+    [connection] = importer.connections
+    [(copy_posts, posts_data)] = [statement for statement in connection.statements if isinstance(statement, tuple)]
+    assert copy_posts.startswith('COPY posts_staging (')
+    assert 'FORCE_NULL (created_at)' in copy_posts
+    assert connection.commits == 1 and connection.closed
@@ -0,0 +1,106 @@
+import io
+import json
+
+import pytest
+
+from json_stream import JSONStream, iter_json_array
+
+ITEMS = [
+    {'comment_id': '1', 'like_count': 12345678901234567890, 'text': 'café \\"quoted\\" 🌿'},
+    {'comment_id': '2', 'score': -1.5e-10, 'flags': [True, False, None], 'nested': {'empty': []}},
+    3.25,
+    1E+3,
+    'last',
+]
+
+
+@pytest.mark.parametrize('read_size', [1, 2, 3, 7, 64, 1 << 20])
+@pytest.mark.parametrize('indent', [None, 2])
+def test_items_round_trip_at_every_window_size(read_size, indent):
+    text = json.dumps(ITEMS, indent=indent)
+    assert list(iter_json_array(io.StringIO(text), read_size=read_size)) == json.loads(text)
+
+
+@pytest.mark.parametrize('read_size', range(1, 12))
+def test_number_cut_at_window_edge_is_not_truncated(read_size):
+    # Every read size splits some number mid-digit or mid-exponent
+    text = '[1234567890,9876543210.5,-42,1e100,7]'
+    assert list(iter_json_array(io.StringIO(text), read_size=read_size)) == json.loads(text)
+
+
+def test_empty_arrays():
+    assert list(iter_json_array(io.StringIO('[]'))) == []
+    assert list(iter_json_array(io.StringIO(' [ ] '), read_size=1)) == []
+
+
+def test_many_items_with_small_reads():
+    items = [{'id': str(i), 'likes': i} for i in range(100)]
+    assert list(iter_json_array(io.StringIO(json.dumps(items)), read_size=5)) == items
+
+
+@pytest.mark.parametrize('text', ['', '{}', '[1,2', '[1 2]', '[1,]'])
+def test_malformed_input_raises(text):
+    with pytest.raises(ValueError):
+        list(iter_json_array(io.StringIO(text), read_size=2))
+
+
+DOCUMENT = {
+    'numbers': [0, -1, 12345678901234567890, 3.25, -1.5e-10, 1E+3],
+    'text': 'café \\"quoted\\" 🌿',
+    'nested': {'empty_list': [], 'empty_object': {}, 'flags': [True, False, None]},
+    'last': 123456789
+}
+
+
+def walk(stream):
+    """Rebuild the value at the stream's position using only iter_array/iter_object for containers"""
+    char = stream.peek()
+    if char == '[':
+        items = []
+        for _ in stream.iter_array():
+            items.append(walk(stream))
+        return items
+    if char == '{':
+        members = {}
+        for key in stream.iter_object():
+            members[key] = walk(stream)
+        return members
+    return stream.decode_value()
+
+
+@pytest.mark.parametrize('read_size', [1, 2, 3, 7, 64, 1 << 20])
+@pytest.mark.parametrize('indent', [None, 2])
+def test_walk_round_trips_at_every_window_size(read_size, indent):
+    text = json.dumps(DOCUMENT, indent=indent)
+    stream = JSONStream(io.StringIO(text), read_size=read_size)
+    assert walk(stream) == json.loads(text)
+    assert stream.peek() == ''
+
+
+def test_top_level_number_at_eof():
+    assert JSONStream(io.StringIO(' 1234 '), read_size=2).decode_value() == 1234
+    assert JSONStream(io.StringIO('1234'), read_size=3).decode_value() == 1234
+
+
+def test_skipped_members_can_be_decoded_whole():
+    stream = JSONStream(io.StringIO(json.dumps(DOCUMENT)), read_size=4)
+    seen = {}
+    for key in stream.iter_object():
+        seen[key] = stream.decode_value()
+    assert seen == DOCUMENT
+
+
+def test_window_drops_consumed_text():
+    items = ['x' * 50] * 200
+    stream = JSONStream(io.StringIO(json.dumps(items)), read_size=64)
+    longest = 0
+    for _ in stream.iter_array():
+        stream.decode_value()
+        longest = max(longest, len(stream.text))
+    assert longest < 200
+
+
+@pytest.mark.parametrize('text', ['[1,2', '{"a" 1}', '{1: 2}', '[1 2]', '[1,]'])
+def test_malformed_documents_raise(text):
+    with pytest.raises(ValueError):
+        walk(JSONStream(io.StringIO(text), read_size=2))
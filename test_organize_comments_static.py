@@ -0,0 +1,257 @@
+import gzip
+import json
+import os
+
+import pytest
+
+import organize_comments_static
+from benchmark_pipelines import generate_instagram_exports
+from comment_id_store import decode_id_deltas
+from organize_comments_static import StaticCommentOrganizer
+
+# Small enough that every generated post spans several chunks
+CHUNK_TARGET_BYTES = 1024
+
+
+def organizer(comments_dir, output_dir, **options):
+    built = StaticCommentOrganizer(str(comments_dir), str(output_dir), **options)
+    built.chunk_target_bytes = CHUNK_TARGET_BYTES
+    return built
+
+
+def build(comments_dir, output_dir, **options):
+    """Run a build and return the index.json it published"""
+    organizer(comments_dir, output_dir, **options).process()
+    return load_index(output_dir)
+
+
+def load_index(output_dir):
+    with open(os.path.join(output_dir, 'index.json')) as f:
+        return json.load(f)
+
+
+def expected_comments(comments_dir):
+    """Deduplicated comment IDs per shortcode, in export order"""
+    parser = StaticCommentOrganizer(str(comments_dir), None)
+    return dict(parser.deduplicate_comments(parser.parse_json_files()))
+
+
+def read_file(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def chunk_ids(output_dir, chunk, pack=None):
+    """The comment IDs one index entry stores, as strings; `pack` is the index's pack file, if any"""
+    if pack:
+        with open(os.path.join(output_dir, pack), 'rb') as f:
+            f.seek(chunk['offset'])
+            data = gzip.decompress(f.read(chunk['length']))
+    else:
+        data = read_file(os.path.join(output_dir, chunk['file']))
+    if chunk.get('format') == organize_comments_static.DELTA_FORMAT:
+        return [str(value) for value in decode_id_deltas(data)]
+    return json.loads(data)['comment_ids']
+
+
+def post_ids(output_dir, post, pack=None):
+    return [comment_id for chunk in post['chunks'] for comment_id in chunk_ids(output_dir, chunk, pack)]
+
+
+@pytest.fixture
+def comments_dir(tmp_path):
+    path = tmp_path / 'mm_ig_comments'
+    generate_instagram_exports(str(path), 4000)
+    return path
+
+
+@pytest.fixture
+def output_dir(tmp_path):
+    return tmp_path / 'organized'
+
+
+def test_chunks_hold_every_comment_in_order(comments_dir, output_dir):
+    index = build(comments_dir, output_dir)
+    expected = expected_comments(comments_dir)
+    assert set(index['posts']) == set(expected)
+    for shortcode, post in index['posts'].items():
+        assert post_ids(output_dir, post) == expected[shortcode]
+        assert post['total_comments'] == sum(chunk['count'] for chunk in post['chunks'])
+        assert post['chunk_count'] == len(post['chunks'])
+    assert index['stats']['total_chunks'] > len(index['posts'])
+    assert index['stats']['total_comments'] == sum(len(ids) for ids in expected.values())
+
+
+def test_chunks_fit_the_compressed_budget(comments_dir, output_dir):
+    index = build(comments_dir, output_dir)
+    limit = CHUNK_TARGET_BYTES * organize_comments_static.CHUNK_TOLERANCE
+    for post in index['posts'].values():
+        for chunk in post['chunks']:
+            path = os.path.join(output_dir, chunk['file'])
+            data = read_file(path)
+            assert chunk['bytes'] == len(data)
+            compressed = read_file(path + '.gz')
+            assert gzip.decompress(compressed) == data
+            assert chunk['count'] == 1 or len(compressed) <= limit
+        # Only the last chunk of a post may be much smaller than the budget
+        sizes = [len(read_file(os.path.join(output_dir, chunk['file'] + '.gz'))) for chunk in post['chunks']]
+        assert all(size > CHUNK_TARGET_BYTES / 2 for size in sizes[:-1])
+
+
+
+def add_export(comments_dir, name, shortcode, comment_ids):
+    with open(os.path.join(comments_dir, name), 'w') as f:
+        json.dump({f'entry-{name}': {'target': shortcode, 'logs': [{'storedIds': comment_ids}]}}, f)
+
+
+def post_dir(output_dir, post):
+    return os.path.join(output_dir, os.path.dirname(post['chunks'][0]['file']))
+
+
+def test_rebuild_rewrites_only_changed_posts(comments_dir, output_dir):
+    first = build(comments_dir, output_dir)
+    changed = sorted(first['posts'])[0]
+    add_export(comments_dir, 'zz_new.json', changed, ['17900000000000001', '17900000000000002'])
+
+    second = build(comments_dir, output_dir)
+    assert {shortcode: post for shortcode, post in second['posts'].items() if shortcode != changed} == \
+        {shortcode: post for shortcode, post in first['posts'].items() if shortcode != changed}
+    assert second['posts'][changed]['version'] != first['posts'][changed]['version']
+    assert post_ids(output_dir, second['posts'][changed]) == expected_comments(comments_dir)[changed]
+    # Pages still holding the previous index.json can fetch its chunks
+    assert os.path.isdir(post_dir(output_dir, first['posts'][changed]))
+
+    build(comments_dir, output_dir)
+    assert not os.path.exists(post_dir(output_dir, first['posts'][changed]))
+    assert os.listdir(os.path.join(output_dir, 'posts', changed)) == [second['posts'][changed]['version']]
+
+
+def test_removed_posts_are_deleted_a_build_later(comments_dir, output_dir):
+    add_export(comments_dir, 'zz_extra.json', 'Cextra', ['17900000000000001'])
+    first = build(comments_dir, output_dir)
+    os.remove(os.path.join(comments_dir, 'zz_extra.json'))
+
+    second = build(comments_dir, output_dir)
+    assert 'Cextra' not in second['posts']
+    assert os.path.isdir(post_dir(output_dir, first['posts']['Cextra']))
+
+    build(comments_dir, output_dir)
+    assert not os.path.exists(os.path.join(output_dir, 'posts', 'Cextra'))
+
+
+def test_interrupted_staging_is_cleared(comments_dir, output_dir):
+    os.makedirs(os.path.join(output_dir, organize_comments_static.STAGING_DIR, 'C0000000000-vdeadbeef'))
+    build(comments_dir, output_dir)
+    assert sorted(os.listdir(output_dir)) == ['comment-database.js', 'index.json', 'posts', 'summary.json']
+
+
+def test_full_rebuild_matches_incremental_index(comments_dir, output_dir, capsys):
+    incremental = build(comments_dir, output_dir)
+    capsys.readouterr()
+    organizer(comments_dir, output_dir).process(full_rebuild=True)
+    assert f"({len(incremental['posts'])} rewritten, 0 unchanged" in capsys.readouterr().out
+    assert load_index(output_dir) == incremental
+
+
+def assert_packed_posts(output_dir, index, expected):
+    pack = index['pack']['file']
+    assert index['pack']['bytes'] == os.path.getsize(os.path.join(output_dir, pack))
+    assert set(index['posts']) == set(expected)
+    for shortcode, post in index['posts'].items():
+        assert post_ids(output_dir, post, pack) == expected[shortcode]
+
+
+def test_packed_chunks_decode_from_their_byte_ranges(comments_dir, output_dir):
+    index = build(comments_dir, output_dir, packed=True)
+    assert index['pack']['encoding'] == 'gzip'
+    assert_packed_posts(output_dir, index, expected_comments(comments_dir))
+    assert os.listdir(os.path.join(output_dir, 'posts')) == []
+
+    ranges = sorted((chunk['offset'], chunk['length']) for post in index['posts'].values()
+                    for chunk in post['chunks'])
+    assert ranges[0][0] == 0
+    assert all(offset + length == next_offset
+               for (offset, length), (next_offset, _) in zip(ranges, ranges[1:]))
+
+
+def test_packed_rebuild_appends_changed_posts(comments_dir, output_dir):
+    first = build(comments_dir, output_dir, packed=True)
+    changed = sorted(first['posts'])[0]
+    add_export(comments_dir, 'zz_new.json', changed, ['17900000000000001'])
+
+    second = build(comments_dir, output_dir, packed=True)
+    assert second['pack']['file'] == first['pack']['file']
+    assert second['pack']['bytes'] > first['pack']['bytes']
+    assert min(chunk['offset'] for chunk in second['posts'][changed]['chunks']) >= first['pack']['bytes']
+    for shortcode in first['posts']:
+        if shortcode != changed:
+            assert second['posts'][shortcode] == first['posts'][shortcode]
+    assert_packed_posts(output_dir, second, expected_comments(comments_dir))
+
+
+def test_pack_is_compacted_once_mostly_unreferenced(comments_dir, output_dir):
+    first = build(comments_dir, output_dir, packed=True)
+    packs = [first['pack']['file']]
+    for generation in range(1, 4):
+        for number, shortcode in enumerate(first['posts']):
+            add_export(comments_dir, f'zz_{generation}_{number}.json', shortcode,
+                       [str(17900000000000000 + generation * 100 + number)])
+        index = build(comments_dir, output_dir, packed=True)
+        if index['pack']['file'] != packs[-1]:
+            packs.append(index['pack']['file'])
+            break
+    assert len(packs) == 2, "no build compacted the pack"
+    assert_packed_posts(output_dir, index, expected_comments(comments_dir))
+    live = sum(chunk['length'] for post in index['posts'].values() for chunk in post['chunks'])
+    assert index['pack']['bytes'] == live
+    # The previous index still points into the old pack until the next build
+    assert sorted(name for name in os.listdir(output_dir) if name.endswith('.pack')) == sorted(packs)
+
+    build(comments_dir, output_dir, packed=True)
+    assert [name for name in os.listdir(output_dir) if name.endswith('.pack')] == [packs[-1]]
+
+
+def sorted_ids(expected):
+    return {shortcode: sorted(ids, key=int) for shortcode, ids in expected.items()}
+
+
+def test_delta_chunks_round_trip(comments_dir, output_dir):
+    # Deltas take a byte or two per ID, so split them against a smaller budget
+    delta_organizer = organizer(comments_dir, output_dir, delta_ids=True)
+    delta_organizer.chunk_target_bytes = 128
+    delta_organizer.process()
+    index = load_index(output_dir)
+    limit = 128 * organize_comments_static.CHUNK_TOLERANCE
+    expected = sorted_ids(expected_comments(comments_dir))
+    for shortcode, post in index['posts'].items():
+        assert post_ids(output_dir, post) == expected[shortcode]
+        for chunk in post['chunks']:
+            assert chunk['format'] == organize_comments_static.DELTA_FORMAT
+            assert chunk['file'].endswith('.bin')
+            compressed = read_file(os.path.join(output_dir, chunk['file'] + '.gz'))
+            assert chunk['count'] == 1 or len(compressed) <= limit
+    assert index['stats']['total_chunks'] > len(index['posts'])
+
+
+def test_delta_chunks_in_a_pack(comments_dir, output_dir):
+    index = build(comments_dir, output_dir, packed=True, delta_ids=True)
+    assert all(chunk['format'] == organize_comments_static.DELTA_FORMAT
+               for post in index['posts'].values() for chunk in post['chunks'])
+    assert_packed_posts(output_dir, index, sorted_ids(expected_comments(comments_dir)))
+
+
+def test_posts_with_non_numeric_ids_stay_json(comments_dir, output_dir):
+    add_export(comments_dir, 'zz_mixed.json', 'Cmixed', ['17900000000000002', 'not-a-number', '0123'])
+    index = build(comments_dir, output_dir, delta_ids=True)
+    chunks = index['posts']['Cmixed']['chunks']
+    assert 'format' not in chunks[0] and chunks[0]['file'].endswith('.json')
+    assert post_ids(output_dir, index['posts']['Cmixed']) == ['17900000000000002', 'not-a-number', '0123']
+
+
+def test_switching_to_delta_ids_rewrites_every_post(comments_dir, output_dir, capsys):
+    json_index = build(comments_dir, output_dir)
+    capsys.readouterr()
+    delta_index = build(comments_dir, output_dir, delta_ids=True)
+    assert f"({len(json_index['posts'])} rewritten, 0 unchanged" in capsys.readouterr().out
+    assert all(delta_index['posts'][shortcode]['version'] != post['version']
+               for shortcode, post in json_index['posts'].items())
@@ -0,0 +1,166 @@
+import json
+import os
+import sys
+
+import pytest
+
+import preindex_comments
+from benchmark_pipelines import generate_youtube_corpus
+
+
+def run_preindex(monkeypatch, *args):
+    monkeypatch.setattr(sys, 'argv', ['preindex_comments.py', *args])
+    preindex_comments.main()
+
+
+def load(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def add_comment(comment):
+    comments = load(preindex_comments.COMMENTS_PATH)
+    comments.append(comment)
+    with open(preindex_comments.COMMENTS_PATH, 'w', encoding='utf-8') as f:
+        json.dump(comments, f)
+
+
+@pytest.fixture
+def corpus(tmp_path, monkeypatch):
+    """A small synthetic data/ directory, with the working directory set to its parent"""
+    monkeypatch.chdir(tmp_path)
+    generate_youtube_corpus('data', 2000)
+    return tmp_path
+
+
+def test_shard_manifest_counts_comments_and_replies(corpus, monkeypatch):
+    run_preindex(monkeypatch, '--shards')
+    comments = load(preindex_comments.COMMENTS_PATH)
+    manifest = load(preindex_comments.SHARD_MANIFEST_PATH)
+    for video_id, entry in manifest['videos'].items():
+        video_comments = [comment for comment in comments if comment['video_id'] == video_id]
+        assert entry['count'] == len(video_comments)
+        assert entry['replies'] == sum(1 for comment in video_comments if comment['is_reply'])
+    assert sum(entry['replies'] for entry in manifest['videos'].values()) > 0
+
+
+def test_shard_manifest_is_written_last(corpus, monkeypatch):
+    run_preindex(monkeypatch, '--shards')
+    manifest_mtime = os.stat(preindex_comments.SHARD_MANIFEST_PATH).st_mtime_ns
+    for path in (preindex_comments.SEARCH_INDEX_PATH, preindex_comments.WORD_FREQ_INDEX_PATH):
+        assert manifest_mtime >= os.stat(path).st_mtime_ns
+
+
+def test_plain_build_removes_earlier_shards(corpus, monkeypatch):
+    run_preindex(monkeypatch, '--shards', '--compress')
+    assert os.path.exists(preindex_comments.SHARD_MANIFEST_PATH + '.gz')
+    video_id = load(preindex_comments.COMMENTS_PATH)[0]['video_id']
+    add_comment({'comment_id': 'new-comment', 'video_id': video_id, 'author': 'someone',
+                 'text': 'added after the sharded build', 'like_count': 0, 'is_reply': False,
+                 'published_at': '2024-01-01T00:00:00Z', 'published_at_timestamp': 1704067200})
+
+    run_preindex(monkeypatch)
+    for path in (preindex_comments.SHARD_MANIFEST_PATH, preindex_comments.SHARD_MANIFEST_PATH + '.gz',
+                 preindex_comments.SHARD_DIR):
+        assert not os.path.exists(path)
+    index = load(preindex_comments.VIDEO_INDEX_PATH)
+    assert 'new-comment' in {comment['comment_id'] for comment in index[video_id]}
+
+
+def sidecars(directory):
+    return sorted(name for name in os.listdir(directory) if name.endswith(('.gz', '.br')))
+
+
+def test_uncompressed_build_removes_stale_sidecars(corpus, monkeypatch):
+    run_preindex(monkeypatch, '--compress')
+    assert 'search_index.json.gz' in sidecars('data')
+
+    run_preindex(monkeypatch)
+    assert sidecars('data') == []
+
+
+def test_uncompressed_incremental_build_keeps_sidecars_of_untouched_shards(corpus, monkeypatch):
+    run_preindex(monkeypatch, '--shards', '--incremental', '--compress')
+    shard_sidecars = sidecars(preindex_comments.SHARD_DIR)
+    video_id = load(preindex_comments.COMMENTS_PATH)[0]['video_id']
+    changed_shard = preindex_comments.shard_filename(video_id)
+    add_comment({'comment_id': 'new-comment', 'video_id': video_id, 'author': 'someone',
+                 'text': 'added later', 'like_count': 0, 'is_reply': False,
+                 'published_at': '2024-01-01T00:00:00Z', 'published_at_timestamp': 1704067200})
+
+    run_preindex(monkeypatch, '--shards', '--incremental')
+    assert sidecars(preindex_comments.SHARD_DIR) == [name for name in shard_sidecars
+                                                     if not name.startswith(changed_shard)]
+    assert sidecars('data') == []
+
+
+def outputs():
+    """Contents of every index file the last run left in data/"""
+    found = {}
+    for directory in ('data', preindex_comments.SHARD_DIR):
+        if not os.path.isdir(directory):
+            continue
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            if name.endswith('.json') and path not in (preindex_comments.COMMENTS_PATH,
+                                                       preindex_comments.VIDEOS_PATH,
+                                                       preindex_comments.MANIFEST_PATH):
+                with open(path, 'rb') as f:
+                    found[path] = f.read()
+    return found
+
+
+def edit_corpus():
+    """Change one video's comments, drop another video and add a new one"""
+    comments = load(preindex_comments.COMMENTS_PATH)
+    video_ids = list(dict.fromkeys(comment['video_id'] for comment in comments))
+    changed, dropped = video_ids[0], video_ids[1]
+    comments = [comment for comment in comments if comment['video_id'] != dropped]
+    for comment in comments:
+        if comment['video_id'] == changed:
+            comment['like_count'] += 1000
+            break
+    comments.append({'comment_id': 'new-comment', 'video_id': 'new-video', 'author': 'someone',
+                     'text': 'a brand new video', 'like_count': 3, 'is_reply': False,
+                     'published_at': '2024-01-01T00:00:00Z', 'published_at_timestamp': 1704067200})
+    with open(preindex_comments.COMMENTS_PATH, 'w', encoding='utf-8') as f:
+        json.dump(comments, f)
+
+
+def test_incremental_build_matches_full_build(corpus, monkeypatch, capsys):
+    run_preindex(monkeypatch, '--incremental')
+    edit_corpus()
+    capsys.readouterr()
+
+    run_preindex(monkeypatch, '--incremental')
+    assert '2 recomputed' in capsys.readouterr().out
+    incremental = outputs()
+
+    run_preindex(monkeypatch)
+    assert incremental == outputs()
+    assert preindex_comments.VIDEO_INDEX_PATH in incremental
+
+
+def test_worker_pool_matches_single_process(corpus, monkeypatch):
+    run_preindex(monkeypatch, '--workers', '1')
+    single = outputs()
+
+    run_preindex(monkeypatch, '--workers', '3')
+    assert single == outputs()
+
+
+def test_incremental_sharded_build_matches_full_build(corpus, monkeypatch, capsys):
+    run_preindex(monkeypatch, '--shards', '--incremental')
+    edit_corpus()
+    capsys.readouterr()
+
+    run_preindex(monkeypatch, '--shards', '--incremental')
+    out = capsys.readouterr().out
+    assert '2 recomputed' in out
+    assert '📁 Wrote 2 of 5 video shards' in out
+    incremental = outputs()
+
+    run_preindex(monkeypatch, '--shards')
+    assert incremental == outputs()
+    assert preindex_comments.SHARD_MANIFEST_PATH in incremental
+    assert preindex_comments.VIDEO_INDEX_PATH not in incremental
@@ -0,0 +1,140 @@
+import gzip
+import http.client
+import os
+import threading
+from functools import partial
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from serve_archive import PrecompressedRequestHandler, accepted_encodings, parse_range
+
+CONTENT = b'{"comments":[' + b','.join(b'"%d"' % i for i in range(2000)) + b']}'
+
+
+@pytest.fixture
+def site(tmp_path):
+    """A served directory holding data.json and a fresh data.json.gz"""
+    (tmp_path / 'data.json').write_bytes(CONTENT)
+    (tmp_path / 'data.json.gz').write_bytes(gzip.compress(CONTENT))
+    return tmp_path
+
+
+@pytest.fixture
+def request_file(site):
+    """request_file(path, **headers) -> (status, headers, body) from a server over `site`"""
+    handler = partial(PrecompressedRequestHandler, directory=str(site))
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    thread = threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+    thread.start()
+
+    def request(path, **headers):
+        conn = http.client.HTTPConnection('127.0.0.1', server.server_address[1], timeout=5)
+        try:
+            conn.request('GET', path, headers={name.replace('_', '-'): value for name, value in headers.items()})
+            response = conn.getresponse()
+            return response.status, response.headers, response.read()
+        finally:
+            conn.close()
+
+    yield request
+    server.shutdown()
+    server.server_close()
+
+
+def test_accepted_encodings():
+    assert accepted_encodings('gzip, deflate, br') == {'gzip', 'deflate', 'br'}
+    assert accepted_encodings('GZIP;q=0.5, br;q=0') == {'gzip'}
+    assert accepted_encodings(None) == set()
+
+
+def test_sends_fresh_sidecar_to_clients_that_accept_it(request_file):
+    status, headers, body = request_file('/data.json', Accept_Encoding='gzip, deflate')
+    assert status == 200
+    assert headers['Content-Encoding'] == 'gzip'
+    assert headers['Vary'] == 'Accept-Encoding'
+    assert headers['Content-Type'] == 'application/json'
+    assert int(headers['Content-Length']) == len(body)
+    assert gzip.decompress(body) == CONTENT
+
+
+def test_sends_raw_file_without_accept_encoding(request_file):
+    status, headers, body = request_file('/data.json')
+    assert status == 200
+    assert 'Content-Encoding' not in headers
+    assert body == CONTENT
+
+
+def test_ignores_sidecar_older_than_its_file(site, request_file):
+    stat = os.stat(site / 'data.json')
+    os.utime(site / 'data.json.gz', ns=(stat.st_atime_ns, stat.st_mtime_ns - 10 ** 9))
+    status, headers, body = request_file('/data.json', Accept_Encoding='gzip')
+    assert status == 200
+    assert 'Content-Encoding' not in headers
+    assert body == CONTENT
+
+
+def test_sidecar_requested_directly_is_served_as_is(site, request_file):
+    status, headers, body = request_file('/data.json.gz', Accept_Encoding='gzip')
+    assert status == 200
+    assert 'Content-Encoding' not in headers
+    assert body == (site / 'data.json.gz').read_bytes()
+
+
+def test_prefers_brotli_when_accepted(site, request_file):
+    # The server never decodes sidecars, so any bytes stand in for brotli output
+    (site / 'data.json.br').write_bytes(b'brotli bytes')
+    status, headers, body = request_file('/data.json', Accept_Encoding='gzip, br')
+    assert (status, headers['Content-Encoding'], body) == (200, 'br', b'brotli bytes')
+    status, headers, body = request_file('/data.json', Accept_Encoding='gzip, br;q=0')
+    assert headers['Content-Encoding'] == 'gzip'
+
+
+@pytest.mark.parametrize('header, expected', [
+    ('bytes=0-99', (0, 99)),
+    ('bytes=10-', (10, 999)),
+    ('bytes=990-5000', (990, 999)),
+    ('bytes=-100', (900, 999)),
+    ('bytes=-5000', (0, 999)),
+    (' bytes=5-5 ', (5, 5)),
+    ('bytes=0-1,5-6', None),
+    ('bytes=-', None),
+    ('items=0-1', None),
+    ('', None),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, 1000) == expected
+
+
+@pytest.mark.parametrize('header', ['bytes=1000-', 'bytes=1000-2000', 'bytes=20-10', 'bytes=-0'])
+def test_parse_range_unsatisfiable(header):
+    with pytest.raises(ValueError):
+        parse_range(header, 1000)
+
+
+def test_range_request_returns_raw_bytes(request_file):
+    status, headers, body = request_file('/data.json', Range='bytes=5-24', Accept_Encoding='gzip')
+    assert status == 206
+    assert body == CONTENT[5:25]
+    assert headers['Content-Range'] == f'bytes 5-24/{len(CONTENT)}'
+    assert headers['Content-Length'] == '20'
+    # Ranges address the raw file even when a sidecar exists
+    assert 'Content-Encoding' not in headers
+
+
+def test_suffix_range_request(request_file):
+    status, headers, body = request_file('/data.json', Range='bytes=-10')
+    assert (status, body) == (206, CONTENT[-10:])
+
+
+def test_unsatisfiable_range_request(request_file):
+    status, headers, body = request_file('/data.json', Range=f'bytes={len(CONTENT)}-')
+    assert status == 416
+    assert headers['Content-Range'] == f'bytes */{len(CONTENT)}'
+    assert body == b''
+
+
+def test_multiple_ranges_get_the_whole_file(request_file):
+    status, headers, body = request_file('/data.json', Range='bytes=0-1,4-5')
+    assert (status, body) == (200, CONTENT)
+    assert headers['Accept-Ranges'] == 'bytes'